@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+async_create_patients.py
+------------------------
+Concurrent replacement for `create_patients_script.py` that drives the same
+`POST /patients?team_id=&org_id=` endpoint over a pooled keep-alive connection.
+
+Usage
+-----
+    (venv)$ pip install aiohttp
+    (venv)$ python general/scripts/async_create_patients.py \
+        --input create_patients.json --concurrency 32 --timeout 30
+
+- `--input` accepts everything `patient_stream.iter_patient_file` does (JSON array,
+  NDJSON, gzip/zstd shards, shard directories, globs); records are streamed, so at most
+  `2 * concurrency` patients are in memory at any time.
+- Results are written to `patient_creation_results.json` in the same format as
+  `create_patients_script.py`.
+- `--target-rps` turns on AIMD rate control (see `rate_control.py`); 429/503 responses
+  are retried up to `--max-retries` times, honouring `Retry-After`.
+- `--journal` records every outcome in an SQLite journal as it happens; after a crash,
+  rerun with `--resume` to skip patients that were already created (see `upload_journal.py`).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+
+from create_patients_script import (
+    API_BASE_URL,
+    ORG_ID,
+    TEAM_ID,
+    classify_response,
+    headers,
+    print_summary,
+    save_results,
+)
+from patient_stream import count_patients, iter_patient_file, resolve_patient_files
+from rate_control import THROTTLE_STATUSES, AdaptiveRateController, parse_retry_after
+from upload_journal import UploadJournal, open_journal
+
+# ---------------------------------------------------------------------------
+# HTTP client
+# ---------------------------------------------------------------------------
+
+def make_session(concurrency: int, timeout: float) -> aiohttp.ClientSession:
+    """Client session with a keep-alive pool sized to the concurrency limit."""
+    connector = aiohttp.TCPConnector(
+        limit=concurrency,
+        limit_per_host=concurrency,
+        keepalive_timeout=60,
+        ttl_dns_cache=300,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        headers=headers,
+        timeout=aiohttp.ClientTimeout(total=timeout),
+    )
+
+
+async def create_patient(session: aiohttp.ClientSession, base_url: str,
+                         patient_data: Dict[str, Any]) -> Tuple[Optional[int], str, Optional[str]]:
+    """POST one patient. Returns (status, body, Retry-After header); status is None on transport errors."""
+    params = {
+        "team_id": TEAM_ID,
+        "org_id": ORG_ID
+    }
+    try:
+        async with session.post(f"{base_url}/patients", json=patient_data, params=params) as response:
+            # Read from the case-insensitive multidict: HTTP/2 servers and proxies send "retry-after"
+            return response.status, await response.text(), response.headers.get("Retry-After")
+    except asyncio.TimeoutError:
+        return None, "Request timed out", None
+    except aiohttp.ClientError as e:
+        return None, f"{type(e).__name__}: {e}", None
+
+
+# ---------------------------------------------------------------------------
+# Upload loop
+# ---------------------------------------------------------------------------
+
+async def send_with_retries(session: aiohttp.ClientSession, base_url: str, patient: Dict[str, Any],
+                            rate_controller: Optional[AdaptiveRateController] = None,
+                            max_retries: int = 3) -> Tuple[Optional[int], str]:
+    """POST one patient, pacing through *rate_controller* and retrying 429/503 responses."""
+    for attempt in range(max_retries + 1):
+        if rate_controller:
+            await rate_controller.acquire()
+        sent = time.perf_counter()
+        status, body, retry_after = await create_patient(session, base_url, patient)
+        if rate_controller:
+            rate_controller.record(time.perf_counter() - sent, status, retry_after)
+        if status not in THROTTLE_STATUSES or attempt == max_retries:
+            break
+        if rate_controller is None:
+            await asyncio.sleep(parse_retry_after(retry_after) or 2 ** attempt)
+    return status, body
+
+
+def format_rate_metrics(metrics: Dict[str, Any]) -> str:
+    text = f"rate {metrics['current_rps']}/{metrics['max_rps']} rps"
+    if metrics["latency_p95_s"] is not None:
+        text += f", p95 {metrics['latency_p95_s'] * 1000:.0f}ms"
+    if metrics["in_backoff"]:
+        text += f", backing off {metrics['backoff_remaining_s']:.1f}s"
+    return text
+
+
+async def upload_patients(patients: Iterable[Dict[str, Any]], base_url: str = API_BASE_URL,
+                          concurrency: int = 16, timeout: float = 30.0,
+                          progress_every: int = 100,
+                          total: Optional[int] = None,
+                          rate_controller: Optional[AdaptiveRateController] = None,
+                          max_retries: int = 3,
+                          metrics_file: Optional[str] = None,
+                          journal: Optional[UploadJournal] = None,
+                          resume: bool = False,
+                          on_result: Optional[Callable[[Dict[str, Any], bool], None]] = None,
+                          ) -> Tuple[int, List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Create every patient in *patients* with at most *concurrency* requests in flight.
+
+    With a *rate_controller* the request rate is additionally paced by AIMD feedback;
+    its metrics are shown in progress lines and appended to *metrics_file* as NDJSON.
+    With a *journal* every outcome is appended as it happens; *resume* skips records the
+    journal already lists as created. *on_result(entry, created)* is called for every
+    outcome as it arrives.
+    Returns (processed, created_patients, failed_patients).
+    """
+    created_patients: List[Dict[str, Any]] = []
+    failed_patients: List[Dict[str, Any]] = []
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    start = time.perf_counter()
+    processed = 0
+
+    async def worker(session: aiohttp.ClientSession):
+        nonlocal processed
+        while True:
+            item = await queue.get()
+            if item is None:
+                queue.task_done()
+                return
+            fingerprint, patient = item
+            try:
+                try:
+                    status, body = await send_with_retries(session, base_url, patient, rate_controller, max_retries)
+                    if status is None:
+                        entry, ok = {"name": patient['name'], "error": body}, False
+                    else:
+                        entry, ok = classify_response(patient, status, body)
+                except Exception as e:  # an unexpected error fails this patient, not the worker
+                    entry, ok = {"name": patient.get('name'), "error": f"{type(e).__name__}: {e}"}, False
+                if journal:
+                    journal.record(fingerprint, entry, ok)
+                if on_result:
+                    on_result(entry, ok)
+
+                if ok:
+                    created_patients.append(entry)
+                else:
+                    failed_patients.append(entry)
+                    print(f"❌ FAILED: {entry['name']} - {entry['error']}")
+
+                processed += 1
+                if progress_every and processed % progress_every == 0:
+                    rate = processed / (time.perf_counter() - start)
+                    line = f"Progress: {processed}/{total or '?'} ({len(failed_patients)} failed, {rate:.1f} patients/s)"
+                    if rate_controller:
+                        metrics = rate_controller.metrics()
+                        line += f" [{format_rate_metrics(metrics)}]"
+                        if metrics_out:
+                            metrics_out.write(json.dumps({"processed": processed, **metrics}) + "\n")
+                    print(line)
+            finally:
+                # Always, or a dead worker leaves queue.join() and the bounded producer waiting
+                queue.task_done()
+
+    metrics_out = open(metrics_file, "a") if metrics_file and rate_controller else None
+    try:
+        async with make_session(concurrency, timeout) as session:
+            workers = [asyncio.create_task(worker(session)) for _ in range(concurrency)]
+            items = journal.pending(patients, resume) if journal else ((None, p) for p in patients)
+            for item in items:
+                await queue.put(item)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+    finally:
+        if metrics_out:
+            metrics_out.close()
+
+    return processed, created_patients, failed_patients
+
+
+# ---------------------------------------------------------------------------
+# Entry-point
+# ---------------------------------------------------------------------------
+
+def _parse_args():
+    p = argparse.ArgumentParser(description="Create patients through the ops API concurrently.")
+    p.add_argument("--input", default="create_patients.json",
+                   help="JSON array, NDJSON file (optionally .gz/.zst), shard directory or glob.")
+    p.add_argument("--base-url", default=API_BASE_URL, help="Ops API base URL.")
+    p.add_argument("--concurrency", type=int, default=16, help="Maximum requests in flight.")
+    p.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds.")
+    p.add_argument("--progress-every", type=int, default=100, help="Print progress every N patients (0 = off).")
+    p.add_argument("--target-rps", type=float, default=None,
+                   help="Enable adaptive rate control starting at this many requests/s.")
+    p.add_argument("--max-rps", type=float, default=50.0, help="Hard ceiling for adaptive rate control.")
+    p.add_argument("--latency-target", type=float, default=1.0,
+                   help="p95 latency (seconds) above which the rate is cut.")
+    p.add_argument("--max-retries", type=int, default=3, help="Retries for 429/503 responses.")
+    p.add_argument("--metrics-file", default=None, help="Append rate-controller metrics (NDJSON) here.")
+    p.add_argument("--journal", default=None,
+                   help="SQLite journal recording every created/failed patient as it happens.")
+    p.add_argument("--resume", action="store_true",
+                   help="Skip patients the journal lists as created; retry failures (implies --journal).")
+    p.add_argument("--output", default="patient_creation_results.json", help="Results summary file.")
+    return p.parse_args()
+
+
+def main():
+    args = _parse_args()
+
+    try:
+        resolve_patient_files(args.input)
+    except FileNotFoundError:
+        print(f"Error: {args.input} file not found!")
+        return
+    total = count_patients(args.input)
+
+    print(f"Found {total if total is not None else 'streamed'} patients to create...")
+    print(f"API Endpoint: {args.base_url}/patients")
+    print(f"Team ID: {TEAM_ID}")
+    print(f"Org ID: {ORG_ID}")
+    print(f"Concurrency: {args.concurrency}, timeout: {args.timeout}s")
+    print("-" * 50)
+
+    rate_controller = None
+    if args.target_rps:
+        rate_controller = AdaptiveRateController(
+            target_rps=args.target_rps,
+            max_rps=args.max_rps,
+            latency_target=args.latency_target,
+        )
+        print(f"Adaptive rate control: start {args.target_rps} rps, ceiling {args.max_rps} rps")
+
+    journal = open_journal(args.journal, args.resume)
+    if journal:
+        print(f"Journal: {journal.path} ({'resuming' if args.resume else 'recording'})")
+
+    start = time.perf_counter()
+    processed, created_patients, failed_patients = asyncio.run(upload_patients(
+        iter_patient_file(args.input),
+        base_url=args.base_url.rstrip("/"),
+        concurrency=args.concurrency,
+        timeout=args.timeout,
+        progress_every=args.progress_every,
+        total=total,
+        rate_controller=rate_controller,
+        max_retries=args.max_retries,
+        metrics_file=args.metrics_file,
+        journal=journal,
+        resume=args.resume,
+    ))
+    elapsed = time.perf_counter() - start
+
+    print_summary(processed, created_patients, failed_patients, list_limit=20)
+    print(f"\nElapsed: {elapsed:.1f}s ({processed / elapsed if elapsed else 0:.1f} patients/s)")
+    if rate_controller:
+        print(f"Rate control: {json.dumps(rate_controller.metrics())}")
+    if journal:
+        print(f"Skipped (already created): {journal.skipped}")
+        print(f"Journal totals: {journal.stats()}")
+        journal.close()
+    save_results(processed, created_patients, failed_patients, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,512 @@
+#!/usr/bin/env python3
+"""
+bulk_patients.py
+----------------
+Columnar (NumPy) engine for generating very large patient cohorts with the same
+schema as `script.py::generate_patient_data`.
+
+Every field is sampled for the whole batch at once into NumPy arrays; Python dicts
+(or JSON text) are only built at the serialization edge.
+
+Usage
+-----
+    (venv)$ pip install numpy
+    (venv)$ python general/scripts/bulk_patients.py --count 5000000 --seed 42 \
+        --output create_patients.json
+
+    # 20M patients as gzip'd NDJSON shards of 1M records, generated on 32 cores
+    (venv)$ python general/scripts/bulk_patients.py --count 20000000 --seed 42 --format ndjson \
+        --compression gz --shard-size 1000000 --workers 32 --output patient_shards
+
+Notes
+-----
+- Names, emails and DOB strings come from small lookup tables built once, so a
+  record costs a handful of list indexing operations.
+- `PatientColumns.to_ndjson()` writes compact JSON straight from the columns without
+  creating any intermediate dicts; this is the fast path for bulk output.
+- NDJSON shards are generated in a process pool, each from its own child of
+  `SeedSequence(--seed)`: the same seed, `--shard-size` and `--id-offset` reproduce
+  the shards byte for byte regardless of `--workers`.
+- Emails and phone numbers come from `identity_alloc`: a keyed permutation of the
+  identity index, so they never repeat within a run, nor across runs that reserve
+  their index ranges through the same `--id-ledger`. A seeded run gets back the range
+  the ledger recorded for the same `--seed` and `--count`, so it reproduces its
+  identities too.
+
+Performance
+-----------
+Single core, 200k-record batches, each against the same output from
+`script.generate_patient_data` (about 45 us per dict, 55 us per JSON line):
+
+    sampling (sample_patient_columns)    0.5 us/record    ~90x
+    sampling + to_ndjson()               3.5 us/record    ~16x   (vs. dicts + json.dumps)
+    sampling + to_records()              5.9 us/record    ~8x    (vs. dicts)
+
+The requested 50x single-core speed-up is NOT delivered end to end: only sampling
+reaches it, and complete records come out 8-16x faster. A full 2M-record NDJSON run,
+including writing the shards, takes about 4.8 us per record, roughly 11x. The
+remaining time is CPython building the output objects: joining ~14 pre-encoded
+fragments per NDJSON line, or allocating the five dicts and three lists of each
+record. Neither a single batched `json.loads` nor per-record %-formatting was faster.
+The NDJSON path scales with `--workers`, but a multi-core figure is a different target
+from the one requested. The 50x goal stays open until the requester signs off on a
+revised target.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from date_sampler import default_sampler
+from identity_alloc import (
+    DEFAULT_KEY,
+    DEFAULT_LEDGER,
+    PHONE_MAX,
+    PHONE_MIN,
+    IdentityAllocator,
+    reserve_identities,
+)
+from patient_stream import (
+    COMPRESSION_SUFFIXES,
+    shard_path,
+    write_json_array,
+    write_manifest,
+    write_ndjson_shard,
+)
+
+from script import (
+    AUTH_LEVELS,
+    BLOOD_GROUPS,
+    DOB_END,
+    DOB_START,
+    FIRST_NAMES,
+    GENDERS,
+    LAST_NAMES,
+    PHONE_TYPES,
+    RELATIVE_TYPES,
+    SALUTATIONS,
+)
+
+# ---------------------------------------------------------------------------
+# Lookup tables (built once per process)
+# ---------------------------------------------------------------------------
+
+LAT_RANGE_E4 = (128000, 131000)  # 12.8 – 13.1, 4 decimal places
+LONG_RANGE_E4 = (775000, 777000)  # 77.5 – 77.7, 4 decimal places
+
+
+@lru_cache(maxsize=None)
+def _full_names() -> list[str]:
+    """All `First Last` combinations, indexed by `first * len(LAST_NAMES) + last`."""
+    return [f"{first} {last}" for first in FIRST_NAMES for last in LAST_NAMES]
+
+
+@lru_cache(maxsize=None)
+def _email_prefixes() -> list[str]:
+    """`first.last` email local parts, indexed like `_full_names()`."""
+    return [f"{first.lower()}.{last.lower()}" for first in FIRST_NAMES for last in LAST_NAMES]
+
+
+@lru_cache(maxsize=None)
+def _dob_strings() -> list[str]:
+    """DD-MM-YYYY strings for every day between DOB_START and DOB_END (inclusive)."""
+    days = np.arange(
+        np.datetime64(DOB_START.date(), "D"),
+        np.datetime64(DOB_END.date(), "D") + 1,
+    )
+    return default_sampler().format_dmy(days).tolist()
+
+
+def _encoded(values: list[str]) -> list[str]:
+    """Pre-encode strings as JSON literals."""
+    return [json.dumps(v) for v in values]
+
+
+@lru_cache(maxsize=None)
+def _value_tables() -> dict[str, np.ndarray]:
+    """Object arrays of the strings `PatientColumns.iter_records` gathers, keyed by field."""
+    tables = {
+        "salutation": SALUTATIONS,
+        "name": _full_names(),
+        "email": _email_prefixes(),
+        "dob": _dob_strings(),
+        "gender": GENDERS,
+        "blood_group": BLOOD_GROUPS,
+        "phone_type": PHONE_TYPES,
+        "line1": [f"{no}, {cross}th Cross" for no in range(1, 201) for cross in range(1, 11)],
+        "line2": [f"{main}th Main" for main in range(1, 11)],
+        "relative_type": RELATIVE_TYPES,
+        "auth_level": AUTH_LEVELS,
+    }
+    return {key: np.array(values, dtype=object) for key, values in tables.items()}
+
+
+# ---------------------------------------------------------------------------
+# Columnar batch
+# ---------------------------------------------------------------------------
+
+@dataclass
+class PatientColumns:
+    """One batch of patients stored column-wise.
+
+    Categorical fields hold indexes into the vocab lists imported from `script.py`.
+    `email_suffix` and `phone_number` come from an `IdentityAllocator`, so they are
+    unique across the batch (and across batches of the same run).
+    """
+
+    salutation: np.ndarray
+    name: np.ndarray
+    email_suffix: np.ndarray
+    dob_day: np.ndarray
+    is_approx_dob: np.ndarray
+    gender: np.ndarray
+    blood_group: np.ndarray
+    phone_type: np.ndarray
+    phone_number: np.ndarray
+    caregiver_name: np.ndarray
+    has_address: np.ndarray
+    address_no: np.ndarray
+    address_cross: np.ndarray
+    address_main: np.ndarray
+    lat_e4: np.ndarray
+    long_e4: np.ndarray
+    has_relative: np.ndarray
+    relative_name: np.ndarray
+    relative_number: np.ndarray
+    relative_type: np.ndarray
+    relative_auth_level: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.name)
+
+    def iter_records(self):
+        """Yield patient dicts identical in shape to `generate_patient_data`.
+
+        Every string is gathered column-wise from the lookup tables first, so each
+        record is a single dict literal over already-built values.
+        """
+        t = _value_tables()
+        names = t["name"]
+        addr_index = (self.address_no.astype(np.int64) - 1) * 10 + self.address_cross - 1
+        columns = zip(
+            t["salutation"][self.salutation].tolist(),
+            names[self.name].tolist(),
+            t["dob"][self.dob_day].tolist(),
+            self.is_approx_dob.tolist(),
+            t["gender"][self.gender].tolist(),
+            t["blood_group"][self.blood_group].tolist(),
+            [f"{prefix}{suffix}@example.com"
+             for prefix, suffix in zip(t["email"][self.name].tolist(), self.email_suffix.tolist())],
+            t["phone_type"][self.phone_type].tolist(),
+            ["+91%d" % number for number in self.phone_number.tolist()],
+            names[self.caregiver_name].tolist(),
+            self.has_address.tolist(),
+            t["line1"][addr_index].tolist(),
+            t["line2"][self.address_main - 1].tolist(),
+            (self.lat_e4 / 10000).tolist(),
+            (self.long_e4 / 10000).tolist(),
+            self.has_relative.tolist(),
+            names[self.relative_name].tolist(),
+            ["+91%d" % number for number in self.relative_number.tolist()],
+            t["relative_type"][self.relative_type].tolist(),
+            t["auth_level"][self.relative_auth_level].tolist(),
+        )
+
+        for (sal, name, dob, approx, gender, blood, email, ptype, phone, caregiver,
+             has_addr, line1, line2, lat, long, has_rel, rel_name, rel_phone, rel_type, auth) in columns:
+            yield {
+                "salutation": sal,
+                "name": name,
+                "provided_dob": dob,
+                "biological_dob": dob,
+                "is_approx_dob": approx,
+                "gender": gender,
+                "blood_group": blood,
+                "email": email,
+                "phones": [{"type": ptype, "number": phone, "caregiver_name": caregiver}],
+                "addresses": [{
+                    "line1": line1,
+                    "line2": line2,
+                    "city": "Bengaluru",
+                    "state": "Karnataka",
+                    "pincode": "560001",
+                    "location": {"lat": lat, "long": long},
+                }] if has_addr else [],
+                "relatives": [{
+                    "patient_id": None,
+                    "name": rel_name,
+                    "number": rel_phone,
+                    "type": rel_type,
+                    "auth_level": auth,
+                }] if has_rel else [],
+            }
+
+    def to_records(self) -> list[dict]:
+        """All records as a list.
+
+        The records hold no reference cycles, so the cyclic garbage collector is paused
+        while they are built; otherwise its repeated passes over the growing list of
+        fresh containers take about half the time.
+        """
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return list(self.iter_records())
+        finally:
+            if enabled:
+                gc.enable()
+
+    def to_ndjson(self) -> str:
+        """Encode the whole batch as newline-delimited compact JSON, without building dicts.
+
+        Every output line is assembled from pre-encoded fragments gathered with NumPy
+        fancy indexing into a `(records, pieces)` object array, which is then joined in
+        a single C-level `str.join`. Only numbers (email suffixes, phones) are converted
+        to text per record.
+        `json.loads(line)` equals the corresponding `iter_records()` entry.
+        """
+        t = _json_fragments()
+        n = len(self)
+        num_names = len(_full_names())
+        pieces = np.empty((n, 14), dtype=object)
+
+        pieces[:, 0] = t["head"][self.salutation.astype(np.int64) * num_names + self.name]
+        pieces[:, 1] = t["dob"][self.dob_day]
+        pieces[:, 2] = t["flags"][
+            (self.is_approx_dob.astype(np.int64) * len(GENDERS) + self.gender) * len(BLOOD_GROUPS)
+            + self.blood_group
+        ]
+        pieces[:, 3] = t["email"][self.name]
+        pieces[:, 4] = list(map(str, self.email_suffix.tolist()))
+        pieces[:, 5] = t["phone_head"][self.phone_type]
+        pieces[:, 6] = list(map(str, self.phone_number.tolist()))
+        pieces[:, 7] = t["caregiver"][self.caregiver_name]
+
+        addr = self.has_address
+        pieces[:, 8] = "[]"
+        pieces[:, 9:11] = ""
+        pieces[addr, 8] = t["address"][
+            ((self.address_no[addr].astype(np.int64) - 1) * 10 + self.address_cross[addr] - 1) * 10
+            + self.address_main[addr] - 1
+        ]
+        pieces[addr, 9] = t["lat"][self.lat_e4[addr] - LAT_RANGE_E4[0]]
+        pieces[addr, 10] = t["long"][self.long_e4[addr] - LONG_RANGE_E4[0]]
+
+        rel = self.has_relative
+        pieces[:, 11] = ',"relatives":[]}\n'
+        pieces[:, 12:14] = ""
+        pieces[rel, 11] = t["relative_head"][self.relative_name[rel]]
+        pieces[rel, 12] = list(map(str, self.relative_number[rel].tolist()))
+        pieces[rel, 13] = t["relative_tail"][
+            self.relative_type[rel].astype(np.int64) * len(AUTH_LEVELS) + self.relative_auth_level[rel]
+        ]
+
+        return "".join(pieces.ravel().tolist())
+
+    def iter_json_lines(self):
+        """Yield one compact JSON document per patient (see `to_ndjson`)."""
+        return iter(self.to_ndjson().splitlines())
+
+
+@lru_cache(maxsize=None)
+def _json_fragments() -> dict[str, np.ndarray]:
+    """Pre-encoded JSON fragments used by `PatientColumns.to_ndjson`, as object arrays."""
+    names = _encoded(_full_names())
+    fragments = {
+        "head": [
+            f'{{"salutation":{sal},"name":{name},'
+            for sal in _encoded(SALUTATIONS) for name in names
+        ],
+        "dob": [f'"provided_dob":"{dob}","biological_dob":"{dob}",' for dob in _dob_strings()],
+        "flags": [
+            f'"is_approx_dob":{approx},"gender":{gender},"blood_group":{blood},"email":'
+            for approx in ("false", "true") for gender in _encoded(GENDERS) for blood in _encoded(BLOOD_GROUPS)
+        ],
+        "email": [f'"{prefix}' for prefix in _email_prefixes()],
+        "phone_head": [
+            f'@example.com","phones":[{{"type":{ptype},"number":"+91' for ptype in _encoded(PHONE_TYPES)
+        ],
+        "caregiver": [f'","caregiver_name":{name}}}],"addresses":' for name in names],
+        "address": [
+            f'[{{"line1":"{no}, {cross}th Cross","line2":"{main}th Main","city":"Bengaluru",'
+            f'"state":"Karnataka","pincode":"560001","location":{{"lat":'
+            for no in range(1, 201) for cross in range(1, 11) for main in range(1, 11)
+        ],
+        "lat": [f'{v / 10000!r},"long":' for v in range(LAT_RANGE_E4[0], LAT_RANGE_E4[1] + 1)],
+        "long": [f"{v / 10000!r}}}}}]" for v in range(LONG_RANGE_E4[0], LONG_RANGE_E4[1] + 1)],
+        "relative_head": [f',"relatives":[{{"patient_id":null,"name":{name},"number":"+91' for name in names],
+        "relative_tail": [
+            f'","type":{rtype},"auth_level":{auth}}}]}}\n'
+            for rtype in _encoded(RELATIVE_TYPES) for auth in _encoded(AUTH_LEVELS)
+        ],
+    }
+    return {key: np.array(values, dtype=object) for key, values in fragments.items()}
+
+
+# ---------------------------------------------------------------------------
+# Sampling
+# ---------------------------------------------------------------------------
+
+def sample_patient_columns(num_records: int, rng: np.random.Generator,
+                           identities: IdentityAllocator | None = None,
+                           start: int = 0) -> PatientColumns:
+    """Sample *num_records* patients column-wise from *rng*.
+
+    Emails and phone numbers belong to identity indexes `start .. start + n - 1` of
+    *identities* (a default `IdentityAllocator` when omitted).
+    """
+    n = num_records
+    identities = identities or IdentityAllocator()
+    num_names = len(FIRST_NAMES) * len(LAST_NAMES)
+    dob_seconds = int((DOB_END - DOB_START).total_seconds())
+
+    name = rng.integers(0, num_names, n)
+    return PatientColumns(
+        salutation=rng.integers(0, len(SALUTATIONS), n, dtype=np.uint8),
+        name=name,
+        email_suffix=identities.email_suffixes(start, n),
+        # Same resolution as `random_date`: a uniform second, truncated to its day.
+        dob_day=rng.integers(0, dob_seconds, n, endpoint=True) // 86400,
+        is_approx_dob=rng.random(n) < 0.5,
+        gender=rng.integers(0, len(GENDERS), n, dtype=np.uint8),
+        blood_group=rng.integers(0, len(BLOOD_GROUPS), n, dtype=np.uint8),
+        phone_type=rng.integers(0, len(PHONE_TYPES), n, dtype=np.uint8),
+        phone_number=identities.phone_numbers(start, n),
+        caregiver_name=rng.integers(0, num_names, n),
+        has_address=rng.random(n) < 0.5,
+        address_no=rng.integers(1, 200, n, endpoint=True, dtype=np.int16),
+        address_cross=rng.integers(1, 10, n, endpoint=True, dtype=np.int8),
+        address_main=rng.integers(1, 10, n, endpoint=True, dtype=np.int8),
+        lat_e4=rng.integers(*LAT_RANGE_E4, n, endpoint=True),
+        long_e4=rng.integers(*LONG_RANGE_E4, n, endpoint=True),
+        has_relative=rng.random(n) < 0.5,
+        relative_name=rng.integers(0, num_names, n),
+        relative_number=rng.integers(PHONE_MIN, PHONE_MAX, n, endpoint=True),
+        relative_type=rng.integers(0, len(RELATIVE_TYPES), n, dtype=np.uint8),
+        relative_auth_level=rng.integers(0, len(AUTH_LEVELS), n, dtype=np.uint8),
+    )
+
+
+def iter_patient_columns(num_records: int, rng: np.random.Generator,
+                         chunk_size: int = 100_000,
+                         identities: IdentityAllocator | None = None, start: int = 0):
+    """Yield `PatientColumns` batches of at most *chunk_size* until *num_records* are sampled.
+
+    Memory stays bounded by one batch no matter how large *num_records* is.
+    """
+    identities = identities or IdentityAllocator()
+    for offset in range(0, num_records, chunk_size):
+        yield sample_patient_columns(min(chunk_size, num_records - offset), rng,
+                                     identities, start + offset)
+
+
+def iter_patient_json_lines(num_records: int, seed: int | None = None,
+                            chunk_size: int = 100_000,
+                            identities: IdentityAllocator | None = None):
+    """Lazily yield *num_records* patients as compact JSON lines."""
+    rng = np.random.default_rng(seed)
+    for columns in iter_patient_columns(num_records, rng, chunk_size, identities):
+        yield from columns.iter_json_lines()
+
+
+def _write_shard(task) -> dict:
+    """Process-pool worker: sample one shard from its own RNG stream and write it."""
+    index, start, count, seed_seq, identities, output_dir, compression, chunk_size = task
+    rng = np.random.default_rng(seed_seq)
+    lines = (line for columns in iter_patient_columns(count, rng, chunk_size, identities, start)
+             for line in columns.iter_json_lines())
+    path = shard_path(output_dir, index, compression)
+    return {"file": path.name, "records": write_ndjson_shard(lines, path, compression)}
+
+
+def generate_patient_shards(num_records: int, output_dir: Path, seed: int | None = None,
+                            shard_size: int = 1_000_000, compression: str = "none",
+                            workers: int | None = None, chunk_size: int = 100_000,
+                            identities: IdentityAllocator | None = None) -> dict:
+    """Generate *num_records* patients as NDJSON shards, one shard per pool task.
+
+    Shard *i* draws from child *i* of `SeedSequence(seed)`, so its content depends only
+    on the seed, the shard index, the shard size and the identity range: the same seed,
+    shard size and `identities` give byte-identical shards for any number of *workers*. Without a seed, fresh entropy is
+    drawn and recorded in the manifest (`seed_entropy`) so the run can be reproduced.
+    Shard *i* takes the identity indexes following shard *i - 1*.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    identities = identities or IdentityAllocator()
+    root = np.random.SeedSequence(seed)
+    starts = range(0, num_records, shard_size)
+    counts = [min(shard_size, num_records - start) for start in starts]
+    tasks = [(i, start, count, child, identities, output_dir, compression, chunk_size)
+             for i, (start, count, child) in enumerate(zip(starts, counts, root.spawn(len(counts))))]
+
+    if workers == 1 or len(tasks) <= 1:
+        shards = [_write_shard(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            shards = list(pool.map(_write_shard, tasks))
+
+    return write_manifest(output_dir, shards, shard_size, compression, seed_entropy=str(root.entropy),
+                          identity_key=identities.key, identity_offset=identities.offset)
+
+
+def generate_patient_data_bulk(num_records: int, seed: int | None = None,
+                               identities: IdentityAllocator | None = None) -> list[dict]:
+    """Drop-in, vectorized equivalent of `script.generate_patient_data`."""
+    rng = np.random.default_rng(seed)
+    return sample_patient_columns(num_records, rng, identities).to_records()
+
+
+# ---------------------------------------------------------------------------
+# Entry-point
+# ---------------------------------------------------------------------------
+
+def _parse_args():
+    p = argparse.ArgumentParser(description="Generate a large patient cohort with the columnar engine.")
+    p.add_argument("--count", type=int, default=20, help="Number of patients to generate.")
+    p.add_argument("--seed", type=int, default=None, help="RNG seed for reproducible output.")
+    p.add_argument("--format", choices=["json", "ndjson"], default="json",
+                   help="json: single JSON array file; ndjson: sharded newline-delimited JSON.")
+    p.add_argument("--output", default=None,
+                   help="Output file (json) or directory (ndjson). Defaults to create_patients.json / patient_shards.")
+    p.add_argument("--shard-size", type=int, default=1_000_000, help="Records per NDJSON shard.")
+    p.add_argument("--compression", choices=sorted(COMPRESSION_SUFFIXES), default="none",
+                   help="Compression for NDJSON shards.")
+    p.add_argument("--workers", type=int, default=os.cpu_count(),
+                   help="Processes generating NDJSON shards in parallel (output does not depend on it).")
+    p.add_argument("--id-key", default=DEFAULT_KEY, help="Key of the email/phone permutation.")
+    p.add_argument("--id-offset", type=int, default=None,
+                   help="First identity index of this run (default: next free index in --id-ledger, "
+                        "or the one recorded for the same --seed and --count).")
+    p.add_argument("--id-ledger", default=DEFAULT_LEDGER,
+                   help="JSON file tracking identity indexes used by earlier runs ('' to disable).")
+    return p.parse_args()
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+
+    start = time.perf_counter()
+    identities = reserve_identities(args.count, args.id_ledger, args.id_key, args.id_offset, args.seed)
+    print(f"Identity indexes {identities.offset}..{identities.offset + args.count - 1} (key {identities.key!r})")
+
+    if args.format == "ndjson":
+        output = Path(args.output or "patient_shards")
+        manifest = generate_patient_shards(args.count, output, args.seed, args.shard_size,
+                                           args.compression, args.workers, identities=identities)
+        print(f"Wrote {manifest['total']} patient records to {len(manifest['shards'])} shard(s) in {output}/")
+    else:
+        output = Path(args.output or "create_patients.json")
+        write_json_array(iter_patient_json_lines(args.count, args.seed, identities=identities), output)
+        print(f"Generated {output} with {args.count} patient records.")
+
+    print(f"Elapsed: {time.perf_counter() - start:.2f}s")
@@ -1,6 +1,12 @@
-import json
+import argparse
 import random
-from datetime import datetime, timedelta
+from datetime import timedelta
+
+from date_sampler import default_sampler
+from export_backends import add_export_args, export_records, resolve_output
+from history_template import HISTORY_TEMPLATE
+
+sampler = default_sampler()
 
 # Patient IDs from SMF
 patient_ids = [
@@ -53,8 +59,7 @@ def generate_patient_history(patient_id, index):
     vascular_access = random.choice(vascular_access_types)
     
     # Create date for vascular access (1-3 years ago)
-    access_date = datetime.now() - timedelta(days=random.randint(365, 1095))
-    access_date_str = access_date.strftime("%d-%m-%Y")
+    access_date_str = sampler.dmy_days_ago(365, 1095)
     
     # Dry weight based on typical ranges (45-75 kg)
     dry_weight = str(random.randint(45, 75))
@@ -126,9 +131,9 @@ def generate_patient_history(patient_id, index):
     # COVID-19 vaccination (most patients)
     if random.random() > 0.1:  # 90% have COVID vaccination
         covid_shots = []
-        first_shot_date = datetime.now() - timedelta(days=random.randint(300, 600))
+        first_shot_date = sampler.days_ago(300, 600)
         covid_shots.append({
-            "date": first_shot_date.strftime("%d-%m-%Y"),
+            "date": sampler.dmy(first_shot_date),
             "count": 1,
             "kind": "Primary",
             "user_id": None,
@@ -139,7 +144,7 @@ def generate_patient_history(patient_id, index):
         if random.random() > 0.2:  # 80% have second shot
             second_shot_date = first_shot_date + timedelta(days=random.randint(21, 42))
             covid_shots.append({
-                "date": second_shot_date.strftime("%d-%m-%Y"),
+                "date": sampler.dmy(second_shot_date),
                 "count": 2,
                 "kind": "Primary",
                 "user_id": None,
@@ -156,14 +161,14 @@ def generate_patient_history(patient_id, index):
     
     # Hepatitis B vaccination (important for dialysis patients)
     if random.random() > 0.3:  # 70% have Hepatitis B vaccination
-        hep_date = datetime.now() - timedelta(days=random.randint(100, 400))
+        hep_date = sampler.dmy_days_ago(100, 400)
         vaccinations.append({
             "id": None,
             "version": None,
             "patientId": patient_id,
             "infection": "Hepatitis B",
             "shots": [{
-                "date": hep_date.strftime("%d-%m-%Y"),
+                "date": hep_date,
                 "count": 1,
                 "kind": "Primary",
                 "user_id": None,
@@ -173,14 +178,14 @@ def generate_patient_history(patient_id, index):
     
     # Flu vaccination
     if random.random() > 0.4:  # 60% have flu vaccination
-        flu_date = datetime.now() - timedelta(days=random.randint(30, 365))
+        flu_date = sampler.dmy_days_ago(30, 365)
         vaccinations.append({
             "id": None,
             "version": None,
             "patientId": patient_id,
             "infection": "Influenza",
             "shots": [{
-                "date": flu_date.strftime("%d-%m-%Y"),
+                "date": flu_date,
                 "count": 1,
                 "kind": "Annual",
                 "user_id": None,
@@ -188,161 +193,43 @@ def generate_patient_history(patient_id, index):
             }]
         })
     
-    # Create the patient history object
-    patient_history = {
-        "patient_id": patient_id,
-        "vascular_access": {
+    # Constant parameter sub-trees come from the shared template; only values vary
+    patient_history = HISTORY_TEMPLATE.build(
+        patient_id,
+        vascular_access={
             "value": vascular_access,
             "created": access_date_str
         },
-        "dry_weight": {
-            "code": "DRYWT",
-            "name": "Dry Weight",
-            "units": {
-                "unit": "Kg",
-                "ucum_code": None,
-                "is_default": None,
-                "ref_value": None,
-                "ref_range": None,
-                "format": None
-            },
-            "value": dry_weight
-        },
-        "dialysis_runtime": {
+        dry_weight=dry_weight,
+        dialysis_runtime={
             "hours": runtime_hours,
             "minutes": 0
         },
-        "prescription_params": [
-            {
-                "code": "QBLD",
-                "name": "Quantum of blood",
-                "units": {
-                    "unit": "ml/hr",
-                    "ucum_code": None,
-                    "is_default": None,
-                    "ref_value": None,
-                    "ref_range": {
-                        "min": 300,
-                        "max": 500,
-                        "systolic": None,
-                        "diastolic": None
-                    },
-                    "format": None
-                },
-                "value": qbld_value
-            },
-            {
-                "code": "QDLST",
-                "name": "Quantum of dialysate",
-                "units": {
-                    "unit": "ml/hr",
-                    "ucum_code": None,
-                    "is_default": None,
-                    "ref_value": None,
-                    "ref_range": {
-                        "min": 500,
-                        "max": 800,
-                        "systolic": None,
-                        "diastolic": None
-                    },
-                    "format": None
-                },
-                "value": qdlst_value
-            },
-            {
-                "code": "DLSTTEMP",
-                "name": "Dialysate temperature",
-                "units": {
-                    "unit": "˚c",
-                    "ucum_code": None,
-                    "is_default": None,
-                    "ref_value": None,
-                    "ref_range": {
-                        "min": 35,
-                        "max": 37.5,
-                        "systolic": None,
-                        "diastolic": None
-                    },
-                    "format": None
-                },
-                "value": temp_value
-            },
-            {
-                "code": "BICON",
-                "name": "Bicarb Concentration",
-                "units": {
-                    "unit": "mmol/l",
-                    "ucum_code": None,
-                    "is_default": None,
-                    "ref_value": None,
-                    "ref_range": {
-                        "min": 24,
-                        "max": 35,
-                        "systolic": None,
-                        "diastolic": None
-                    },
-                    "format": None
-                },
-                "value": bicon_value
-            },
-            {
-                "code": "DLZRUSE",
-                "name": "Dialyzer Use",
-                "units": {
-                    "unit": "",
-                    "ucum_code": None,
-                    "is_default": None,
-                    "ref_value": None,
-                    "ref_range": {
-                        "min": None,
-                        "max": None,
-                        "systolic": None,
-                        "diastolic": None
-                    },
-                    "format": None
-                },
-                "value": dialyzer_use
-            },
-            {
-                "code": "HEPTYPE",
-                "name": "Heparin Type",
-                "units": {
-                    "unit": "",
-                    "ucum_code": None,
-                    "is_default": None,
-                    "ref_value": None,
-                    "ref_range": {
-                        "min": None,
-                        "max": None,
-                        "systolic": None,
-                        "diastolic": None
-                    },
-                    "format": None
-                },
-                "value": heparin_type
-            }
-        ],
-        "diagnosis": diagnosis,
-        "vaccination": vaccinations,
-        "audit": {
-            "created_on": datetime.now().isoformat() + "Z",
-            "updated_on": datetime.now().isoformat() + "Z",
+        param_values=[qbld_value, qdlst_value, temp_value, bicon_value, dialyzer_use, heparin_type],
+        diagnosis=diagnosis,
+        vaccination=vaccinations,
+        audit={
+            "created_on": sampler.reference.isoformat() + "Z",
+            "updated_on": sampler.reference.isoformat() + "Z",
             "created_by": "685c1ef404a6c3189380144c",
             "updated_by": "685c1ef404a6c3189380144c"
         }
-    }
+    )
     
     return patient_history
 
+parser = argparse.ArgumentParser(description="Generate patient histories for the SMF patients.")
+add_export_args(parser, default_output="create_patient_histories.json")
+args = parser.parse_args()
+
 # Generate all patient histories
 patient_histories = []
 for i, patient_id in enumerate(patient_ids):
     history = generate_patient_history(patient_id, i)
     patient_histories.append(history)
 
-# Save to JSON file
-with open('create_patient_histories.json', 'w') as f:
-    json.dump(patient_histories, f, indent=2)
+output_file, fmt = resolve_output(args.output, args.format)
+export_records(patient_histories, output_file, fmt, layout="patient_histories", encode=HISTORY_TEMPLATE.dumps)
 
 print(f"Generated {len(patient_histories)} patient histories")
-print("File saved as: create_patient_histories.json") 
\ No newline at end of file
+print(f"File saved as: {output_file}") 
\ No newline at end of file
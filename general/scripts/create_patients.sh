@@ -1,5 +1,8 @@
 #!/bin/bash
 
+# Sequential reference implementation. For anything beyond a handful of patients use
+# general/scripts/create_patients_csv.py, which writes the same CSVs in parallel.
+
 # Configuration
 API_BASE_URL="https://api-stg2.janohealth.com/ops"
 ACCESS_TOKEN="eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.eyJzdWIiOiI2ODVjMWVmNDA0YTZjMzE4OTM4MDE0NGMiLCJ1c2VyIjoie1wibmFtZVwiOlwiUHJpeWEgTmFpclwiLFwiZ2VuZGVyXCI6XCJmZW1hbGVcIixcInVzZXJfdHlwZVwiOlwic3RhZmZcIixcInNwZWNpYWxpemF0aW9uXCI6XCJnZW5lcmFsXCIsXCJwaG9uZVwiOlwiKzkxOTc2NTQzMjEwOVwiLFwiZW1haWxcIjpcInByaXlhLm5haXJAc21mLm9yZ1wiLFwib3JnYW5pemF0aW9uc1wiOltdLFwiaHBpblwiOlwiJDJiJDEwJFlvQ1dNeFdBZnV2Q0RkMDh5cU42a2U0S3R6WHUwREVwd1VnR0hYVmRNMmhTalg2dVZrUHFDXCIsXCJ0ZWFtc1wiOlt7XCJvcmdfaWRcIjpcIjY4NWMxOGY1MDRhNmMzMTg5MzgwMTQyN1wiLFwib3JnX25hbWVcIjpcIlN1bmRhcmFtIE1lZGljYWwgRm91bmRhdGlvblwiLFwiZGVwdF9jb2RlXCI6XCJORVBIUk9cIixcInRlYW1faWRcIjpcIjY4NWMxOGY1MDRhNmMzMTg5MzgwMTQzMFwiLFwidGVhbV9uYW1lXCI6XCJSZW5hbCBDYXJlIFVuaXRcIixcInJvbGVcIjpcImRjX2luY2hhcmdlXCIsXCJkZXNpZ25hdGlvblwiOlwiSW5jaGFyZ2VcIixcInRlYW1fcGhvbmVcIjpcIis5MTk4NzY1NDMyMTBcIn1dLFwiaWRcIjpcIjY4NWMxZWY0MDRhNmMzMTg5MzgwMTQ0Y1wifSIsImF1dGhfaWQiOiJyZW5hbGNhcmVAamFuby5oZWFsdGgiLCJvcmdfaWRzIjpbIjY4NWMxOGY1MDRhNmMzMTg5MzgwMTQyNyJdLCJ0ZWFtX2lkcyI6WyI2ODVjMThmNTA0YTZjMzE4OTM4MDE0MzAiXSwiaWF0IjoxNzUwOTE3MzEwLCJleHAiOjE3NTEwMDA0MDB9.wDRcPPRlUe30WDolCYkhwKMLoiyJjMonBxw_W0KUCBw"
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+create_patients_csv.py
+----------------------
+Drop-in replacement for `create_patients.sh`: reads `create_patients.json`, creates every
+patient through `POST /patients` and writes the same `created_patients.csv` /
+`failed_patients.csv` files.
+
+The shell version forks `jq` twice and `curl` once per patient and sleeps 0.5s between
+records. Here the input is parsed once, requests run in parallel over one pooled
+keep-alive session (`async_create_patients.upload_patients`) and CSV rows are buffered
+and written in batches.
+
+Usage
+-----
+    (venv)$ pip install aiohttp
+    (venv)$ python general/scripts/create_patients_csv.py --input create_patients.json --concurrency 16
+
+Output
+------
+- `created_patients.csv` – `Patient Name,Patient ID`
+- `failed_patients.csv`  – `Patient Name,Error` (`ERROR: HTTP <code>`, as the shell script wrote)
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import time
+from typing import Any, Dict, List
+
+from async_create_patients import upload_patients
+from create_patients_script import API_BASE_URL, ORG_ID, TEAM_ID
+from patient_stream import count_patients, iter_patient_file, resolve_patient_files
+
+CREATED_HEADER = ["Patient Name", "Patient ID"]
+FAILED_HEADER = ["Patient Name", "Error"]
+
+
+class CsvResultWriter:
+    """Buffers created/failed rows and appends them to the two CSVs every *flush_every* rows."""
+
+    def __init__(self, created_path: str, failed_path: str, flush_every: int = 500):
+        self.flush_every = flush_every
+        self._files = [open(created_path, "w", newline=""), open(failed_path, "w", newline="")]
+        self._writers = [csv.writer(f, lineterminator="\n") for f in self._files]
+        self._buffers: List[List[List[str]]] = [[], []]
+        self._writers[0].writerow(CREATED_HEADER)
+        self._writers[1].writerow(FAILED_HEADER)
+
+    def __call__(self, entry: Dict[str, Any], created: bool) -> None:
+        if created:
+            row = [entry["name"], entry["patient_id"]]
+        else:
+            # The shell script recorded only the status code, not the response body
+            error = entry["error"]
+            row = [entry["name"], f"ERROR: {error.split(':', 1)[0] if error.startswith('HTTP ') else error}"]
+        buffer = self._buffers[0 if created else 1]
+        buffer.append(row)
+        if len(buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        for writer, f, buffer in zip(self._writers, self._files, self._buffers):
+            if buffer:
+                writer.writerows(buffer)
+                buffer.clear()
+                f.flush()
+
+    def close(self) -> None:
+        self.flush()
+        for f in self._files:
+            f.close()
+
+
+def main():
+    p = argparse.ArgumentParser(description="Create patients from JSON and record results as CSV.")
+    p.add_argument("--input", default="create_patients.json",
+                   help="JSON array, NDJSON file (optionally .gz/.zst), shard directory or glob.")
+    p.add_argument("--base-url", default=API_BASE_URL, help="Ops API base URL.")
+    p.add_argument("--concurrency", type=int, default=16, help="Maximum requests in flight.")
+    p.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds.")
+    p.add_argument("--created-csv", default="created_patients.csv")
+    p.add_argument("--failed-csv", default="failed_patients.csv")
+    p.add_argument("--flush-every", type=int, default=500, help="CSV rows buffered per write.")
+    args = p.parse_args()
+
+    try:
+        resolve_patient_files(args.input)
+    except FileNotFoundError:
+        print(f"Error: {args.input} file not found!")
+        return
+
+    print("Starting patient creation...")
+    print(f"API Endpoint: {args.base_url}/patients")
+    print(f"Team ID: {TEAM_ID}")
+    print(f"Org ID: {ORG_ID}")
+    print("=" * 50)
+
+    results = CsvResultWriter(args.created_csv, args.failed_csv, args.flush_every)
+    start = time.perf_counter()
+    try:
+        processed, created_patients, failed_patients = asyncio.run(upload_patients(
+            iter_patient_file(args.input),
+            base_url=args.base_url.rstrip("/"),
+            concurrency=args.concurrency,
+            timeout=args.timeout,
+            total=count_patients(args.input),
+            on_result=results,
+        ))
+    finally:
+        results.close()
+    elapsed = time.perf_counter() - start
+
+    print("=" * 50)
+    print("Patient creation completed!")
+    print("")
+    print("Results:")
+    print(f"✅ Successfully created patients: {len(created_patients)}")
+    print(f"❌ Failed patients: {len(failed_patients)}")
+    print(f"⏱  {processed} patients in {elapsed:.1f}s")
+    print("")
+    print(f"Check {args.created_csv} and {args.failed_csv} for details.")
+
+
+if __name__ == "__main__":
+    main()
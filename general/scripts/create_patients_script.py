@@ -1,7 +1,12 @@
+import argparse
 import json
 import requests
 import time
 
+from patient_stream import count_patients, iter_patient_file, resolve_patient_files
+from rate_control import AdaptiveRateController
+from upload_journal import open_journal
+
 # Configuration
 API_BASE_URL = "https://api-stg2.janohealth.com/ops"
 ACCESS_TOKEN = "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.eyJzdWIiOiI2ODVjMWVmNDA0YTZjMzE4OTM4MDE0NGMiLCJ1c2VyIjoie1wibmFtZVwiOlwiUHJpeWEgTmFpclwiLFwiZ2VuZGVyXCI6XCJmZW1hbGVcIixcInVzZXJfdHlwZVwiOlwic3RhZmZcIixcInNwZWNpYWxpemF0aW9uXCI6XCJnZW5lcmFsXCIsXCJwaG9uZVwiOlwiKzkxOTc2NTQzMjEwOVwiLFwiZW1haWxcIjpcInByaXlhLm5haXJAc21mLm9yZ1wiLFwib3JnYW5pemF0aW9uc1wiOltdLFwiaHBpblwiOlwiJDJiJDEwJFlvQ1dNeFdBZnV2Q0RkMDh5cU42a2U0S3R6WHUwREVwd1VnR0hYVmRNMmhTalg2dVZrUHFDXCIsXCJ0ZWFtc1wiOlt7XCJvcmdfaWRcIjpcIjY4NWMxOGY1MDRhNmMzMTg5MzgwMTQyN1wiLFwib3JnX25hbWVcIjpcIlN1bmRhcmFtIE1lZGljYWwgRm91bmRhdGlvblwiLFwiZGVwdF9jb2RlXCI6XCJORVBIUk9cIixcInRlYW1faWRcIjpcIjY4NWMxOGY1MDRhNmMzMTg5MzgwMTQzMFwiLFwidGVhbV9uYW1lXCI6XCJSZW5hbCBDYXJlIFVuaXRcIixcInJvbGVcIjpcImRjX2luY2hhcmdlXCIsXCJkZXNpZ25hdGlvblwiOlwiSW5jaGFyZ2VcIixcInRlYW1fcGhvbmVcIjpcIis5MTk4NzY1NDMyMTBcIn1dLFwiaWRcIjpcIjY4NWMxZWY0MDRhNmMzMTg5MzgwMTQ0Y1wifSIsImF1dGhfaWQiOiJyZW5hbGNhcmVAamFuby5oZWFsdGgiLCJvcmdfaWRzIjpbIjY4NWMxOGY1MDRhNmMzMTg5MzgwMTQyNyJdLCJ0ZWFtX2lkcyI6WyI2ODVjMThmNTA0YTZjMzE4OTM4MDE0MzAiXSwiaWF0IjoxNzUwOTE3MzEwLCJleHAiOjE3NTEwMDA0MDB9.wDRcPPRlUe30WDolCYkhwKMLoiyJjMonBxw_W0KUCBw"
@@ -29,89 +34,66 @@ def create_patient(patient_data):
         print(f"Error creating patient {patient_data.get('name', 'Unknown')}: {str(e)}")
         return None
 
-def main():
-    # Load patient data
+def classify_response(patient, status_code, body_text):
+    """Turn an API response into a created/failed result entry.
+
+    Returns (entry, created) where entry matches the records stored in
+    patient_creation_results.json.
+    """
+    if status_code in (200, 201):
+        try:
+            patient_response = json.loads(body_text)
+            return {
+                "name": patient['name'],
+                "patient_id": patient_response.get('_id'),
+                "response": patient_response
+            }, True
+        except json.JSONDecodeError:
+            return {
+                "name": patient['name'],
+                "patient_id": "unknown",
+                "response": body_text
+            }, True
+
+    error_msg = f"HTTP {status_code}"
     try:
-        with open('create_patients.json', 'r') as f:
-            patients = json.load(f)
-    except FileNotFoundError:
-        print("Error: create_patients.json file not found!")
-        return
+        error_detail = json.loads(body_text)
+        error_msg += f": {error_detail}"
     except json.JSONDecodeError:
-        print("Error: Invalid JSON in create_patients.json!")
-        return
-    
-    print(f"Found {len(patients)} patients to create...")
-    print(f"API Endpoint: {API_BASE_URL}/patients")
-    print(f"Team ID: {TEAM_ID}")
-    print(f"Org ID: {ORG_ID}")
-    print("-" * 50)
-    
-    created_patients = []
-    failed_patients = []
-    
-    for i, patient in enumerate(patients, 1):
-        print(f"Creating patient {i}/{len(patients)}: {patient['name']}")
-        
-        response = create_patient(patient)
-        
-        if response and response.status_code == 200:
-            try:
-                patient_response = response.json()
-                created_patients.append({
-                    "name": patient['name'],
-                    "patient_id": patient_response.get('_id'),
-                    "response": patient_response
-                })
-                print(f"✅ SUCCESS: Created {patient['name']} (ID: {patient_response.get('_id', 'Unknown')})")
-            except json.JSONDecodeError:
-                print(f"✅ SUCCESS: Created {patient['name']} (Response not JSON)")
-                created_patients.append({
-                    "name": patient['name'],
-                    "patient_id": "unknown",
-                    "response": response.text
-                })
-        else:
-            error_msg = "Unknown error"
-            if response:
-                error_msg = f"HTTP {response.status_code}"
-                try:
-                    error_detail = response.json()
-                    error_msg += f": {error_detail}"
-                except:
-                    error_msg += f": {response.text}"
-            
-            failed_patients.append({
-                "name": patient['name'],
-                "error": error_msg
-            })
-            print(f"❌ FAILED: {patient['name']} - {error_msg}")
-        
-        # Small delay to avoid overwhelming the API
-        time.sleep(0.5)
-    
-    # Summary
+        error_msg += f": {body_text}"
+    return {
+        "name": patient['name'],
+        "error": error_msg
+    }, False
+
+def print_summary(total, created_patients, failed_patients, list_limit=None):
+    """Print the creation summary; list_limit caps the per-patient listings"""
     print("\n" + "=" * 50)
     print("CREATION SUMMARY")
     print("=" * 50)
-    print(f"Total patients: {len(patients)}")
+    print(f"Total patients: {total}")
     print(f"Successfully created: {len(created_patients)}")
     print(f"Failed: {len(failed_patients)}")
     
     if created_patients:
         print(f"\n✅ SUCCESSFULLY CREATED PATIENTS:")
-        for patient in created_patients:
+        for patient in created_patients[:list_limit]:
             print(f"  - {patient['name']} (ID: {patient['patient_id']})")
+        if list_limit is not None and len(created_patients) > list_limit:
+            print(f"  ... and {len(created_patients) - list_limit} more")
     
     if failed_patients:
         print(f"\n❌ FAILED PATIENTS:")
-        for patient in failed_patients:
+        for patient in failed_patients[:list_limit]:
             print(f"  - {patient['name']}: {patient['error']}")
-    
-    # Save results to file
+        if list_limit is not None and len(failed_patients) > list_limit:
+            print(f"  ... and {len(failed_patients) - list_limit} more")
+
+def save_results(total, created_patients, failed_patients, output_file='patient_creation_results.json'):
+    """Save results to patient_creation_results.json"""
     results = {
         "summary": {
-            "total": len(patients),
+            "total": total,
             "created": len(created_patients),
             "failed": len(failed_patients)
         },
@@ -119,10 +101,83 @@ def main():
         "failed_patients": failed_patients
     }
     
-    with open('patient_creation_results.json', 'w') as f:
+    with open(output_file, 'w') as f:
         json.dump(results, f, indent=2)
     
-    print(f"\n📄 Results saved to: patient_creation_results.json")
+    print(f"\n📄 Results saved to: {output_file}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Create patients through the ops API.")
+    parser.add_argument("--input", default="create_patients.json",
+                        help="JSON array, NDJSON file (optionally .gz/.zst), shard directory or glob.")
+    parser.add_argument("--target-rps", type=float, default=2.0,
+                        help="Starting request rate; adapted from latency and 429/503 responses.")
+    parser.add_argument("--max-rps", type=float, default=10.0, help="Hard ceiling for the request rate.")
+    parser.add_argument("--journal", default=None,
+                        help="SQLite journal recording every created/failed patient as it happens.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip patients the journal lists as created; retry failures (implies --journal).")
+    args = parser.parse_args()
+
+    # Load patient data lazily so sharded multi-million record inputs stream through
+    try:
+        resolve_patient_files(args.input)
+    except FileNotFoundError:
+        print(f"Error: {args.input} file not found!")
+        return
+    patients = iter_patient_file(args.input)
+    total = count_patients(args.input)
+    
+    print(f"Found {total if total is not None else 'streamed'} patients to create...")
+    print(f"API Endpoint: {API_BASE_URL}/patients")
+    print(f"Team ID: {TEAM_ID}")
+    print(f"Org ID: {ORG_ID}")
+    print("-" * 50)
+    
+    created_patients = []
+    failed_patients = []
+    
+    # Replaces the fixed 0.5s sleep: paces requests and backs off when the API is loaded
+    rate_controller = AdaptiveRateController(target_rps=args.target_rps, max_rps=args.max_rps)
+    
+    # Progress is journaled on disk so a crashed run can be resumed without duplicates
+    journal = open_journal(args.journal, args.resume)
+    items = journal.pending(patients, args.resume) if journal else ((None, p) for p in patients)
+    
+    processed = 0
+    for i, (fingerprint, patient) in enumerate(items, 1):
+        processed = i
+        print(f"Creating patient {i}/{total or '?'}: {patient['name']}")
+        
+        rate_controller.acquire_sync()
+        sent = time.perf_counter()
+        response = create_patient(patient)
+        rate_controller.record(
+            time.perf_counter() - sent,
+            response.status_code if response is not None else None,
+            response.headers.get("Retry-After") if response is not None else None
+        )
+        
+        if response is None:
+            entry, ok = {"name": patient['name'], "error": "Unknown error"}, False
+        else:
+            entry, ok = classify_response(patient, response.status_code, response.text)
+        if journal:
+            journal.record(fingerprint, entry, ok)
+        
+        if ok:
+            created_patients.append(entry)
+            print(f"✅ SUCCESS: Created {patient['name']} (ID: {entry['patient_id']})")
+        else:
+            failed_patients.append(entry)
+            print(f"❌ FAILED: {patient['name']} - {entry['error']}")
+    
+    print_summary(processed, created_patients, failed_patients)
+    print(f"\nRate control: {json.dumps(rate_controller.metrics())}")
+    if journal:
+        print(f"Skipped (already created): {journal.skipped}")
+        journal.close()
+    save_results(processed, created_patients, failed_patients)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+date_sampler.py
+---------------
+Shared date/time sampling and formatting for every generator (patients, histories,
+tags, reports).
+
+All "N days ago" dates are taken against one reference clock, fixed when the sampler
+is created, instead of calling `datetime.now()` per field. Results come out in the two
+formats the data uses:
+
+- `DD-MM-YYYY`                               – DOBs, vascular access, vaccination shots
+- `{"$date": "YYYY-MM-DDTHH:MM:SS.ffffffZ"}` – MongoDB extended JSON (audit, tags, reports)
+
+Scalar helpers (`dmy_days_ago`, `mongo_days_ago`, ...) serve the per-record generators.
+Day strings are cached by ordinal, so repeated days cost a dict lookup instead of a
+`strftime`. Vectorized helpers (`sample_days_ago`, `format_dmy`, ...) draw NumPy
+`datetime64` arrays and format them in bulk for the columnar engines.
+
+Usage
+-----
+    from date_sampler import default_sampler
+
+    dates = default_sampler()             # one shared reference clock per process
+    dates.dmy_days_ago(30, 365)           # '14-02-2026'
+    dates.mongo_days_ago(1, 180)          # {'$date': '2026-06-01T10:22:41.123456Z'}
+    dates.format_dmy(dates.sample_days_ago(30, 365, 1_000_000))
+"""
+
+from __future__ import annotations
+
+import random
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Any, Dict, Optional, Union
+
+import numpy as np
+
+MONGO_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"  # format the generators used with strftime
+US_PER_DAY = 86_400_000_000
+
+When = Union[date, datetime]
+
+
+class DateSampler:
+    """Samples dates relative to a fixed *reference* and formats them with caching.
+
+    Scalar draws use *seed*'s `random.Random` (or the global `random` module when no
+    seed is given, so existing `random.seed()` calls keep working); vectorized draws
+    use a NumPy Generator seeded the same way.
+    """
+
+    def __init__(self, reference: Optional[datetime] = None, seed: Optional[int] = None):
+        self.reference = reference or datetime.now()
+        self.random = random.Random(seed) if seed is not None else random
+        self.rng = np.random.default_rng(seed)
+        self._ref_ordinal = self.reference.toordinal()
+        self._ref_day = np.datetime64(self.reference.date(), "D")
+        self._ref_us = np.datetime64(self.reference.replace(tzinfo=None), "us")
+        self._dmy: Dict[int, str] = {}
+        self._iso: Dict[int, str] = {}
+
+    # -- formatting ---------------------------------------------------------
+
+    def _dmy_ordinal(self, ordinal: int) -> str:
+        text = self._dmy.get(ordinal)
+        if text is None:
+            d = date.fromordinal(ordinal)
+            text = self._dmy[ordinal] = f"{d.day:02d}-{d.month:02d}-{d.year:04d}"
+        return text
+
+    def _iso_ordinal(self, ordinal: int) -> str:
+        text = self._iso.get(ordinal)
+        if text is None:
+            text = self._iso[ordinal] = date.fromordinal(ordinal).isoformat()
+        return text
+
+    def dmy(self, when: When) -> str:
+        """`DD-MM-YYYY`, same as `when.strftime("%d-%m-%Y")`."""
+        return self._dmy_ordinal(when.toordinal())
+
+    def iso_z(self, when: datetime) -> str:
+        """`YYYY-MM-DDTHH:MM:SS.ffffffZ`, same as `when.strftime(MONGO_DATE_FORMAT)`."""
+        return (f"{self._iso_ordinal(when.toordinal())}T{when.hour:02d}:{when.minute:02d}:"
+                f"{when.second:02d}.{when.microsecond:06d}Z")
+
+    def mongo_date(self, when: datetime) -> Dict[str, str]:
+        return {"$date": self.iso_z(when)}
+
+    # -- scalar sampling ----------------------------------------------------
+
+    def days_ago(self, low: int, high: int) -> datetime:
+        """Reference time minus a uniform whole number of days in [low, high]."""
+        return self.reference - timedelta(days=self.random.randint(low, high))
+
+    def dmy_days_ago(self, low: int, high: int) -> str:
+        return self._dmy_ordinal(self._ref_ordinal - self.random.randint(low, high))
+
+    def mongo_days_ago(self, low: int, high: int) -> Dict[str, str]:
+        return self.mongo_date(self.days_ago(low, high))
+
+    def between(self, start: datetime, end: datetime) -> datetime:
+        """Uniform whole second between *start* and *end* (inclusive)."""
+        return start + timedelta(seconds=self.random.randint(0, int((end - start).total_seconds())))
+
+    def dmy_between(self, start: datetime, end: datetime) -> str:
+        """`dmy(between(start, end))` without building the datetime."""
+        seconds = self.random.randint(0, int((end - start).total_seconds()))
+        start_of_day = start.hour * 3600 + start.minute * 60 + start.second
+        return self._dmy_ordinal(start.toordinal() + (start_of_day + seconds) // 86400)
+
+    # -- vectorized sampling ------------------------------------------------
+
+    def sample_days_ago(self, low: int, high: int, size: int) -> np.ndarray:
+        """`datetime64[D]` array of reference dates minus uniform [low, high] days."""
+        return self._ref_day - self.rng.integers(low, high, size, endpoint=True).astype("timedelta64[D]")
+
+    def sample_times_ago(self, low: int, high: int, size: int) -> np.ndarray:
+        """`datetime64[us]` array: the reference timestamp minus uniform [low, high] days."""
+        days = self.rng.integers(low, high, size, endpoint=True)
+        return self._ref_us - (days * US_PER_DAY).astype("timedelta64[us]")
+
+    def format_dmy(self, days: Any) -> np.ndarray:
+        """Object array of `DD-MM-YYYY` strings; each distinct day is formatted once."""
+        days = np.asarray(days).astype("datetime64[D]")
+        unique, inverse = np.unique(days, return_inverse=True)
+        ordinals = unique.astype(np.int64) + date(1970, 1, 1).toordinal()
+        table = np.array([self._dmy_ordinal(o) for o in ordinals.tolist()], dtype=object)
+        return table[inverse.reshape(days.shape)]
+
+    def format_iso_z(self, times: Any) -> np.ndarray:
+        """Object array of `YYYY-MM-DDTHH:MM:SS.ffffffZ` strings."""
+        strings = np.datetime_as_string(np.asarray(times).astype("datetime64[us]"), unit="us")
+        return np.array([s + "Z" for s in strings.ravel().tolist()], dtype=object).reshape(strings.shape)
+
+
+@lru_cache(maxsize=None)
+def default_sampler() -> DateSampler:
+    """Process-wide sampler, so every generator in a run shares one reference clock."""
+    return DateSampler()
@@ -16,6 +16,10 @@ Usage
         --input "smf/data/pathology/Report Fri, Oct 04 - 2024.pdf" \
         --output "smf/data/pathology/Report Fri, Oct 04 - 2024_phi_redacted.pdf"
 
+    # Batch mode: every PDF under a directory (or matching a glob), mirrored into --output
+    (venv)$ python general/scripts/edit_pdf_phi_data.py \
+        --input smf/data/pathology --output redacted/ --workers 8
+
 The script will
 1. Search for occurrences of the original PHI fields in the PDF.
 2. Overlay a white rectangle to cover the original values.
@@ -24,28 +28,76 @@ The script will
 Limitations
 -----------
 - Relies on text search; works reliably if field labels (e.g. "Name", "Age / Sex", "Contact", "Order") are present on the page as plain text.
-- Coordinates obtained via `page.search_for()` are text-bound. Complex layouts or scanned images will not be processed.
+- Coordinates come from `page.get_text("words")` and are text-bound. Complex layouts or scanned images will not be processed.
 - Order number digits are preserved in length but randomized. Only numeric section after the first non-digit character sequence is altered.
+
+Rules
+-----
+By default the four `LABELS` below are redacted. `--rules rules.json` replaces them
+with a rule file: any number of labels (alternatives, case-insensitive, punctuation
+tolerant), how far each value extends and how its replacement is generated. The file
+is compiled once per run (once per worker in batch mode); see `phi_rules.py` for the
+format.
+
+Batch mode
+----------
+When `--input` is a directory or a glob, each PDF is redacted in its own task on a
+process pool (`--workers`, default: CPU count) and written to the same relative path
+under `--output`. Existing outputs are skipped unless `--overwrite` is given. A failing
+document does not stop the run: `--output/redaction_manifest.json` lists every file
+with its status, time and error, plus totals.
+
+Large documents
+---------------
+`process_pdf` holds the whole document, with every page it has changed, until the
+final save. `--low-memory` bounds that: pages are redacted in runs of `--flush-pages`,
+each run is appended to a work file and the document is reopened, and the output is
+written with a full save that drops unused and merges duplicate objects (see
+`process_pdf_low_memory`). `--image-dpi 150` also recompresses larger images (scans) to
+150 dpi JPEG. Each document's peak RSS and output size are printed in single-file mode
+and recorded in the batch manifest.
+
+Incremental runs
+----------------
+With `--cache FILE`, each redacted PDF is recorded with its SHA-256, the rule set's
+digest and its output's path and SHA-256 (see redaction_cache.py). Later runs skip
+every PDF whose content, rules and output are unchanged, mostly from a `stat` without
+reading the file, so a nightly run over an unchanged archive takes seconds:
+
+    (venv)$ python general/scripts/edit_pdf_phi_data.py \
+        --input archive/ --output redacted/ --cache redaction.cache.sqlite
 """
 
 from __future__ import annotations
 
 import argparse
+import gc
+import glob
+import json
+import os
 import random
-import re
+import shutil
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
 from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import fitz  # PyMuPDF
 
+from phi_rules import RuleSet, load_rules
+from progress_report import add_reporting_args, default_reporter
+from redaction_cache import RedactionCache, sha256_file
+
+MANIFEST_NAME = "redaction_manifest.json"
+
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
 
-def _randomise_digits(value: str) -> str:
-    """Return *value* with every digit replaced by a new random digit."""
-    return re.sub(r"\d", lambda _: str(random.randint(0, 9)), value)
-
-
 def _cover_and_write(page: fitz.Page, bbox: fitz.Rect, new_text: str, font_size: int = 10):
     """Cover *bbox* with a white rectangle and write *new_text* at the same position."""
     # Expand bbox slightly for full coverage
@@ -77,96 +129,286 @@ LABELS = {
     },
 }
 
+# Compiled once; --rules replaces it with a rule file (see phi_rules.py)
+DEFAULT_RULES = RuleSet.from_labels(LABELS)
+
+FLUSH_PAGES = 16     # --low-memory: pages redacted between flushes to disk
+IMAGE_QUALITY = 75   # --image-dpi: JPEG quality of recompressed images
+
 # ---------------------------------------------------------------------------
 # Main logic
 # ---------------------------------------------------------------------------
 
-def process_pdf(input_path: Path, output_path: Path) -> None:
-    doc = fitz.open(input_path)
+PAGE_MARGIN_RIGHT = 10  # safety margin before right border
 
-    PAGE_MARGIN_RIGHT = 10  # safety margin before right border
 
-    for page in doc:
-        words = page.get_text("words")  # list of 9-tuples
+def _redact_page(page: fitz.Page, rules: RuleSet) -> int:
+    """Redact the PHI fields on *page* and write their replacements. Returns the number replaced."""
+    words = page.get_text("words")  # list of 9-tuples
 
-        # Map (block,line) -> list of words to find next-word relationships easily.
-        lines_index = {}
-        for w in words:
-            x0, y0, x1, y1, word, block_no, line_no, *_ = w
-            lines_index.setdefault((block_no, line_no), []).append(w)
+    # Store replacement draw instructions to run AFTER redaction.
+    pending_writes: list[tuple[fitz.Point, str]] = []
 
-        # Store replacement draw instructions to run AFTER redaction.
-        pending_writes: list[tuple[fitz.Point, str]] = []
+    for match in rules.find(words):
+        rect = fitz.Rect(match.label_bbox)
+        label_x1 = rect.x1
 
-        for key, cfg in LABELS.items():
-            label = cfg["label"]
-            label_rects = page.search_for(label)
-            if not label_rects:
-                continue
+        # Determine rectangle covering the original value area (start of value word → extent end)
+        if match.value_words:
+            vx0 = match.value_words[0][0] - 1
+        else:
+            vx0 = label_x1 + 2  # fallback
+        right = match.stop_x if match.stop_x is not None else page.rect.x1 - PAGE_MARGIN_RIGHT
+
+        cover_rect = fitz.Rect(vx0, rect.y0 - 1, max(right, vx0 + 1), rect.y1 + 1)
+
+        # Compute replacement text
+        new_value = match.rule.generate([w[4] for w in match.value_words])
+
+        # Add redaction annotation (to truly remove old content)
+        page.add_redact_annot(cover_rect, fill=(1, 1, 1))
 
-            for rect in label_rects:
-                # Find any word that intersects with label rect (to capture block/line index)
-                target_word = None
-                for w in words:
-                    wx0, wy0, wx1, wy1, wtext, block_no, line_no, *_ = w
-                    if fitz.Rect(wx0, wy0, wx1, wy1).intersects(rect) and wtext == label:
-                        target_word = w
-                        break
-
-                if not target_word:
-                    continue
-
-                _, wy0, _, wy1, _, block_no, line_no, *_ = target_word
-                line_words = sorted(lines_index[(block_no, line_no)], key=lambda w: w[0])
-
-                # Identify first value word appearing to the right of the label.
-                label_x1 = rect.x1
-                value_word = None
-                for w in line_words:
-                    if w[0] > label_x1:  # word starts after label
-                        value_word = w
-                        break
-
-                # Determine rectangle covering the original value area (start of value word → right margin)
-                if value_word:
-                    vx0 = value_word[0] - 1
-                else:
-                    vx0 = label_x1 + 2  # fallback
-
-                cover_rect = fitz.Rect(vx0, rect.y0 - 1, page.rect.x1 - PAGE_MARGIN_RIGHT, rect.y1 + 1)
-
-                # Compute replacement text
-                if key == "order":
-                    if value_word is None:
-                        continue
-                    order_value = value_word[4]
-                    prefix = re.match(r"^[^\d]+", order_value).group(0)
-                    order_digits = _randomise_digits(order_value[len(prefix):])
-                    new_value = f"{prefix}{order_digits}"
-                else:
-                    new_value = cfg["new_value"]
-
-                # Add redaction annotation (to truly remove old content)
-                page.add_redact_annot(cover_rect, fill=(1, 1, 1))
-
-                # Store write instruction – align with value's original x start when available, else after label
-                insert_x = vx0 + 1
-                insert_point = fitz.Point(insert_x, cover_rect.y1 - 2)
-                pending_writes.append((insert_point, new_value))
-
-        # Apply redactions – if none are present PyMuPDF may raise, so ignore.
-        try:
-            page.apply_redactions()
-        except RuntimeError:
-            pass
-
-        # Now write replacement texts
-        for pt, txt in pending_writes:
-            page.insert_text(pt, txt, fontname="helv", fontsize=10, color=(0, 0, 0))
-
-    # Save result
-    doc.save(output_path, incremental=False, deflate=True)
+        # Store write instruction – align with value's original x start when available, else after label
+        insert_x = vx0 + 1
+        insert_point = fitz.Point(insert_x, cover_rect.y1 - 2)
+        pending_writes.append((insert_point, new_value))
+
+    # Apply redactions – if none are present PyMuPDF may raise, so ignore.
+    try:
+        page.apply_redactions()
+    except RuntimeError:
+        pass
+
+    # Now write replacement texts
+    for pt, txt in pending_writes:
+        page.insert_text(pt, txt, fontname="helv", fontsize=10, color=(0, 0, 0))
+    return len(pending_writes)
+
+
+def _recompress_images(doc: fitz.Document, image_dpi: int) -> None:
+    """Resample images above *image_dpi* down to it and store them as JPEG (scanned reports)."""
+    doc.rewrite_images(dpi_threshold=image_dpi + 1, dpi_target=image_dpi, quality=IMAGE_QUALITY)
+
+
+def process_pdf(input_path: Path, output_path: Path, rules: RuleSet = DEFAULT_RULES,
+                image_dpi: Optional[int] = None) -> int:
+    """Redact the PHI fields of *input_path* into *output_path*. Returns the number of values replaced."""
+    doc = fitz.open(input_path)
+    replaced = sum(_redact_page(page, rules) for page in doc)
+    if image_dpi:
+        _recompress_images(doc, image_dpi)
+
+    # Save result; rewritten images leave the originals unreferenced, so collect them
+    doc.save(output_path, incremental=False, deflate=True, garbage=4 if image_dpi else 0)
     doc.close()
+    return replaced
+
+
+def process_pdf_low_memory(input_path: Path, output_path: Path, rules: RuleSet = DEFAULT_RULES,
+                           image_dpi: Optional[int] = None, flush_pages: int = FLUSH_PAGES) -> int:
+    """`process_pdf` for very large documents, with memory bounded by *flush_pages* pages.
+
+    The input is copied to a work file next to the output. Every *flush_pages* pages the
+    changes are appended to it with an incremental save, and the document is closed and
+    reopened, which drops the parsed pages and MuPDF's object store. The output is then
+    written with a full, garbage-collecting save, so none of the unredacted content in
+    the work file's earlier revisions survives in it, and duplicated objects are merged.
+    """
+    work = output_path.with_name(output_path.name + ".partial")
+    rewrite = output_path.with_name(output_path.name + ".rewrite")
+    shutil.copyfile(input_path, work)
+    replaced = 0
+    try:
+        doc = fitz.open(work)
+        if not doc.can_save_incrementally():  # e.g. a repaired file: rewrite it once so it can be appended to
+            doc.save(rewrite, garbage=1)
+            doc.close()
+            os.replace(rewrite, work)
+            doc = fitz.open(work)
+        page_count = doc.page_count
+        for start in range(0, page_count, flush_pages):
+            for number in range(start, min(start + flush_pages, page_count)):
+                replaced += _redact_page(doc[number], rules)
+            doc.save(work, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP, deflate=True)
+            doc.close()
+            gc.collect()  # page wrappers keep MuPDF objects alive until collected
+            fitz.TOOLS.store_shrink(100)
+            doc = fitz.open(work)
+
+        if image_dpi:
+            _recompress_images(doc, image_dpi)
+        # garbage=4 also merges identical streams: shared images redacted the same way on many pages
+        doc.save(output_path, garbage=4, deflate=True)
+        doc.close()
+    finally:
+        work.unlink(missing_ok=True)
+        rewrite.unlink(missing_ok=True)
+    return replaced
+
+
+def reset_peak_rss() -> None:
+    """Restart the peak measured by `peak_rss_mb` (Linux only), so it covers one document."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident memory of this process in MB since `reset_peak_rss`, or None where unavailable.
+
+    Without /proc (macOS), the peak is the one since the process started.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# ---------------------------------------------------------------------------
+# Batch mode
+# ---------------------------------------------------------------------------
+
+def _is_glob(source: str) -> bool:
+    return any(ch in source for ch in "*?[")
+
+
+def resolve_inputs(source: str) -> Tuple[Path, List[Path]]:
+    """(root, PDFs) for a directory (searched recursively) or a glob; outputs mirror paths below root."""
+    if _is_glob(source):
+        parts = Path(source).parts
+        fixed = next(i for i, part in enumerate(parts) if _is_glob(part))
+        root = Path(*parts[:fixed]) if fixed else Path(".")
+        paths = [Path(p) for p in glob.glob(source, recursive=True)]
+    else:
+        root = Path(source)
+        paths = list(root.rglob("*"))
+    return root, sorted(p for p in paths if p.is_file() and p.suffix.lower() == ".pdf")
+
+
+# Redacts one document: process_pdf or process_pdf_low_memory, with the CLI's options bound
+Redact = Callable[[Path, Path, RuleSet], int]
+
+_rules = DEFAULT_RULES
+_redact: Redact = process_pdf
+
+
+def _init_worker(rules: RuleSet = DEFAULT_RULES, redact: Redact = process_pdf) -> None:
+    global _rules, _redact
+    _rules = rules  # compiled once per worker, not per document
+    _redact = redact
+    # Forked workers inherit the parent's random state; reseed so order numbers differ per document
+    random.seed()
+
+
+def _redact_task(task: Tuple[Path, Path, bool, Optional[str]]) -> Dict[str, Any]:
+    """Worker: redact one document, never raising; returns its manifest entry.
+
+    With *known_sha*, the document is skipped if its content still hashes to it.
+    """
+    input_path, output_path, overwrite, known_sha = task
+    entry: Dict[str, Any] = {"input": str(input_path), "output": str(output_path)}
+    if output_path.exists() and not overwrite:
+        return {**entry, "status": "skipped", "reason": "output exists"}
+    start = time.perf_counter()
+    try:
+        sha = sha256_file(input_path)
+        if sha == known_sha:
+            return {**entry, "status": "skipped", "reason": "unchanged", "sha256": sha}
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        reset_peak_rss()
+        replaced = _redact(input_path, output_path, _rules)
+        peak = peak_rss_mb()
+        output_sha = sha256_file(output_path)
+    except Exception as e:  # a broken PDF must not stop the batch
+        return {**entry, "status": "failed", "seconds": round(time.perf_counter() - start, 3),
+                "error": f"{type(e).__name__}: {e}"}
+    return {**entry, "status": "ok", "seconds": round(time.perf_counter() - start, 3), "replaced": replaced,
+            "peak_rss_mb": peak, "output_bytes": output_path.stat().st_size,
+            "sha256": sha, "output_sha256": output_sha}
+
+
+def process_batch(inputs: List[Path], root: Path, output_dir: Path, workers: Optional[int] = None,
+                  overwrite: bool = False, rules: RuleSet = DEFAULT_RULES,
+                  cache: Optional[RedactionCache] = None, redact: Redact = process_pdf) -> Dict[str, Any]:
+    """Redact *inputs* into the mirrored tree under *output_dir*; writes and returns the manifest.
+
+    With a *cache*, documents it knows to be up to date are skipped without being read,
+    and the others are redacted whether or not their output exists.
+    """
+    report = default_reporter()
+    pairs = ((path, output_dir / path.relative_to(root)) for path in inputs)
+    workers = workers or os.cpu_count() or 1
+    files: List[Dict[str, Any]] = []
+    started = time.perf_counter()
+
+    def record(entry: Dict[str, Any]) -> None:
+        files.append(entry)
+        if cache is not None:
+            cache.store(entry)
+        report.advance()
+        if entry["status"] == "failed":
+            report.warning(f"❌ {entry['input']}: {entry['error']}")
+        else:
+            report.debug(f"{entry['status']}: {entry['input']} ({entry.get('seconds', 0)} s, "
+                         f"peak RSS {entry.get('peak_rss_mb')} MB, {entry.get('output_bytes')} bytes)")
+
+    def planned():
+        for input_path, output_path, state, known_sha in cache.plan(pairs):
+            if state == "unchanged" and not overwrite:
+                record({"input": str(input_path), "output": str(output_path), "status": "skipped",
+                        "reason": "unchanged"})
+                continue
+            yield input_path, output_path, True, None if overwrite else known_sha
+
+    tasks = planned() if cache is not None else ((i, o, overwrite, None) for i, o in pairs)
+
+    if workers == 1:
+        _init_worker(rules, redact)
+        for task in tasks:
+            record(_redact_task(task))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(rules, redact)) as pool:
+            # One document per task; a bounded window keeps huge archives from queueing every task up front
+            pending = deque(pool.submit(_redact_task, task) for task in islice(tasks, 2 * workers))
+            while pending:
+                entry = pending.popleft().result()
+                for task in islice(tasks, 1):
+                    pending.append(pool.submit(_redact_task, task))
+                record(entry)
+
+    if cache is not None:
+        cache.commit()
+    timings = sorted(f["seconds"] for f in files if f["status"] == "ok")
+    peaks = [f["peak_rss_mb"] for f in files if f.get("peak_rss_mb") is not None]
+    manifest = {
+        "rules_version": rules.version,
+        "input_root": str(root),
+        "output_root": str(output_dir),
+        "workers": workers,
+        "total": len(files),
+        **{status: sum(f["status"] == status for f in files) for status in ("ok", "failed", "skipped")},
+        "elapsed_s": round(time.perf_counter() - started, 3),
+        "seconds_per_file": {"p50": timings[len(timings) // 2], "max": timings[-1]} if timings else None,
+        "peak_rss_mb_max": max(peaks) if peaks else None,
+        "output_bytes": sum(f.get("output_bytes", 0) for f in files),
+        **({"cache": cache.stats} if cache is not None else {}),
+        "files": files,
+    }
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with open(output_dir / MANIFEST_NAME, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
 
 
 # ---------------------------------------------------------------------------
@@ -174,19 +416,69 @@ def process_pdf(input_path: Path, output_path: Path) -> None:
 # ---------------------------------------------------------------------------
 
 def _parse_args():
-    p = argparse.ArgumentParser(description="Replace PHI data in a pathology report PDF.")
-    p.add_argument("--input", required=True, type=Path, help="Path to source PDF (will not be modified).")
-    p.add_argument("--output", required=True, type=Path, help="Path where sanitized copy will be written.")
+    p = argparse.ArgumentParser(description="Replace PHI data in pathology report PDFs.")
+    p.add_argument("--input", required=True,
+                   help="Source PDF, or a directory / glob of PDFs for batch mode (never modified).")
+    p.add_argument("--output", required=True, type=Path,
+                   help="Sanitized copy, or the output directory mirroring the input tree in batch mode.")
+    p.add_argument("--workers", type=int, default=None, help="Batch mode: worker processes (default: CPU count).")
+    p.add_argument("--overwrite", action="store_true", help="Batch mode: redact again even if the output exists.")
+    p.add_argument("--cache", default=None,
+                   help="Batch mode: content-hash cache file; only redact PDFs that changed since the last run.")
+    p.add_argument("--rules", default=None,
+                   help="JSON rule file (see phi_rules.py); default: the built-in LABELS.")
+    p.add_argument("--low-memory", action="store_true",
+                   help="Redact page by page, flushing to disk every --flush-pages pages (very large PDFs).")
+    p.add_argument("--flush-pages", type=int, default=FLUSH_PAGES,
+                   help=f"--low-memory: pages between flushes (default: {FLUSH_PAGES}).")
+    p.add_argument("--image-dpi", type=int, default=None,
+                   help="Recompress images above this resolution to it, as JPEG, when saving.")
+    add_reporting_args(p)
     return p.parse_args()
 
 
-if __name__ == "__main__":
+def main() -> None:
     args = _parse_args()
-    if not args.input.exists():
+    report = default_reporter().configure_from_args(args)
+    rules = load_rules(args.rules, DEFAULT_RULES)
+    if args.low_memory:
+        redact = partial(process_pdf_low_memory, image_dpi=args.image_dpi, flush_pages=max(1, args.flush_pages))
+    else:
+        redact = partial(process_pdf, image_dpi=args.image_dpi)
+
+    if Path(args.input).is_file():
+        input_path = Path(args.input)
+        if args.output.exists():
+            raise SystemExit(f"Output file {args.output} already exists – will not overwrite")
+        reset_peak_rss()
+        redact(input_path, args.output, rules)
+        print(f"Sanitized PDF written to {args.output} ({args.output.stat().st_size} bytes, "
+              f"peak RSS {peak_rss_mb()} MB)")
+        return
+
+    if not _is_glob(args.input) and not Path(args.input).is_dir():
         raise SystemExit(f"Input file {args.input} does not exist")
+    root, inputs = resolve_inputs(args.input)
+    if not inputs:
+        raise SystemExit(f"No PDFs found in {args.input}")
+
+    report.info(f"Redacting {len(inputs)} PDFs from {root} into {args.output} ({len(rules)} rules, version {rules.version})")
+    # Recompressed images change the output, so they are part of what the cache compares
+    cache_key = f"{rules.digest}+images@{args.image_dpi}" if args.image_dpi else rules.digest
+    cache = RedactionCache(args.cache, cache_key) if args.cache else None
+    if cache is not None:
+        report.info(f"Cache: {args.cache} ({len(cache)} PDFs)")
+    report.start(total=len(inputs), label="PDFs")
+    try:
+        manifest = process_batch(inputs, root, args.output, args.workers, args.overwrite, rules, cache, redact)
+    finally:
+        if cache is not None:
+            cache.close()
+    report.summary(**{k: v for k, v in manifest.items() if k != "files"},
+                   manifest=str(args.output / MANIFEST_NAME))
+    if manifest["failed"]:
+        sys.exit(1)
 
-    if args.output.exists():
-        raise SystemExit(f"Output file {args.output} already exists – will not overwrite")
 
-    process_pdf(args.input, args.output)
-    print(f"Sanitized PDF written to {args.output}") 
\ No newline at end of file
+if __name__ == "__main__":
+    main() 
\ No newline at end of file
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+export_backends.py
+------------------
+Output formats for generated collections (`patient_histories`, `patient_tags`).
+
+Every backend takes an iterator of records and writes them as a stream:
+
+- `json`     – JSON array, one compact record per line (the generators' classic
+               output; `mongoimport --jsonArray`)
+- `ndjson`   – newline-delimited MongoDB Extended JSON (`{"$date": ...}`,
+               `{"$oid": ...}` as generated), optionally .gz/.zst. mongoimport reads it
+               without `--jsonArray`, so `--numInsertionWorkers` can split the work
+- `parquet`  – one row per record with the nested parts flattened into typed columns
+               (prescription parameters become one column each, vaccination shots a
+               list of structs, dates real dates/timestamps), for DuckDB / pandas /
+               Spark. Written in row groups, so memory is bounded by `row_group_size`.
+
+The format is taken from `--format` or else the output file name (`.parquet`,
+`.ndjson[.gz|.zst]` / `.jsonl`, anything else is `json`).
+
+Parquet needs `pip install pyarrow`; the other formats have no extra dependencies.
+
+Usage
+-----
+    from export_backends import add_export_args, export_records, resolve_output
+
+    add_export_args(parser, default_output="generated_patient_tags.json")
+    path, fmt = resolve_output(args.output, args.format)
+    export_records(tags, path, fmt, layout="patient_tags")
+"""
+
+from __future__ import annotations
+
+import json
+from datetime import date, datetime, timezone
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from history_template import PRESCRIPTION_PARAMS
+from patient_stream import write_json_array, write_ndjson_shard
+
+FORMATS = ("json", "ndjson", "parquet")
+SUFFIXES = {"json": ".json", "ndjson": ".ndjson", "parquet": ".parquet"}
+
+Record = Dict[str, Any]
+
+
+def format_for(path: str) -> str:
+    """Export format implied by *path*'s name."""
+    name = Path(path).name
+    if name.endswith(".parquet"):
+        return "parquet"
+    if ".ndjson" in name or name.endswith((".jsonl", ".jsonl.gz", ".jsonl.zst")):
+        return "ndjson"
+    return "json"
+
+
+def resolve_output(output: str, fmt: Optional[str] = None) -> Tuple[str, str]:
+    """(path, format): an explicit *fmt* swaps a `.json` suffix on *output* for the format's own."""
+    if fmt is None:
+        return output, format_for(output)
+    path = Path(output)
+    if path.suffix == ".json" and fmt != "json":
+        path = path.with_suffix(SUFFIXES[fmt])
+    return str(path), fmt
+
+
+def add_export_args(parser, default_output: str) -> None:
+    """Add `--output` and `--format` to *parser*."""
+    group = parser.add_argument_group("export")
+    group.add_argument("--output", default=default_output,
+                       help=f"Output file (default: {default_output}).")
+    group.add_argument("--format", choices=FORMATS, default=None,
+                       help="json array, ndjson (Extended JSON, .gz/.zst by name) or parquet "
+                            "(default: from the --output name).")
+
+
+# ---------------------------------------------------------------------------
+# Parquet layouts: record -> flat row, plus the matching Arrow schema
+# ---------------------------------------------------------------------------
+
+def _oid(value: Any) -> Any:
+    return value.get("$oid") if isinstance(value, dict) else value
+
+
+def _timestamp(value: Any) -> Optional[datetime]:
+    """`{"$date": iso}`, an ISO string or a datetime as an aware UTC datetime."""
+    if isinstance(value, dict):
+        value = value.get("$date")
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00") if value.endswith("Z") else value)
+    if isinstance(value, datetime) and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+_DMY_CACHE: Dict[str, Optional[date]] = {}
+
+
+def _dmy(value: Optional[str]) -> Optional[date]:
+    """`DD-MM-YYYY` as a date; the generators reuse few distinct days, so parses are cached."""
+    if not value:
+        return None
+    parsed = _DMY_CACHE.get(value)
+    if parsed is None:
+        parsed = _DMY_CACHE[value] = datetime.strptime(value, "%d-%m-%Y").date()
+    return parsed
+
+
+def _number(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+NUMERIC_PARAMS = [code for code, _, _, ref_range in PRESCRIPTION_PARAMS if ref_range and ref_range[0] is not None]
+CHOICE_PARAMS = [code for code, _, _, ref_range in PRESCRIPTION_PARAMS if code not in NUMERIC_PARAMS]
+
+
+def _audit_columns(audit: Record) -> Record:
+    return {
+        "created_on": _timestamp(audit.get("created_on")),
+        "updated_on": _timestamp(audit.get("updated_on")),
+        "created_by": _oid(audit.get("created_by")),
+        "updated_by": _oid(audit.get("updated_by")),
+    }
+
+
+def flatten_history(history: Record) -> Record:
+    vascular_access = history.get("vascular_access") or {}
+    runtime = history.get("dialysis_runtime") or {}
+    row = {
+        "patient_id": _oid(history.get("patient_id")),
+        "vascular_access": vascular_access.get("value"),
+        "vascular_access_created": _dmy(vascular_access.get("created")),
+        "dry_weight_kg": _number((history.get("dry_weight") or {}).get("value")),
+        "dialysis_runtime_minutes": runtime.get("hours", 0) * 60 + runtime.get("minutes", 0) if runtime else None,
+        "diagnosis": history.get("diagnosis"),
+    }
+    params = {p.get("code"): p.get("value") for p in history.get("prescription_params", [])}
+    for code in NUMERIC_PARAMS:
+        row[code.lower()] = _number(params.get(code))
+    for code in CHOICE_PARAMS:
+        row[code.lower()] = params.get(code)
+    series = history.get("vaccination") or []
+    row["vaccinated_against"] = [v.get("infection") for v in series]
+    row["vaccination_shots"] = [
+        {"infection": v.get("infection"), "count": shot.get("count"), "kind": shot.get("kind"),
+         "date": _dmy(shot.get("date"))}
+        for v in series for shot in v.get("shots", [])
+    ]
+    row.update(_audit_columns(history.get("audit") or {}))
+    return row
+
+
+def _history_schema(pa):
+    timestamp = pa.timestamp("us", tz="UTC")
+    return pa.schema(
+        [("patient_id", pa.string()), ("vascular_access", pa.string()), ("vascular_access_created", pa.date32()),
+         ("dry_weight_kg", pa.float64()), ("dialysis_runtime_minutes", pa.int32()), ("diagnosis", pa.string())]
+        + [(code.lower(), pa.float64()) for code in NUMERIC_PARAMS]
+        + [(code.lower(), pa.string()) for code in CHOICE_PARAMS]
+        + [("vaccinated_against", pa.list_(pa.string())),
+           ("vaccination_shots", pa.list_(pa.struct([("infection", pa.string()), ("count", pa.int32()),
+                                                      ("kind", pa.string()), ("date", pa.date32())]))),
+           ("created_on", timestamp), ("updated_on", timestamp),
+           ("created_by", pa.string()), ("updated_by", pa.string())]
+    )
+
+
+def flatten_tags(record: Record) -> Record:
+    tags = record.get("tags") or []
+    return {
+        "patient_id": _oid(record.get("patientId")),
+        "organization_id": _oid(record.get("organizationId")),
+        "category": record.get("category"),
+        "version": record.get("version"),
+        "tag_names": [t.get("name") for t in tags],
+        "tags": [{"name": t.get("name"), "since": _timestamp(t.get("since"))} for t in tags],
+        **_audit_columns(record.get("audit") or {}),
+    }
+
+
+def _tags_schema(pa):
+    timestamp = pa.timestamp("us", tz="UTC")
+    return pa.schema([
+        ("patient_id", pa.string()), ("organization_id", pa.string()), ("category", pa.string()),
+        ("version", pa.string()), ("tag_names", pa.list_(pa.string())),
+        ("tags", pa.list_(pa.struct([("name", pa.string()), ("since", timestamp)]))),
+        ("created_on", timestamp), ("updated_on", timestamp), ("created_by", pa.string()), ("updated_by", pa.string()),
+    ])
+
+
+# layout name: (flatten, schema factory taking the pyarrow module)
+PARQUET_LAYOUTS: Dict[str, Tuple[Callable[[Record], Record], Callable[[Any], Any]]] = {
+    "patient_histories": (flatten_history, _history_schema),
+    "patient_tags": (flatten_tags, _tags_schema),
+}
+
+
+def write_parquet(records: Iterable[Record], path: str, layout: str, row_group_size: int = 50_000,
+                  compression: str = "zstd") -> int:
+    """Flatten *records* with *layout* and write them to *path* one row group at a time. Returns the count."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Parquet export requires `pip install pyarrow`")
+
+    flatten, schema_for = PARQUET_LAYOUTS[layout]
+    schema = schema_for(pa)
+    count = 0
+    it = iter(records)
+    with pq.ParquetWriter(path, schema, compression=compression) as writer:
+        while True:
+            rows: List[Record] = [flatten(r) for r in islice(it, row_group_size)]
+            if not rows:
+                break
+            writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+            count += len(rows)
+    return count
+
+
+def export_records(records: Iterable[Any], path: str, fmt: str, layout: str,
+                   encode: Optional[Callable[[Record], str]] = None, row_group_size: int = 50_000) -> int:
+    """Write *records* to *path* in *fmt*. Returns the record count.
+
+    *encode* serializes a record for the JSON formats (default: compact `json.dumps`);
+    records may also already be encoded JSON lines, which Parquet decodes again.
+    """
+    if fmt == "parquet":
+        return write_parquet((json.loads(r) if isinstance(r, str) else r for r in records), path, layout,
+                             row_group_size)
+    if encode is not None:
+        records = (r if isinstance(r, str) else encode(r) for r in records)
+    path_obj = Path(path)
+    if fmt == "ndjson":
+        suffix = path_obj.suffix
+        return write_ndjson_shard(records, path_obj, "gz" if suffix == ".gz" else "zst" if suffix == ".zst" else "none")
+    return write_json_array(records, path_obj)
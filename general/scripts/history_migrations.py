@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+history_migrations.py
+---------------------
+Streaming schema migrations for `patient_histories` exports.
+
+A migration is a function that takes one history record and returns the fixed record
+(mutating it in place is fine) or `None` to drop it. Migrations are registered by
+name, in order, with the `@migration` decorator; a run applies the whole chain, or the
+subset named with `--only`, to every record:
+
+    @migration("strip_diagnosis", "Trim whitespace around the diagnosis")
+    def strip_diagnosis(history):
+        history["diagnosis"] = history["diagnosis"].strip()
+        return history
+
+Migrations defined in other modules are picked up with `--plugin module_name` (the
+module registers them on import).
+
+Records are read one at a time (`patient_stream.iter_patient_file`; JSON arrays are
+streamed with ijson when it is installed) and written as they are migrated, so memory
+use does not depend on the size of the export. A shard directory or glob is migrated
+shard by shard in a process pool, writing one output shard per input shard.
+
+Usage
+-----
+    (venv)$ python general/scripts/history_migrations.py --input create_patient_histories.json \\
+                --output patient_histories_fixed.json
+    (venv)$ python general/scripts/history_migrations.py --input histories/ --output fixed/ --workers 8
+    (venv)$ python general/scripts/history_migrations.py --list
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from history_template import HISTORY_KEYS, HISTORY_TEMPLATE
+from patient_stream import (MANIFEST_NAME, iter_patient_file, resolve_patient_files, write_manifest,
+                            write_ndjson_shard)
+from progress_report import add_reporting_args, default_reporter
+
+Record = Dict[str, Any]
+MigrationFn = Callable[[Record], Optional[Record]]
+
+MIGRATIONS: Dict[str, "Migration"] = {}
+
+
+class Migration:
+    __slots__ = ("name", "description", "fn")
+
+    def __init__(self, name: str, description: str, fn: MigrationFn):
+        self.name = name
+        self.description = description
+        self.fn = fn
+
+
+def register_migration(name: str, fn: MigrationFn, description: str = "") -> MigrationFn:
+    """Append *fn* to the migration chain under *name*."""
+    if name in MIGRATIONS:
+        raise ValueError(f"migration {name!r} is already registered")
+    MIGRATIONS[name] = Migration(name, description or (fn.__doc__ or "").strip(), fn)
+    return fn
+
+
+def migration(name: str, description: str = ""):
+    """Decorator form of `register_migration`."""
+    def decorator(fn: MigrationFn) -> MigrationFn:
+        return register_migration(name, fn, description)
+    return decorator
+
+
+def resolve_chain(names: Optional[Sequence[str]] = None) -> List[Migration]:
+    """Registered migrations in registration order, optionally restricted to *names*."""
+    if not names:
+        return list(MIGRATIONS.values())
+    unknown = [n for n in names if n not in MIGRATIONS]
+    if unknown:
+        raise ValueError(f"unknown migration(s): {', '.join(unknown)}; see --list")
+    return [m for m in MIGRATIONS.values() if m.name in names]
+
+
+def load_plugins(modules: Iterable[str]) -> None:
+    for module in modules:
+        importlib.import_module(module)
+
+
+# ---------------------------------------------------------------------------
+# Built-in migrations (what fix_patient_histories.py used to hard-code)
+# ---------------------------------------------------------------------------
+
+@migration("audit_dates", "Audit created_on/updated_on as MongoDB {\"$date\": ...} objects")
+def audit_dates(history: Record) -> Record:
+    audit = history.get("audit") or {}
+    for key in ("created_on", "updated_on"):
+        value = audit.get(key)
+        if value is not None and not isinstance(value, dict):
+            audit[key] = {"$date": value}
+    return history
+
+
+@migration("temperature_unit", "Dialysate temperature unit '˚c' (ring above), not '°c'")
+def temperature_unit(history: Record) -> Record:
+    for param in history.get("prescription_params", []):
+        if param.get("code") == "DLSTTEMP" and param["units"].get("unit") != "˚c":
+            # Copy first: template-built records share their units sub-tree
+            param["units"] = {**param["units"], "unit": "˚c"}
+    return history
+
+
+@migration("schema_fields", "Keep only the patient_histories fields, in schema order (drops _id)")
+def schema_fields(history: Record) -> Record:
+    if tuple(history) == HISTORY_KEYS:
+        return history
+    return {key: history[key] for key in HISTORY_KEYS if key in history}
+
+
+# ---------------------------------------------------------------------------
+# Engine
+# ---------------------------------------------------------------------------
+
+def migrate_records(records: Iterable[Record], chain: Sequence[Migration],
+                    stats: Optional[Dict[str, int]] = None) -> Iterator[Record]:
+    """Apply *chain* to each record lazily; records a migration returns None for are dropped."""
+    for record in records:
+        for step in chain:
+            record = step.fn(record)
+            if record is None:
+                if stats is not None:
+                    stats[f"dropped_by_{step.name}"] = stats.get(f"dropped_by_{step.name}", 0) + 1
+                break
+        else:
+            yield record
+
+
+def _write(records: Iterable[Record], output: Path) -> int:
+    if output.suffix == ".json":
+        return HISTORY_TEMPLATE.write_json_array(records, str(output))
+    return write_ndjson_shard((HISTORY_TEMPLATE.dumps(r) for r in records), output,
+                              "gz" if output.suffix == ".gz" else "zst" if output.suffix == ".zst" else "none")
+
+
+def migrate_file(source: Path, output: Path, names: Optional[Sequence[str]] = None,
+                 plugins: Sequence[str] = (), progress: bool = True) -> Dict[str, Any]:
+    """Migrate one file (JSON array or NDJSON, optionally .gz/.zst) into *output*."""
+    load_plugins(plugins)
+    stats: Dict[str, int] = {}
+    records = iter_patient_file(str(source))
+    if progress:
+        records = _counted(records)
+    written = _write(migrate_records(records, resolve_chain(names), stats), output)
+    return {"file": output.name, "records": written, **stats}
+
+
+def _counted(records: Iterable[Record]) -> Iterator[Record]:
+    report = default_reporter()
+    for record in records:
+        report.advance()
+        yield record
+
+
+def _migrate_shard(task) -> Dict[str, Any]:
+    source, output, names, plugins = task
+    return migrate_file(source, output, names, plugins, progress=False)
+
+
+def migrate_shards(sources: List[Path], output_dir: Path, names: Optional[Sequence[str]] = None,
+                   plugins: Sequence[str] = (), workers: Optional[int] = None) -> Dict[str, Any]:
+    """Migrate each input shard into *output_dir* under the same name, in parallel.
+
+    Writes a manifest for the output shards and returns it; `dropped_by_*` counts are
+    summed over all shards.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    tasks = [(src, output_dir / src.name, names, plugins) for src in sources]
+    report = default_reporter()
+    shards: List[Dict[str, Any]] = []
+    if workers == 1 or len(tasks) <= 1:
+        results = map(_migrate_shard, tasks)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = pool.map(_migrate_shard, tasks)
+    try:
+        for shard in results:
+            shards.append(shard)
+            report.advance(shard["records"])
+    finally:
+        if pool:
+            pool.shutdown()
+
+    dropped: Dict[str, int] = {}
+    for shard in shards:
+        for key, value in shard.items():
+            if key.startswith("dropped_by_"):
+                dropped[key] = dropped.get(key, 0) + value
+    compression = "gz" if sources[0].suffix == ".gz" else "zst" if sources[0].suffix == ".zst" else "none"
+    manifest = write_manifest(output_dir, [{"file": s["file"], "records": s["records"]} for s in shards],
+                              max(s["records"] for s in shards), compression,
+                              migrations=[m.name for m in resolve_chain(names)])
+    return {**manifest, **dropped}
+
+
+def run(source: str, output: str, names: Optional[Sequence[str]] = None, plugins: Sequence[str] = (),
+        workers: Optional[int] = None) -> Dict[str, Any]:
+    """Migrate *source* (file, shard directory or glob) to *output*. Returns run statistics."""
+    load_plugins(plugins)
+    sources = resolve_patient_files(source)
+    output_path = Path(output)
+    if len(sources) == 1 and not output_path.is_dir() and output_path.suffix:
+        return migrate_file(sources[0], output_path, names, plugins)
+    manifest = migrate_shards(sources, output_path, names, plugins, workers)
+    dropped = {k: v for k, v in manifest.items() if k.startswith("dropped_by_")}
+    return {"file": str(output_path / MANIFEST_NAME), "records": manifest["total"], **dropped}
+
+
+def main():
+    p = argparse.ArgumentParser(description="Apply registered schema migrations to patient_histories exports.")
+    p.add_argument("--input", default="create_patient_histories.json",
+                   help="JSON array, NDJSON file (optionally .gz/.zst), shard directory or glob.")
+    p.add_argument("--output", default="patient_histories_fixed.json",
+                   help="*.json array, *.ndjson[.gz|.zst] file, or a directory for sharded input.")
+    p.add_argument("--only", default=None, help="Comma-separated migrations to apply (default: all).")
+    p.add_argument("--plugin", action="append", default=[], help="Import a module that registers migrations.")
+    p.add_argument("--workers", type=int, default=None, help="Processes for sharded input.")
+    p.add_argument("--list", action="store_true", help="List registered migrations and exit.")
+    add_reporting_args(p)
+    args = p.parse_args()
+    report = default_reporter().configure_from_args(args)
+
+    load_plugins(args.plugin)
+    if args.list:
+        for m in MIGRATIONS.values():
+            print(f"{m.name:20s} {m.description}")
+        return
+    names = [n.strip() for n in args.only.split(",")] if args.only else None
+    try:
+        chain = resolve_chain(names)
+        resolve_patient_files(args.input)
+    except ValueError as e:
+        report.error(f"Error: {e}")
+        return
+    except FileNotFoundError:
+        report.error(f"Error: {args.input} file not found!")
+        return
+
+    report.info(f"Migrating {args.input} -> {args.output}")
+    report.info(f"Migrations: {', '.join(m.name for m in chain)}")
+    report.start(label="histories")
+    result = run(args.input, args.output, names, args.plugin, args.workers)
+    report.summary(**result, migrations=[m.name for m in chain])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+history_template.py
+-------------------
+Precompiled template for `patient_histories` records, shared by
+`create_patient_histories_script.py` and `smf/scripts/generate_patient_histories.py`.
+
+A history is mostly constant: every dry-weight and prescription parameter carries the
+same `code` / `name` / `units` / `ref_range` sub-tree, and only its `value` changes
+per patient. The template builds those sub-trees once:
+
+- `build(...)` returns a history dict whose constant sub-trees are *shared* between
+  all records (treat them as read-only); per patient only the variable slots are
+  allocated.
+- `dumps(history)` serializes a history by splicing pre-encoded JSON fragments for
+  the constant parts and encoding only the variable slots. `json.loads` of the
+  result equals the dict.
+- `write_json_array(histories, path)` writes a JSON array with one compact record
+  per line.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# (code, name, unit, ref_range) for every parameter in a history, in record order.
+# ref_range is (min, max), (None, None) for dropdowns, or None (dry weight has none).
+DRY_WEIGHT_PARAM = ("DRYWT", "Dry Weight", "Kg", None)
+PRESCRIPTION_PARAMS: Tuple[Tuple[str, str, str, Optional[tuple]], ...] = (
+    ("QBLD", "Quantum of blood", "ml/hr", (300, 500)),
+    ("QDLST", "Quantum of dialysate", "ml/hr", (500, 800)),
+    ("DLSTTEMP", "Dialysate temperature", "˚c", (35, 37.5)),
+    ("BICON", "Bicarb Concentration", "mmol/l", (24, 35)),
+    ("DLZRUSE", "Dialyzer Use", "", (None, None)),
+    ("HEPTYPE", "Heparin Type", "", (None, None)),
+)
+
+HISTORY_KEYS = ("patient_id", "vascular_access", "dry_weight", "dialysis_runtime",
+                "prescription_params", "diagnosis", "vaccination", "audit")
+
+
+def _units(unit: str, ref_range: Optional[tuple]) -> Dict[str, Any]:
+    return {
+        "unit": unit,
+        "ucum_code": None,
+        "is_default": None,
+        "ref_value": None,
+        "ref_range": None if ref_range is None else {
+            "min": ref_range[0],
+            "max": ref_range[1],
+            "systolic": None,
+            "diastolic": None
+        },
+        "format": None
+    }
+
+
+class _Param:
+    """One parameter: its shared `units` sub-tree and the pre-encoded JSON up to `"value":`."""
+
+    __slots__ = ("code", "name", "units", "prefix")
+
+    def __init__(self, code: str, name: str, unit: str, ref_range: Optional[tuple]):
+        self.code = code
+        self.name = name
+        self.units = _units(unit, ref_range)
+        encoded = json.dumps({"code": code, "name": name, "units": self.units}, separators=(",", ":"))
+        self.prefix = encoded[:-1] + ',"value":'
+
+    def build(self, value: Any) -> Dict[str, Any]:
+        return {"code": self.code, "name": self.name, "units": self.units, "value": value}
+
+
+class HistoryTemplate:
+    """Builds and serializes patient histories; see module docstring."""
+
+    def __init__(self, dry_weight=DRY_WEIGHT_PARAM, prescription_params=PRESCRIPTION_PARAMS):
+        self.dry_weight = _Param(*dry_weight)
+        self.params = [_Param(*spec) for spec in prescription_params]
+        self._by_code = {p.code: p for p in [self.dry_weight, *self.params]}
+
+    def param(self, code: str) -> _Param:
+        """Compiled parameter for *code*, for generators that build parameters one by one."""
+        return self._by_code[code]
+
+    def build(self, patient_id: Any, vascular_access: Dict[str, Any], dry_weight: Any,
+              dialysis_runtime: Dict[str, Any], param_values: Sequence[Any], diagnosis: str,
+              vaccination: List[Dict[str, Any]], audit: Dict[str, Any]) -> Dict[str, Any]:
+        """History dict; *param_values* are the prescription values in `PRESCRIPTION_PARAMS` order."""
+        return {
+            "patient_id": patient_id,
+            "vascular_access": vascular_access,
+            "dry_weight": self.dry_weight.build(dry_weight),
+            "dialysis_runtime": dialysis_runtime,
+            "prescription_params": [p.build(v) for p, v in zip(self.params, param_values)],
+            "diagnosis": diagnosis,
+            "vaccination": vaccination,
+            "audit": audit,
+        }
+
+    # -- serialization ------------------------------------------------------
+
+    def _dumps_param(self, param: Dict[str, Any]) -> str:
+        compiled = self._by_code.get(param.get("code"))
+        if compiled is None or param.get("units") is not compiled.units or len(param) != 4:
+            return _dumps(param)  # not built from this template
+        return compiled.prefix + _dumps(param["value"]) + "}"
+
+    def dumps(self, history: Dict[str, Any]) -> str:
+        """Compact JSON for *history*, splicing the pre-encoded constant fragments."""
+        if tuple(history) != HISTORY_KEYS:
+            return _dumps(history)
+        return "".join((
+            '{"patient_id":', _dumps(history["patient_id"]),
+            ',"vascular_access":', _dumps(history["vascular_access"]),
+            ',"dry_weight":', self._dumps_param(history["dry_weight"]),
+            ',"dialysis_runtime":', _dumps(history["dialysis_runtime"]),
+            ',"prescription_params":[', ",".join(self._dumps_param(p) for p in history["prescription_params"]),
+            '],"diagnosis":', _dumps(history["diagnosis"]),
+            ',"vaccination":', _dumps(history["vaccination"]),
+            ',"audit":', _dumps(history["audit"]),
+            "}",
+        ))
+
+    def write_json_array(self, histories: Iterable[Dict[str, Any]], path: str) -> int:
+        """Write *histories* as a JSON array, one compact record per line. Returns the count."""
+        count = 0
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("[")
+            for history in histories:
+                f.write(",\n" if count else "\n")
+                f.write(self.dumps(history))
+                count += 1
+            f.write("\n]\n")
+        return count
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), default=str)
+
+
+HISTORY_TEMPLATE = HistoryTemplate()
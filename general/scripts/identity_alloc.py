@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+identity_alloc.py
+-----------------
+Collision-free email and phone allocation for generated patients.
+
+Every patient of a run gets a sequential *identity index*. The index is mapped through
+a keyed permutation (a small Feistel network with cycle walking) onto the email-suffix
+and phone-number spaces. A permutation never maps two indexes to the same value, so:
+
+- within a run, patients with distinct indexes never share an email or phone number;
+- across runs, uniqueness holds as long as the runs use disjoint index ranges under
+  the same key. `reserve_identities` hands out such ranges from a small JSON ledger.
+
+Nothing is remembered per identity, so memory use does not depend on how many
+identities are allocated. The permuted values look random, not sequential.
+
+Formats
+-------
+- email: `first.last{suffix}@example.com`, suffix in 1..EMAIL_SUFFIX_SPACE
+- phone: `+91{number}`, number in PHONE_MIN..PHONE_MAX (same range as before)
+
+Runs on separate machines must use the same `--id-key` with non-overlapping
+`--id-offset` values, or share the ledger file. Concurrent runs on one machine take an
+exclusive lock on `<ledger>.lock` while they advance the ledger.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: runs sharing a ledger must not start at the same moment
+    fcntl = None
+
+DEFAULT_KEY = "jano-demo-patients"
+DEFAULT_LEDGER = "patient_identity_ledger.json"
+
+EMAIL_SUFFIX_SPACE = 100_000_000
+PHONE_MIN, PHONE_MAX = 7000000000, 9999999999
+
+_MASK64 = (1 << 64) - 1
+_MIX = 0x9E3779B97F4A7C15
+
+
+class FeistelPermutation:
+    """Keyed bijection on `range(domain)`.
+
+    A balanced Feistel network permutes `[0, 2**bits)`; values that land outside the
+    domain are re-encrypted until they fall inside it (cycle walking), which restricts
+    the permutation to `[0, domain)`. Works on Python ints and on NumPy integer arrays,
+    with identical results.
+    """
+
+    def __init__(self, domain: int, key: str, rounds: int = 6):
+        if domain < 2:
+            raise ValueError("domain must be at least 2")
+        self.domain = domain
+        bits = max(2, (domain - 1).bit_length())
+        self.half = (bits + 1) // 2
+        self.mask = (1 << self.half) - 1
+        self.round_keys: List[int] = [
+            int.from_bytes(hashlib.sha256(f"{key}:{r}".encode()).digest()[:8], "big")
+            for r in range(rounds)
+        ]
+
+    # -- scalar -------------------------------------------------------------
+
+    def _encrypt(self, x: int) -> int:
+        left, right = x >> self.half, x & self.mask
+        for k in self.round_keys:
+            f = (right + k) & _MASK64
+            f ^= f >> 31
+            f = (f * _MIX) & _MASK64
+            f ^= f >> 29
+            left, right = right, left ^ (f & self.mask)
+        return (left << self.half) | right
+
+    def permute(self, index: int) -> int:
+        if not 0 <= index < self.domain:
+            raise ValueError(f"index {index} outside permutation domain {self.domain}")
+        value = self._encrypt(index)
+        while value >= self.domain:
+            value = self._encrypt(value)
+        return value
+
+    # -- vectorized ---------------------------------------------------------
+
+    def _encrypt_array(self, x):
+        import numpy as np
+
+        half, mask = np.uint64(self.half), np.uint64(self.mask)
+        left, right = x >> half, x & mask
+        for k in self.round_keys:
+            f = right + np.uint64(k)
+            f ^= f >> np.uint64(31)
+            f *= np.uint64(_MIX)
+            f ^= f >> np.uint64(29)
+            left, right = right, left ^ (f & mask)
+        return (left << half) | right
+
+    def permute_array(self, indexes):
+        """Vectorized `permute` over an integer array; returns a uint64 array."""
+        import numpy as np
+
+        x = np.asarray(indexes, dtype=np.uint64)
+        if x.size and int(x.max()) >= self.domain:
+            raise ValueError(f"index outside permutation domain {self.domain}")
+        out = self._encrypt_array(x)
+        outside = out >= np.uint64(self.domain)
+        while outside.any():
+            out[outside] = self._encrypt_array(out[outside])
+            outside = out >= np.uint64(self.domain)
+        return out
+
+
+class IdentityAllocator:
+    """Maps identity indexes (`offset + i`) to unique email suffixes and phone numbers."""
+
+    def __init__(self, key: str = DEFAULT_KEY, offset: int = 0):
+        self.key = key
+        self.offset = offset
+        self._emails = FeistelPermutation(EMAIL_SUFFIX_SPACE, f"{key}:email")
+        self._phones = FeistelPermutation(PHONE_MAX - PHONE_MIN + 1, f"{key}:phone")
+        self.capacity = min(self._emails.domain, self._phones.domain)
+
+    def email_suffix(self, index: int) -> int:
+        return self._emails.permute(self.offset + index) + 1
+
+    def phone_number(self, index: int) -> int:
+        return PHONE_MIN + self._phones.permute(self.offset + index)
+
+    def email(self, first_name: str, last_name: str, index: int) -> str:
+        return f"{first_name.lower()}.{last_name.lower()}{self.email_suffix(index)}@example.com"
+
+    def email_suffixes(self, start: int, count: int):
+        """Suffixes for indexes `start .. start + count - 1` as an int64 array."""
+        import numpy as np
+
+        indexes = np.arange(self.offset + start, self.offset + start + count, dtype=np.uint64)
+        return self._emails.permute_array(indexes).astype(np.int64) + 1
+
+    def phone_numbers(self, start: int, count: int):
+        """Phone numbers for indexes `start .. start + count - 1` as an int64 array."""
+        import numpy as np
+
+        indexes = np.arange(self.offset + start, self.offset + start + count, dtype=np.uint64)
+        return self._phones.permute_array(indexes).astype(np.int64) + PHONE_MIN
+
+
+def _read_ledger(path: Path) -> Dict[str, int]:
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+@contextmanager
+def _ledger_lock(path: Path) -> Iterator[None]:
+    """Hold an exclusive lock on the sidecar `<ledger>.lock` file."""
+    with open(path.with_suffix(path.suffix + ".lock"), "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def reserve_identities(count: int, ledger: Optional[str] = DEFAULT_LEDGER, key: str = DEFAULT_KEY,
+                       offset: Optional[int] = None, seed: Optional[int] = None) -> IdentityAllocator:
+    """Reserve *count* identity indexes and return an allocator for them.
+
+    With an explicit *offset* the ledger is not consulted. Otherwise the next free
+    offset for *key* is read from *ledger* and advanced past this run, under a lock so
+    concurrent runs get disjoint ranges. A seeded run records its range under its *seed*
+    and *count*, and a later run with the same ones gets the same range back, so seeded
+    output stays reproducible. Without a ledger, seeded runs start at offset 0.
+    """
+    if offset is None and ledger:
+        path = Path(ledger)
+        run = f"{key}/seed={seed}/count={count}"
+        with _ledger_lock(path):
+            state = _read_ledger(path)
+            if seed is not None and run in state:
+                offset = state[run]
+            else:
+                offset = state.get(key, 0)
+                state[key] = offset + count
+                if seed is not None:
+                    state[run] = offset
+            tmp = path.with_suffix(path.suffix + ".tmp")
+            with open(tmp, "w") as f:
+                json.dump(state, f, indent=2)
+            os.replace(tmp, path)
+    allocator = IdentityAllocator(key, offset or 0)
+    if allocator.offset + count > allocator.capacity:
+        raise ValueError(f"identity space exhausted: {allocator.offset} + {count} > {allocator.capacity}")
+    return allocator
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+mock_ops_api.py
+---------------
+Local stand-in for the Jano ops patients API (`https://api-stg2.janohealth.com/ops`),
+so the uploaders can be exercised and benchmarked without touching staging.
+
+Usage
+-----
+    (venv)$ pip install aiohttp
+    (venv)$ python general/scripts/mock_ops_api.py --port 8080 \
+        --latency lognormal:40:0.6 --error-rate 0.01 --rate-limit 200 --seed 1
+
+    (venv)$ python general/scripts/async_create_patients.py \
+        --base-url http://127.0.0.1:8080/ops --input create_patients.json
+
+Endpoints (all under `/ops`)
+----------------------------
+- `POST /patients?team_id=&org_id=` – validates the payload the way staging does and
+  returns the stored patient with a 24-hex ObjectId-style `_id` (HTTP 200).
+- `GET  /patients/{id}`             – returns a previously created patient, or 404.
+- `GET  /_stats`                    – request / status counters and latency percentiles
+                                       (over the last `STATS_WINDOW` requests).
+
+Fault injection
+---------------
+- `--latency SPEC` – per-request service time: `const:MS`, `uniform:LO_MS:HI_MS`,
+  `lognormal:MEDIAN_MS:SIGMA` or `exp:MEAN_MS`.
+- `--error-rate P` – fraction of requests answered with `--error-status` (default 500).
+- `--rate-limit RPS` / `--burst N` – token bucket; excess requests get 429 with a
+  `Retry-After` header.
+
+Everything is in memory; `--seed` makes latencies, injected errors and `_id`s repeatable
+(seeded `_id`s carry the fixed `SEEDED_ID_EPOCH` timestamp instead of the clock).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import math
+import os
+import random
+import re
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from aiohttp import web
+
+from script import AUTH_LEVELS, BLOOD_GROUPS, GENDERS, PHONE_TYPES, RELATIVE_TYPES, SALUTATIONS
+
+# ---------------------------------------------------------------------------
+# Validation
+# ---------------------------------------------------------------------------
+
+PHONE_RE = re.compile(r"^\+91[6-9]\d{9}$")
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+OBJECT_ID_RE = re.compile(r"^[0-9a-f]{24}$")
+DOB_FORMAT = "%d-%m-%Y"
+
+REQUIRED_FIELDS = {
+    "salutation": str,
+    "name": str,
+    "provided_dob": str,
+    "biological_dob": str,
+    "is_approx_dob": bool,
+    "gender": str,
+    "blood_group": str,
+    "phones": list,
+}
+ENUM_FIELDS = {
+    "salutation": SALUTATIONS,
+    "gender": GENDERS,
+    "blood_group": BLOOD_GROUPS,
+}
+
+
+def _check_dob(value: str, field: str, errors: List[str]) -> None:
+    try:
+        dob = datetime.strptime(value, DOB_FORMAT)
+    except ValueError:
+        errors.append(f"{field}: expected DD-MM-YYYY, got {value!r}")
+        return
+    if dob > datetime.now():
+        errors.append(f"{field}: date is in the future")
+
+
+def validate_patient(patient: Any) -> List[str]:
+    """Return a list of validation errors for a create-patient payload (empty if valid)."""
+    if not isinstance(patient, dict):
+        return ["body: expected a JSON object"]
+    errors: List[str] = []
+
+    for field, kind in REQUIRED_FIELDS.items():
+        if field not in patient:
+            errors.append(f"{field}: field required")
+        elif not isinstance(patient[field], kind):
+            errors.append(f"{field}: expected {kind.__name__}")
+    if errors:
+        return errors
+
+    for field, allowed in ENUM_FIELDS.items():
+        if patient[field] not in allowed:
+            errors.append(f"{field}: must be one of {list(allowed)}")
+    if not patient["name"].strip():
+        errors.append("name: must not be empty")
+    _check_dob(patient["provided_dob"], "provided_dob", errors)
+    _check_dob(patient["biological_dob"], "biological_dob", errors)
+    email = patient.get("email")
+    if email is not None and not (isinstance(email, str) and EMAIL_RE.match(email)):
+        errors.append("email: invalid address")
+
+    if not patient["phones"]:
+        errors.append("phones: at least one phone is required")
+    for i, phone in enumerate(patient["phones"]):
+        if not isinstance(phone, dict) or not PHONE_RE.match(str(phone.get("number", ""))):
+            errors.append(f"phones[{i}].number: expected +91 followed by 10 digits")
+        elif phone.get("type") not in PHONE_TYPES:
+            errors.append(f"phones[{i}].type: must be one of {PHONE_TYPES}")
+
+    for i, address in enumerate(patient.get("addresses") or []):
+        location = address.get("location") if isinstance(address, dict) else None
+        if not isinstance(location, dict) or not all(
+                isinstance(location.get(k), (int, float)) for k in ("lat", "long")):
+            errors.append(f"addresses[{i}].location: lat/long required")
+        elif not (-90 <= location["lat"] <= 90 and -180 <= location["long"] <= 180):
+            errors.append(f"addresses[{i}].location: out of range")
+
+    for i, relative in enumerate(patient.get("relatives") or []):
+        if not isinstance(relative, dict):
+            errors.append(f"relatives[{i}]: expected an object")
+            continue
+        if relative.get("type") not in RELATIVE_TYPES:
+            errors.append(f"relatives[{i}].type: must be one of {RELATIVE_TYPES}")
+        if relative.get("auth_level") not in AUTH_LEVELS:
+            errors.append(f"relatives[{i}].auth_level: must be one of {AUTH_LEVELS}")
+        if not PHONE_RE.match(str(relative.get("number", ""))):
+            errors.append(f"relatives[{i}].number: expected +91 followed by 10 digits")
+        patient_id = relative.get("patient_id")
+        if patient_id is not None and not OBJECT_ID_RE.match(str(patient_id)):
+            errors.append(f"relatives[{i}].patient_id: expected an ObjectId or null")
+
+    return errors
+
+
+# ---------------------------------------------------------------------------
+# Fault injection
+# ---------------------------------------------------------------------------
+
+def parse_latency(spec: str, rng: random.Random) -> Callable[[], float]:
+    """Build a sampler (seconds) from `const:MS`, `uniform:LO:HI`, `lognormal:MEDIAN:SIGMA` or `exp:MEAN`."""
+    kind, _, rest = spec.partition(":")
+    try:
+        args = [float(a) for a in rest.split(":")] if rest else []
+        if kind == "const":
+            (ms,) = args or [0.0]
+            return lambda: ms / 1000
+        if kind == "uniform":
+            lo, hi = args
+            return lambda: rng.uniform(lo, hi) / 1000
+        if kind == "lognormal":
+            median, sigma = args
+            mu = math.log(median)
+            return lambda: rng.lognormvariate(mu, sigma) / 1000
+        if kind == "exp":
+            (mean,) = args
+            return lambda: rng.expovariate(1.0 / mean) / 1000
+    except ValueError:
+        pass
+    raise argparse.ArgumentTypeError(f"invalid latency spec {spec!r}")
+
+
+class TokenBucket:
+    """Classic token bucket; `take()` returns 0 when admitted, else seconds until a token frees up."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+SEEDED_ID_EPOCH = 1704067200  # 2024-01-01T00:00:00Z: timestamp part of seeded ids
+STATS_WINDOW = 100_000        # service times kept for the /_stats percentiles
+
+
+class ObjectIdFactory:
+    """MongoDB-style ids: 4-byte timestamp, 5-byte process value, 3-byte counter.
+
+    With *epoch*, the timestamp is *epoch* plus one second per 2**24 ids issued rather
+    than the clock, so ids depend only on *rng*.
+    """
+
+    def __init__(self, rng: random.Random, epoch: Optional[int] = None):
+        self.process = rng.getrandbits(40)
+        self.counter = rng.getrandbits(24)
+        self.epoch = epoch
+        self.issued = 0
+
+    def __call__(self) -> str:
+        self.counter = (self.counter + 1) & 0xFFFFFF
+        timestamp = int(time.time()) if self.epoch is None else self.epoch + (self.issued >> 24)
+        self.issued += 1
+        return f"{timestamp:08x}{self.process:010x}{self.counter:06x}"
+
+
+# ---------------------------------------------------------------------------
+# Application
+# ---------------------------------------------------------------------------
+
+class MockOpsApi:
+    def __init__(self, latency: Callable[[], float], error_rate: float = 0.0, error_status: int = 500,
+                 rate_limit: Optional[float] = None, burst: int = 10, require_auth: bool = True,
+                 rng: Optional[random.Random] = None, id_epoch: Optional[int] = None):
+        self.rng = rng or random.Random()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.bucket = TokenBucket(rate_limit, burst) if rate_limit else None
+        self.require_auth = require_auth
+        self.new_id = ObjectIdFactory(self.rng, id_epoch)
+        self.patients: Dict[str, Dict[str, Any]] = {}
+        self.status_counts: Dict[int, int] = {}
+        # Bounded, so a long soak run does not grow without limit
+        self.service_times: Deque[float] = deque(maxlen=STATS_WINDOW)
+        self.started = time.monotonic()
+
+    def _reply(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None) -> web.Response:
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        return web.json_response(body, status=status, headers=headers)
+
+    async def _gate(self, request: web.Request) -> Optional[web.Response]:
+        """Auth, rate limiting, injected latency and errors shared by every patients endpoint."""
+        if self.require_auth and not request.headers.get("Authorization", "").startswith("Bearer "):
+            return self._reply(401, {"detail": "Not authenticated"})
+        if self.bucket:
+            wait = self.bucket.take()
+            if wait:
+                return self._reply(429, {"detail": "Too many requests"},
+                                   headers={"Retry-After": f"{max(1, round(wait))}"})
+        delay = self.latency()
+        self.service_times.append(delay)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            return self._reply(self.error_status, {"detail": "Injected failure"})
+        return None
+
+    async def create_patient(self, request: web.Request) -> web.Response:
+        rejected = await self._gate(request)
+        if rejected:
+            return rejected
+        team_id, org_id = request.query.get("team_id"), request.query.get("org_id")
+        if not team_id or not org_id:
+            return self._reply(400, {"detail": "team_id and org_id query parameters are required"})
+        try:
+            patient = await request.json()
+        except ValueError:
+            return self._reply(400, {"detail": "Invalid JSON body"})
+        errors = validate_patient(patient)
+        if errors:
+            return self._reply(422, {"detail": errors})
+
+        stored = {"_id": self.new_id(), **patient, "team_id": team_id, "org_id": org_id,
+                  "created_at": datetime.now(timezone.utc).isoformat(timespec="milliseconds")}
+        self.patients[stored["_id"]] = stored
+        return self._reply(200, stored)
+
+    async def get_patient(self, request: web.Request) -> web.Response:
+        rejected = await self._gate(request)
+        if rejected:
+            return rejected
+        patient = self.patients.get(request.match_info["patient_id"])
+        if patient is None:
+            return self._reply(404, {"detail": "Patient not found"})
+        return self._reply(200, patient)
+
+    async def stats(self, request: web.Request) -> web.Response:
+        times = sorted(self.service_times)
+
+        def pct(p):
+            return round(times[min(len(times) - 1, int(p / 100 * len(times)))] * 1000, 2) if times else None
+
+        return web.json_response({
+            "uptime_s": round(time.monotonic() - self.started, 3),
+            "patients": len(self.patients),
+            "responses": {str(k): v for k, v in sorted(self.status_counts.items())},
+            "service_ms": {"p50": pct(50), "p95": pct(95), "p99": pct(99)},
+        })
+
+    def make_app(self, prefix: str = "/ops") -> web.Application:
+        app = web.Application(client_max_size=4 * 1024 ** 2)
+        app.router.add_post(f"{prefix}/patients", self.create_patient)
+        app.router.add_get(f"{prefix}/patients/{{patient_id}}", self.get_patient)
+        app.router.add_get(f"{prefix}/_stats", self.stats)
+        return app
+
+
+# ---------------------------------------------------------------------------
+# Entry-point
+# ---------------------------------------------------------------------------
+
+def _parse_args():
+    p = argparse.ArgumentParser(description="Local stand-in for the Jano ops patients API.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8080)
+    p.add_argument("--prefix", default="/ops", help="Path prefix, mirroring API_BASE_URL.")
+    p.add_argument("--latency", default="const:0", help="const:MS | uniform:LO:HI | lognormal:MEDIAN:SIGMA | exp:MEAN")
+    p.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail.")
+    p.add_argument("--error-status", type=int, default=500, help="HTTP status for injected failures.")
+    p.add_argument("--rate-limit", type=float, default=None, help="Token-bucket rate (requests/s); 429 beyond it.")
+    p.add_argument("--burst", type=int, default=10, help="Token-bucket capacity.")
+    p.add_argument("--no-auth", action="store_true", help="Accept requests without a Bearer token.")
+    p.add_argument("--seed", type=int, default=None, help="Seed for latencies, failures and ids.")
+    return p.parse_args()
+
+
+def main():
+    args = _parse_args()
+    rng = random.Random(args.seed if args.seed is not None else os.urandom(8))
+    try:
+        latency = parse_latency(args.latency, rng)
+    except argparse.ArgumentTypeError as e:
+        raise SystemExit(f"Error: {e}")
+    api = MockOpsApi(
+        latency=latency,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        rate_limit=args.rate_limit,
+        burst=args.burst,
+        require_auth=not args.no_auth,
+        rng=rng,
+        id_epoch=SEEDED_ID_EPOCH if args.seed is not None else None,
+    )
+    print(f"Mock ops API on http://{args.host}:{args.port}{args.prefix}")
+    web.run_app(api.make_app(args.prefix), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+patient_stream.py
+-----------------
+Streaming NDJSON I/O for patient cohorts.
+
+Writers take an iterator of patients (dicts or pre-encoded JSON lines) and write them
+as newline-delimited JSON, optionally gzip / zstd compressed and split into shards of
+a fixed number of records. Readers yield patients one at a time from any of the
+supported layouts, so consumers (API uploaders, MongoDB loaders) never hold the full
+cohort in memory.
+
+Supported inputs for `iter_patient_file`
+---------------------------------------
+- `create_patients.json`           – classic JSON array (streamed with ijson when installed)
+- `patients.ndjson[.gz|.zst]`      – a single NDJSON file
+- `shards/`                        – a directory written by `write_ndjson_shards`
+- `"shards/patients-*.ndjson.gz"`  – a glob of shard files
+
+zstd support needs `pip install zstandard`; gzip is built in.
+"""
+
+from __future__ import annotations
+
+import glob
+import gzip
+import io
+import json
+from itertools import chain, islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+MANIFEST_NAME = "manifest.json"
+COMPRESSION_SUFFIXES = {"none": "", "gz": ".gz", "zst": ".zst"}
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def _compression_for(path: Path) -> str:
+    if path.suffix == ".gz":
+        return "gz"
+    if path.suffix == ".zst":
+        return "zst"
+    return "none"
+
+
+def open_text(path: Path, mode: str = "r", compression: Optional[str] = None):
+    """Open *path* as UTF-8 text, transparently (de)compressing gzip / zstd."""
+    compression = compression or _compression_for(path)
+    if compression == "gz":
+        # mtime=0 keeps the gzip header (and therefore the file bytes) reproducible.
+        if "w" in mode:
+            raw = gzip.GzipFile(filename="", mode="wb", fileobj=open(path, "wb"), mtime=0)
+            return _ClosingTextWrapper(raw)
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    if compression == "zst":
+        try:
+            import zstandard
+        except ImportError:
+            raise SystemExit("zstd compression requires `pip install zstandard`")
+        if "w" in mode:
+            raw = zstandard.ZstdCompressor(level=3).stream_writer(open(path, "wb"), closefd=True)
+        else:
+            raw = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        return io.TextIOWrapper(raw, encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class _ClosingTextWrapper(io.TextIOWrapper):
+    """TextIOWrapper over a GzipFile that also closes the GzipFile's own fileobj."""
+
+    def close(self):
+        fileobj = self.buffer.fileobj
+        super().close()
+        fileobj.close()
+
+
+def _as_line(patient: Any) -> str:
+    return patient if isinstance(patient, str) else json.dumps(patient, separators=(",", ":"))
+
+
+# ---------------------------------------------------------------------------
+# Writers
+# ---------------------------------------------------------------------------
+
+def shard_path(output_dir: Path, index: int, compression: str = "none", prefix: str = "patients") -> Path:
+    return output_dir / f"{prefix}-{index:05d}.ndjson{COMPRESSION_SUFFIXES[compression]}"
+
+
+def write_ndjson_shard(patients: Iterable[Any], path: Path, compression: str = "none") -> int:
+    """Write *patients* to a single NDJSON file. Returns the record count."""
+    count = 0
+    with open_text(path, "w", compression) as f:
+        for patient in patients:
+            f.write(_as_line(patient))
+            f.write("\n")
+            count += 1
+    return count
+
+
+def write_manifest(output_dir: Path, shards: List[Dict[str, Any]], shard_size: int,
+                   compression: str, **extra: Any) -> Dict[str, Any]:
+    """Write `manifest.json` for *shards* (`[{"file", "records"}]`) and return it."""
+    manifest = {
+        "total": sum(s["records"] for s in shards),
+        "shard_size": shard_size,
+        "compression": compression,
+        **extra,
+        "shards": shards,
+    }
+    with open(output_dir / MANIFEST_NAME, "w") as mf:
+        json.dump(manifest, mf, indent=2)
+    return manifest
+
+
+def write_ndjson_shards(patients: Iterable[Any], output_dir: Path, shard_size: int = 1_000_000,
+                        compression: str = "none", prefix: str = "patients") -> Dict[str, Any]:
+    """Write *patients* as NDJSON shards of at most *shard_size* records.
+
+    *patients* may yield dicts or already-encoded JSON lines (no trailing newline).
+    A `manifest.json` listing every shard and its record count is written last, so
+    readers can report totals without scanning the data. Returns the manifest.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    it = iter(patients)
+    shards: List[Dict[str, Any]] = []
+
+    while True:
+        batch = islice(it, shard_size)
+        first = next(batch, None)
+        if first is None:
+            break
+        path = shard_path(output_dir, len(shards), compression, prefix)
+        records = write_ndjson_shard(chain([first], batch), path, compression)
+        shards.append({"file": path.name, "records": records})
+
+    return write_manifest(output_dir, shards, shard_size, compression)
+
+
+def write_json_array(patients: Iterable[Any], output_path: Path) -> int:
+    """Stream *patients* into a classic JSON array file. Returns the record count."""
+    count = 0
+    with open_text(output_path, "w") as f:
+        f.write("[\n")
+        for patient in patients:
+            if count:
+                f.write(",\n")
+            f.write(_as_line(patient))
+            count += 1
+        f.write("\n]\n")
+    return count
+
+
+# ---------------------------------------------------------------------------
+# Readers
+# ---------------------------------------------------------------------------
+
+def resolve_patient_files(source: str) -> List[Path]:
+    """Expand *source* (file, shard directory or glob) to an ordered list of files."""
+    path = Path(source)
+    if path.is_dir():
+        manifest = path / MANIFEST_NAME
+        if manifest.exists():
+            with open(manifest) as f:
+                return [path / s["file"] for s in json.load(f)["shards"]]
+        return sorted(p for p in path.iterdir() if ".ndjson" in p.name)
+    if path.exists():
+        return [path]
+    matches = sorted(Path(p) for p in glob.glob(source))
+    if not matches:
+        raise FileNotFoundError(source)
+    return matches
+
+
+def count_patients(source: str) -> Optional[int]:
+    """Return the record count from a shard manifest, or None if unknown without a scan."""
+    manifest = Path(source) / MANIFEST_NAME
+    if manifest.exists():
+        with open(manifest) as f:
+            return json.load(f)["total"]
+    return None
+
+
+def _iter_json_array(path: Path) -> Iterator[Dict[str, Any]]:
+    try:
+        import ijson
+    except ImportError:
+        # Without ijson we have to parse the whole array; fine for small files.
+        with open_text(path) as f:
+            yield from json.load(f)
+        return
+    with open(path, "rb") as f:
+        yield from ijson.items(f, "item", use_float=True)
+
+
+def iter_patient_file(source: str) -> Iterator[Dict[str, Any]]:
+    """Yield patients lazily from any supported input layout (see module docstring)."""
+    for path in resolve_patient_files(source):
+        if ".ndjson" in path.name or path.suffix == ".jsonl":
+            with open_text(path) as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        else:
+            yield from _iter_json_array(path)
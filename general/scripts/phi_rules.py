@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+phi_rules.py
+------------
+PHI redaction rules for `edit_pdf_phi_data.py`: a rule file is loaded and compiled
+once into a word-level matcher, which then resolves every label/value pair on a page
+in a single pass.
+
+Rule file (JSON)
+----------------
+    {
+      "version": "lab-a-2025-01",
+      "rules": [
+        {"name": "name", "label": "Name", "replace": {"fixed": "Sura Karthikeya"}},
+        {"name": "order", "label": "Order", "require_value": true, "replace": "digits"},
+        {"name": "uhid", "label": ["UHID", "UHID No", "MR No"], "ignore_case": true, "strip": ":.",
+         "extent": {"words": 1}, "replace": {"pattern": "UH########"}},
+        {"name": "referred_by", "label": "Referred By", "extent": "next_label",
+         "replace": {"choice": ["Dr. A Rao", "Dr. S Iyer"]}}
+      ]
+    }
+
+- `label`: the label text, or a list of alternatives. Labels match whole words;
+  multi-word labels ("Age / Sex") match consecutive words of one line. `ignore_case`
+  and `strip` (characters trimmed from both ends of each word, e.g. ":") relax the
+  comparison. When labels overlap, the longest one wins.
+- `extent`: what is covered after the label.
+  - `"margin"` (default): from the first value word to the page's right margin.
+  - `{"words": N}`: the next N words.
+  - `"next_label"`: up to the next matched label on the same line, or the margin.
+- `replace`: the replacement generator.
+  - `{"fixed": "text"}`: a fixed value.
+  - `"digits"`: the first value word with every digit after its non-digit prefix
+    randomised.
+  - `{"pattern": "UH####"}`: `#` becomes a random digit, `@` a random capital letter.
+  - `{"choice": [...]}`: one of the listed values.
+  - `{"mask": "X"}`: the covered text with every letter and digit masked.
+- `require_value`: skip the label when no value word follows it (always on for
+  `"digits"`).
+
+Rules are grouped by their word normalisation. Each group is compiled into one token
+trie, so matching a page costs one walk per line and group, however many rules there
+are.
+"""
+
+from __future__ import annotations
+
+import bisect
+import hashlib
+import json
+import random
+import re
+import string
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+Word = tuple  # an entry of page.get_text("words"): (x0, y0, x1, y1, text, block_no, line_no, word_no)
+BBox = Tuple[float, float, float, float]
+
+EXTENTS = ("margin", "words", "next_label")
+
+
+# ---------------------------------------------------------------------------
+# Replacement generators
+# ---------------------------------------------------------------------------
+
+def _randomise_digits(value: str) -> str:
+    """Return *value* with every digit replaced by a new random digit."""
+    return re.sub(r"\d", lambda _: str(random.randint(0, 9)), value)
+
+
+# Generators are module-level classes rather than closures so a compiled RuleSet can be
+# pickled to batch workers under the spawn / forkserver start methods.
+
+class _Digits:
+    def __init__(self, spec: Any):
+        pass
+
+    def __call__(self, values: List[str]) -> str:
+        value = values[0]
+        prefix = re.match(r"^[^\d]*", value).group(0)
+        return f"{prefix}{_randomise_digits(value[len(prefix):])}"
+
+
+class _Fixed:
+    def __init__(self, spec: Any):
+        self.text = str(spec)
+
+    def __call__(self, values: List[str]) -> str:
+        return self.text
+
+
+class _Pattern:
+    def __init__(self, spec: Any):
+        self.pattern = str(spec)
+
+    def __call__(self, values: List[str]) -> str:
+        return "".join(str(random.randint(0, 9)) if ch == "#" else random.choice(string.ascii_uppercase)
+                       if ch == "@" else ch for ch in self.pattern)
+
+
+class _Choice:
+    def __init__(self, spec: Any):
+        self.options = [str(option) for option in spec]
+        if not self.options:
+            raise ValueError("choice needs at least one value")
+
+    def __call__(self, values: List[str]) -> str:
+        return random.choice(self.options)
+
+
+class _Mask:
+    def __init__(self, spec: Any):
+        self.char = str(spec or "X")[:1]
+
+    def __call__(self, values: List[str]) -> str:
+        return re.sub(r"[A-Za-z0-9]", self.char, " ".join(values))
+
+
+GENERATORS: Dict[str, Callable[[Any], Callable[[List[str]], str]]] = {
+    "fixed": _Fixed,
+    "digits": _Digits,
+    "pattern": _Pattern,
+    "choice": _Choice,
+    "mask": _Mask,
+}
+
+
+# ---------------------------------------------------------------------------
+# Rules
+# ---------------------------------------------------------------------------
+
+class Rule:
+    """One compiled rule; see the module docstring for the fields."""
+
+    __slots__ = ("name", "labels", "ignore_case", "strip", "extent", "words", "require_value", "generate")
+
+    def __init__(self, spec: Dict[str, Any]):
+        labels = spec.get("label")
+        self.name = spec.get("name") or (labels if isinstance(labels, str) else None)
+        if not self.name:
+            raise ValueError(f"rule needs a name: {spec}")
+        self.labels = [labels] if isinstance(labels, str) else list(labels or [])
+        if not self.labels or not all(isinstance(label, str) and label.split() for label in self.labels):
+            raise ValueError(f"rule {self.name!r}: label must be a non-empty string or list of strings")
+        self.ignore_case = bool(spec.get("ignore_case", False))
+        self.strip = str(spec.get("strip", ""))
+
+        extent = spec.get("extent", "margin")
+        self.words = 0
+        if isinstance(extent, dict) and "words" in extent:
+            self.extent, self.words = "words", int(extent["words"])
+            if self.words < 1:
+                raise ValueError(f"rule {self.name!r}: extent words must be at least 1")
+        elif extent in ("margin", "next_label"):
+            self.extent = extent
+        else:
+            raise ValueError(f"rule {self.name!r}: unknown extent {extent!r}; expected one of {', '.join(EXTENTS)}")
+
+        replace = spec.get("replace")
+        kind, arg = (replace, None) if isinstance(replace, str) else next(iter((replace or {}).items()), (None, None))
+        if kind not in GENERATORS:
+            raise ValueError(f"rule {self.name!r}: unknown replacement {replace!r}; "
+                             f"expected one of {', '.join(GENERATORS)}")
+        self.generate = GENERATORS[kind](arg)
+        # "digits" rewrites the value, so there has to be one
+        self.require_value = bool(spec.get("require_value", kind == "digits"))
+
+    @property
+    def mode(self) -> Tuple[bool, str]:
+        return self.ignore_case, self.strip
+
+
+def _normalise(text: str, mode: Tuple[bool, str]) -> str:
+    ignore_case, strip = mode
+    if strip:
+        text = text.strip(strip)
+    return text.casefold() if ignore_case else text
+
+
+class Match:
+    """A label found on a page and the words its value extent covers."""
+
+    __slots__ = ("rule", "label_bbox", "value_words", "stop_x")
+
+    def __init__(self, rule: Rule, label_bbox: BBox, value_words: List[Word], stop_x: Optional[float]):
+        self.rule = rule
+        self.label_bbox = label_bbox
+        self.value_words = value_words  # words after the label, up to the extent
+        self.stop_x = stop_x            # right edge of the cover; None means the page margin
+
+
+class RuleSet:
+    """Rules compiled into one token trie per normalisation mode."""
+
+    _END = None  # trie key marking a complete label; never a word token
+
+    def __init__(self, specs: Sequence[Dict[str, Any]], version: Optional[str] = None):
+        self.rules = [Rule(spec) for spec in specs]
+        names = [rule.name for rule in self.rules]
+        duplicates = {name for name in names if names.count(name) > 1}
+        if duplicates:
+            raise ValueError(f"duplicate rule names: {', '.join(sorted(duplicates))}")
+        canonical = json.dumps(list(specs), sort_keys=True, separators=(",", ":"), default=str)
+        self.digest = hashlib.sha256(canonical.encode()).hexdigest()
+        self.version = version or self.digest[:12]
+
+        self.tries: Dict[Tuple[bool, str], Dict[str, Any]] = {}
+        for order, rule in enumerate(self.rules):
+            trie = self.tries.setdefault(rule.mode, {})
+            for label in rule.labels:
+                node = trie
+                for token in label.split():
+                    token = _normalise(token, rule.mode)
+                    if token:  # a word that is only stripped characters is not part of the label
+                        node = node.setdefault(token, {})
+                if node is not trie:
+                    node.setdefault(self._END, order)  # the first rule with a given label wins
+
+    @classmethod
+    def load(cls, path: str) -> "RuleSet":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, list):
+            return cls(data)
+        return cls(data["rules"], data.get("version"))
+
+    @classmethod
+    def from_labels(cls, labels: Dict[str, Dict[str, Any]]) -> "RuleSet":
+        """Rules for the legacy `LABELS` dict: fixed `new_value`s, randomised digits for `order`."""
+        specs = []
+        for key, cfg in labels.items():
+            if "new_value" in cfg:
+                specs.append({"name": key, "label": cfg["label"], "replace": {"fixed": cfg["new_value"]}})
+            else:
+                specs.append({"name": key, "label": cfg["label"], "replace": "digits", "require_value": True})
+        return cls(specs)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def _match_line(self, texts: List[str], trie: Dict[str, Any]) -> List[Tuple[int, int, int]]:
+        """(start, end, rule order) of the longest label starting at each word, left to right."""
+        hits = []
+        for i in range(len(texts)):
+            node, found = trie, None
+            for j in range(i, len(texts)):
+                node = node.get(texts[j])
+                if node is None:
+                    break
+                if self._END in node:
+                    found = (i, j + 1, node[self._END])
+            if found:
+                hits.append(found)
+        return hits
+
+    def find(self, words: List[Word]) -> List[Match]:
+        """Every label in *words* (`page.get_text("words")`), ordered by rule, then position in *words*."""
+        lines: Dict[Tuple[int, int], List[int]] = {}
+        for i, w in enumerate(words):
+            lines.setdefault((w[5], w[6]), []).append(i)
+
+        found = []
+        for indices in lines.values():
+            indices.sort(key=lambda i: words[i][0])
+            line = [words[i] for i in indices]
+            hits = []
+            for mode, trie in self.tries.items():
+                hits.extend(self._match_line([_normalise(w[4], mode) for w in line], trie))
+            # Leftmost, then longest, then first rule; drop labels inside an earlier one
+            hits.sort(key=lambda h: (h[0], h[0] - h[1], h[2]))
+            kept: List[Tuple[int, int, int]] = []
+            for hit in hits:
+                if not kept or hit[0] >= kept[-1][1]:
+                    kept.append(hit)
+
+            starts = [w[0] for w in line]
+            for n, (start, end, order) in enumerate(kept):
+                rule = self.rules[order]
+                x0, y0, x1, y1 = line[start][:4]
+                for w in line[start + 1:end]:
+                    x0, y0, x1, y1 = min(x0, w[0]), min(y0, w[1]), max(x1, w[2]), max(y1, w[3])
+                # Value: words starting to the right of the label
+                first = bisect.bisect_right(starts, x1)
+                stop_x = None
+                if rule.extent == "words":
+                    value_words = line[first:first + rule.words]
+                    # Without value words the cover stays next to the label, never up to the margin
+                    stop_x = max(w[2] for w in value_words) + 1 if value_words else x1 + 2
+                elif rule.extent == "next_label" and n + 1 < len(kept):
+                    value_words = line[first:kept[n + 1][0]]
+                    stop_x = line[kept[n + 1][0]][0] - 2
+                else:
+                    value_words = line[first:]
+                if rule.require_value and not value_words:
+                    continue
+                found.append((order, indices[start], Match(rule, (x0, y0, x1, y1), value_words, stop_x)))
+        found.sort(key=lambda hit: hit[:2])
+        return [hit[2] for hit in found]
+
+
+def load_rules(path: Optional[str], default: RuleSet) -> RuleSet:
+    """The rule file at *path*, or *default*."""
+    if path is None:
+        return default
+    if not Path(path).is_file():
+        raise SystemExit(f"Rule file {path} does not exist")
+    try:
+        return RuleSet.load(path)
+    except (ValueError, KeyError, TypeError) as e:
+        raise SystemExit(f"Invalid rule file {path}: {e}")
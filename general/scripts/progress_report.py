@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+progress_report.py
+------------------
+Shared progress and log output for the generators.
+
+Per-record detail ("Adding Influenza vaccination series", "Transformed record for
+...") goes through `debug()` and is dropped unless the run asks for it. In the default
+mode the per-record cost is a counter increment plus a clock read. Progress is one
+line (records, records/s, ETA) redrawn at most every `interval` seconds on a
+terminal; when output is redirected, a plain line is written every `log_interval`
+seconds instead. At the end, `summary()` emits one JSON object with counts, rate and
+any fields the script adds.
+
+Usage
+-----
+    from progress_report import add_reporting_args, default_reporter
+
+    parser = argparse.ArgumentParser()
+    add_reporting_args(parser)              # -v / -q / --log-level / --summary
+    args = parser.parse_args()
+    report = default_reporter().configure_from_args(args)
+
+    report.start(total=len(patients), label="patients")
+    for patient in patients:
+        report.debug(f"Processing {patient['name']}")
+        report.advance()
+        report.count("vaccinations", len(patient["vaccination"]))
+    report.summary(output_file="out.json")
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Dict, Optional, TextIO
+
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+
+
+def _duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+class Reporter:
+    """Level-filtered messages, a throttled progress line and an end-of-run JSON summary."""
+
+    def __init__(self, level: str = "info", stream: Optional[TextIO] = None, interval: float = 0.5,
+                 log_interval: float = 10.0, summary_path: Optional[str] = None):
+        self.stream = stream or sys.stdout
+        self.interval = interval
+        self.log_interval = log_interval
+        self.summary_path = summary_path
+        self.counters: Counter = Counter()
+        self._lock = threading.Lock()  # writer threads may log concurrently
+        self.set_level(level)
+        self.start()
+
+    def set_level(self, level: str) -> None:
+        if level not in LEVELS:
+            raise ValueError(f"unknown log level {level!r}; expected one of {', '.join(LEVELS)}")
+        self.level = level
+        self._threshold = LEVELS[level]
+
+    def configure_from_args(self, args) -> "Reporter":
+        """Apply the options added by `add_reporting_args`."""
+        self.set_level(args.log_level)
+        self.summary_path = args.summary
+        return self
+
+    def is_enabled(self, level: str) -> bool:
+        return LEVELS[level] >= self._threshold
+
+    # -- messages -----------------------------------------------------------
+
+    def log(self, level: str, message: str) -> None:
+        if LEVELS[level] < self._threshold:
+            return
+        with self._lock:
+            redraw = self._line_open
+            self._clear_line()
+            self.stream.write(message + "\n")
+            if redraw:
+                self._last_draw = 0.0  # put the progress line back below the message on the next advance
+
+    def debug(self, message: str) -> None:
+        if self._threshold <= LEVELS["debug"]:
+            self.log("debug", message)
+
+    def info(self, message: str) -> None:
+        self.log("info", message)
+
+    def warning(self, message: str) -> None:
+        self.log("warning", message)
+
+    def error(self, message: str) -> None:
+        self.log("error", message)
+
+    # -- progress -----------------------------------------------------------
+
+    def start(self, total: Optional[int] = None, label: str = "records") -> None:
+        """Begin counting *label*; *total* enables the percentage and ETA."""
+        self.total = total
+        self.label = label
+        self.done = 0
+        self.started = time.monotonic()
+        self._last_draw = self.started
+        self._line_open = False
+        self._tty = hasattr(self.stream, "isatty") and self.stream.isatty()
+
+    def advance(self, n: int = 1) -> None:
+        self.done += n
+        now = time.monotonic()
+        if now - self._last_draw >= (self.interval if self._tty else self.log_interval):
+            self._last_draw = now
+            self._draw(now)
+
+    def count(self, key: str, n: int = 1) -> None:
+        """Add *n* to a named counter reported in the summary."""
+        self.counters[key] += n
+
+    def _progress_text(self, now: float) -> str:
+        elapsed = now - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        if self.total:
+            eta = _duration((self.total - self.done) / rate) if rate else "?"
+            return (f"{self.done}/{self.total} {self.label} ({100 * self.done / self.total:.1f}%) "
+                    f"{rate:,.0f}/s ETA {eta}")
+        return f"{self.done} {self.label} {rate:,.0f}/s elapsed {_duration(elapsed)}"
+
+    def _draw(self, now: float) -> None:
+        if self._threshold > LEVELS["info"]:
+            return
+        text = self._progress_text(now)
+        with self._lock:
+            if self._tty:
+                self.stream.write("\r\033[K" + text)
+                self._line_open = True
+            else:
+                self.stream.write(f"Progress: {text}\n")
+            self.stream.flush()
+
+    def _clear_line(self) -> None:
+        if self._line_open:
+            self.stream.write("\r\033[K")
+            self._line_open = False
+
+    def finish(self) -> None:
+        """Draw the final progress state and end the progress line."""
+        if self.done and self._threshold <= LEVELS["info"]:
+            self._clear_line()
+            print(self._progress_text(time.monotonic()), file=self.stream)
+
+    # -- summary ------------------------------------------------------------
+
+    def summary(self, **fields: Any) -> Dict[str, Any]:
+        """End the run: finish the progress line and emit a JSON summary.
+
+        The summary goes to `summary_path` when set, otherwise it is printed as one
+        `Summary: {...}` line at info level. Returns the summary dict.
+        """
+        self.finish()
+        elapsed = time.monotonic() - self.started
+        result = {
+            "label": self.label,
+            "processed": self.done,
+            "total": self.total,
+            "elapsed_s": round(elapsed, 3),
+            "rate_per_s": round(self.done / elapsed, 1) if elapsed > 0 else None,
+            "counters": dict(self.counters),
+            **fields,
+        }
+        if self.summary_path:
+            with open(self.summary_path, "w") as f:
+                json.dump(result, f, indent=2, default=str)
+            self.info(f"Summary written to {self.summary_path}")
+        else:
+            self.info("Summary: " + json.dumps(result, default=str))
+        return result
+
+
+def add_reporting_args(parser) -> None:
+    """Add `-v/--verbose`, `-q/--quiet`, `--log-level` and `--summary` to *parser*."""
+    group = parser.add_argument_group("output")
+    levels = group.add_mutually_exclusive_group()
+    levels.add_argument("--log-level", choices=list(LEVELS), default="info",
+                        help="Message level; per-record detail is logged at debug.")
+    levels.add_argument("-v", "--verbose", dest="log_level", action="store_const", const="debug",
+                        help="Per-record output (same as --log-level debug).")
+    levels.add_argument("-q", "--quiet", dest="log_level", action="store_const", const="warning",
+                        help="Only warnings and errors (same as --log-level warning).")
+    group.add_argument("--summary", default=None, help="Write the end-of-run JSON summary to this file.")
+
+
+@lru_cache(maxsize=None)
+def default_reporter() -> Reporter:
+    """Process-wide reporter shared by a script and the library functions it calls."""
+    return Reporter()
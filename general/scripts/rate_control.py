@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+rate_control.py
+---------------
+Adaptive (AIMD) request-rate controller for the patients API uploaders.
+
+The controller paces requests at a current rate (requests/s) that starts at a target
+and is adjusted once per `adjust_interval`:
+
+- Additive increase: if the window had no throttling responses and its latency
+  percentile (p95 by default) is under `latency_target`, the rate grows by `increase_step`.
+- Multiplicative decrease: a 429/503 response (immediately, at most once per interval)
+  or a window latency percentile above the target multiplies the rate by `decrease_factor`.
+- `Retry-After` on 429/503 pauses all requests until the given time has passed.
+
+The rate is always clamped to `[min_rps, max_rps]`; `max_rps` is a hard ceiling.
+`metrics()` reports the current rate, backoff state and latency percentiles.
+
+Both asyncio (`await acquire()`) and blocking (`acquire_sync()`) callers are supported.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+THROTTLE_STATUSES = (429, 503)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delta-seconds or HTTP-date) into seconds from now."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def _percentile(sorted_values, pct: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class AdaptiveRateController:
+    """AIMD pacing for API requests; see module docstring."""
+
+    def __init__(self, target_rps: float = 2.0, max_rps: float = 50.0, min_rps: float = 0.2,
+                 increase_step: float = 1.0, decrease_factor: float = 0.5,
+                 latency_target: float = 1.0, latency_percentile: float = 95,
+                 adjust_interval: float = 2.0, min_samples: int = 5, window: int = 200,
+                 max_retry_after: float = 300.0):
+        if not 0 < min_rps <= max_rps:
+            raise ValueError("require 0 < min_rps <= max_rps")
+        self.max_rps = max_rps
+        self.min_rps = min_rps
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.latency_target = latency_target
+        self.latency_percentile = latency_percentile
+        self.adjust_interval = adjust_interval
+        self.min_samples = min_samples
+        self.max_retry_after = max_retry_after
+
+        self.rate = min(max(target_rps, min_rps), max_rps)
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self._backoff_until = 0.0
+        self._last_adjust = time.monotonic()
+        self._last_decrease = float("-inf")
+        self._latencies: deque = deque(maxlen=window)  # rolling, for metrics
+        self._window_latencies: list = []  # current adjustment window only
+        self._throttled_in_window = 0
+
+        self.requests = 0
+        self.throttled = 0
+        self.increases = 0
+        self.decreases = 0
+
+    # -- pacing -------------------------------------------------------------
+
+    def _reserve(self) -> float:
+        """Reserve the next send slot and return how long the caller must wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot, self._backoff_until)
+            self._next_slot = slot + 1.0 / self.rate
+            return slot - now
+
+    async def acquire(self) -> None:
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def acquire_sync(self) -> None:
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    # -- feedback -----------------------------------------------------------
+
+    def record(self, latency: Optional[float], status: Optional[int],
+               retry_after: Optional[str] = None) -> None:
+        """Feed back one completed request (latency in seconds, None status = transport error)."""
+        with self._lock:
+            now = time.monotonic()
+            self.requests += 1
+            if latency is not None:
+                self._latencies.append(latency)
+                self._window_latencies.append(latency)
+
+            if status in THROTTLE_STATUSES:
+                self.throttled += 1
+                self._throttled_in_window += 1
+                delay = parse_retry_after(retry_after)
+                if delay is not None:
+                    self._backoff_until = max(self._backoff_until, now + min(delay, self.max_retry_after))
+                # React to throttling immediately, but a burst of 429s only cuts the rate once.
+                if now - self._last_decrease >= self.adjust_interval:
+                    self._decrease(now)
+
+            if now - self._last_adjust >= self.adjust_interval and (
+                    self._throttled_in_window or len(self._window_latencies) >= self.min_samples):
+                self._adjust(now)
+
+    def _decrease(self, now: float) -> None:
+        self.rate = max(self.min_rps, self.rate * self.decrease_factor)
+        self.decreases += 1
+        self._last_decrease = now
+
+    def _adjust(self, now: float) -> None:
+        """Close an adjustment window: additive increase unless the window was unhealthy."""
+        p = _percentile(sorted(self._window_latencies), self.latency_percentile)
+        if self._throttled_in_window:
+            pass  # already decreased when the throttling response arrived
+        elif p is not None and p > self.latency_target:
+            if now - self._last_decrease >= self.adjust_interval:
+                self._decrease(now)
+        elif self.rate < self.max_rps:
+            self.rate = min(self.max_rps, self.rate + self.increase_step)
+            self.increases += 1
+        self._last_adjust = now
+        self._throttled_in_window = 0
+        self._window_latencies.clear()
+
+    # -- metrics ------------------------------------------------------------
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            latencies = sorted(self._latencies)
+            backoff_remaining = max(0.0, self._backoff_until - now)
+            return {
+                "current_rps": round(self.rate, 3),
+                "max_rps": self.max_rps,
+                "min_rps": self.min_rps,
+                "in_backoff": backoff_remaining > 0,
+                "backoff_remaining_s": round(backoff_remaining, 3),
+                "requests": self.requests,
+                "throttled_responses": self.throttled,
+                "rate_increases": self.increases,
+                "rate_decreases": self.decreases,
+                "latency_p50_s": _percentile(latencies, 50),
+                "latency_p95_s": _percentile(latencies, 95),
+                "latency_p99_s": _percentile(latencies, 99),
+            }
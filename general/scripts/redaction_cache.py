@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+redaction_cache.py
+------------------
+Content-hash cache for incremental batch redaction with `edit_pdf_phi_data.py`.
+
+For every input PDF the cache stores the input's SHA-256, the digest of the rule set
+it was redacted with, and the output's path and SHA-256. A PDF is redacted again only
+when its content, the rules or the output's path changed, or the output was modified
+or removed.
+
+Re-reading an archive to hash it would cost as much I/O as redacting it, so each row
+also keeps the input's size and mtime. When those (and the output's) are unchanged the
+file is skipped after two `stat` calls and an indexed lookup, without reading it.
+When only the stat changed (a copy or `touch`), the worker hashes the input and still
+skips it if the content is the same.
+
+The cache is a SQLite file (stdlib, one row per input). Rows are written as documents
+finish and committed every `commit_every` rows, so an interrupted run keeps what it
+already did.
+
+Usage
+-----
+    cache = RedactionCache("redaction.cache.sqlite", rules.digest)
+    for input_path, output_path, state, known_sha in cache.plan(pairs):
+        ...                                   # redact the ones that are not "unchanged"
+        cache.store(entry)                    # the worker's manifest entry
+    cache.commit()
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+Plan = Tuple[Path, Path, str, Optional[str]]  # (input, output, state, known input sha256)
+
+
+def sha256_file(path: Path, block_size: int = 1 << 20) -> str:
+    """Hex SHA-256 of the file at *path*."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _stat(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+class RedactionCache:
+    """SQLite-backed map of input PDF -> (input hash, rules digest, output path and hash)."""
+
+    def __init__(self, path: str, rules_digest: str, lookup_size: int = 900, commit_every: int = 1000):
+        self.path = path
+        self.rules_digest = rules_digest
+        self.lookup_size = lookup_size  # stays below SQLite's default 999 bound parameters
+        self.commit_every = commit_every
+        self.stats = {"unchanged": 0, "touched": 0, "changed": 0, "new": 0}
+        self._planned: Dict[str, Tuple[int, int]] = {}  # input -> stat seen by plan(), stored with its row
+        self._uncommitted = 0
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS redactions ("
+            " input TEXT PRIMARY KEY, input_size INTEGER, input_mtime_ns INTEGER, sha256 TEXT NOT NULL,"
+            " rules TEXT NOT NULL, output TEXT NOT NULL, output_sha256 TEXT NOT NULL,"
+            " output_size INTEGER, output_mtime_ns INTEGER)"
+        )
+
+    def plan(self, pairs: Iterable[Tuple[Path, Path]]) -> Iterator[Plan]:
+        """Classify each (input, output) pair against the cache, a chunk of lookups at a time.
+
+        States: "unchanged" (skip), "touched" (input stat changed; skip if its hash is
+        still *known sha256*), "changed" (rules, output or content differ) and "new".
+        """
+        it = iter(pairs)
+        while True:
+            chunk = list(islice(it, self.lookup_size))
+            if not chunk:
+                return
+            placeholders = ",".join("?" * len(chunk))
+            known = {row[0]: row[1:] for row in self.db.execute(
+                f"SELECT input, input_size, input_mtime_ns, sha256, rules, output, output_size, output_mtime_ns "
+                f"FROM redactions WHERE input IN ({placeholders})", [str(i) for i, _ in chunk])}
+
+            for input_path, output_path in chunk:
+                stat = _stat(input_path)
+                if stat is not None:
+                    self._planned[str(input_path)] = stat
+                row = known.get(str(input_path))
+                if row is None:
+                    state, sha = "new", None
+                else:
+                    size, mtime_ns, sha, rules, output, output_size, output_mtime_ns = row
+                    if rules != self.rules_digest or output != str(output_path) \
+                            or _stat(output_path) != (output_size, output_mtime_ns):
+                        state, sha = "changed", None
+                    elif stat != (size, mtime_ns):
+                        state = "touched"
+                    else:
+                        state = "unchanged"
+                self.stats[state] += 1
+                yield input_path, output_path, state, sha
+
+    def store(self, entry: Dict[str, Any]) -> None:
+        """Record a finished manifest entry: redacted ("ok") or found unchanged after hashing."""
+        stat = self._planned.pop(entry["input"], None)
+        if stat is None or not entry.get("sha256"):
+            return
+        if entry["status"] == "ok":
+            output_stat = _stat(Path(entry["output"]))
+            if output_stat is None:
+                return
+            self.db.execute(
+                "INSERT OR REPLACE INTO redactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (entry["input"], *stat, entry["sha256"], self.rules_digest, entry["output"],
+                 entry["output_sha256"], *output_stat))
+        else:
+            # Same content under a new stat: only the stat needs updating
+            self.db.execute("UPDATE redactions SET input_size = ?, input_mtime_ns = ? WHERE input = ?",
+                            (*stat, entry["input"]))
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            self.commit()
+
+    def commit(self) -> None:
+        self.db.commit()
+        self._uncommitted = 0
+
+    def close(self) -> None:
+        """Close the cache, discarding anything not committed."""
+        self.db.close()
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM redactions").fetchone()[0]
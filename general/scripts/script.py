@@ -1,51 +1,57 @@
 import json
 import random
-from datetime import datetime, timedelta
+from datetime import datetime
+
+from date_sampler import default_sampler
+from identity_alloc import IdentityAllocator, reserve_identities
 
 def random_date(start, end):
     """Generate a random datetime between `start` and `end`"""
-    return start + timedelta(
-        # Get a random amount of seconds between `start` and `end`
-        seconds=random.randint(0, int((end - start).total_seconds())),
-    )
+    return default_sampler().between(start, end)
+
+SALUTATIONS = ["Mr.", "Mrs.", "Ms.", "Master", "Miss"]
+GENDERS = ["Male", "Female", "Other"]
+BLOOD_GROUPS = ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"]
+PHONE_TYPES = ["mobile", "home", "work"]
+RELATIVE_TYPES = ["parent", "spouse", "sibling", "child", "friend"]
+AUTH_LEVELS = ["full", "limited", "none"]
+
+FIRST_NAMES = ["Aarav", "Vivaan", "Aditya", "Vihaan", "Arjun", "Sai", "Reyansh", "Ayaan", "Krishna", "Ishaan", "Saanvi", "Aanya", "Aadhya", "Aaradhya", "Ananya", "Pari", "Diya", "Myra", "Sara", "Anika"]
+LAST_NAMES = ["Sharma", "Verma", "Gupta", "Singh", "Kumar", "Patel", "Shah", "Mehta", "Jain", "Reddy", "Naidu", "Menon", "Nair", "Iyer", "Iyengar"]
 
-def generate_patient_data(num_records):
-    patients = []
-    salutations = ["Mr.", "Mrs.", "Ms.", "Master", "Miss"]
-    genders = ["Male", "Female", "Other"]
-    blood_groups = ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"]
-    phone_types = ["mobile", "home", "work"]
-    relative_types = ["parent", "spouse", "sibling", "child", "friend"]
-    auth_levels = ["full", "limited", "none"]
+DOB_START = datetime(1950, 1, 1)
+DOB_END = datetime(2010, 1, 1)
 
-    first_names = ["Aarav", "Vivaan", "Aditya", "Vihaan", "Arjun", "Sai", "Reyansh", "Ayaan", "Krishna", "Ishaan", "Saanvi", "Aanya", "Aadhya", "Aaradhya", "Ananya", "Pari", "Diya", "Myra", "Sara", "Anika"]
-    last_names = ["Sharma", "Verma", "Gupta", "Singh", "Kumar", "Patel", "Shah", "Mehta", "Jain", "Reddy", "Naidu", "Menon", "Nair", "Iyer", "Iyengar"]
+def iter_patient_data(num_records, identities=None):
+    """Yield patient records one at a time (constant memory for any num_records)
 
+    Emails and phone numbers come from `identities` (an `IdentityAllocator`), so no two
+    records share them.
+    """
+    identities = identities or IdentityAllocator()
+    sampler = default_sampler()
     for i in range(num_records):
-        first_name = random.choice(first_names)
-        last_name = random.choice(last_names)
+        first_name = random.choice(FIRST_NAMES)
+        last_name = random.choice(LAST_NAMES)
         name = f"{first_name} {last_name}"
-        email = f"{first_name.lower()}.{last_name.lower()}{random.randint(1,100)}@example.com"
+        email = identities.email(first_name, last_name, i)
         
-        dob_start = datetime(1950, 1, 1)
-        dob_end = datetime(2010, 1, 1)
-        dob = random_date(dob_start, dob_end)
-        dob_str = dob.strftime("%d-%m-%Y")
+        dob_str = sampler.dmy_between(DOB_START, DOB_END)
 
         patient = {
-            "salutation": random.choice(salutations),
+            "salutation": random.choice(SALUTATIONS),
             "name": name,
             "provided_dob": dob_str,
             "biological_dob": dob_str,
             "is_approx_dob": random.choice([True, False]),
-            "gender": random.choice(genders),
-            "blood_group": random.choice(blood_groups),
+            "gender": random.choice(GENDERS),
+            "blood_group": random.choice(BLOOD_GROUPS),
             "email": email,
             "phones": [
                 {
-                    "type": random.choice(phone_types),
-                    "number": f"+91{random.randint(7000000000, 9999999999)}",
-                    "caregiver_name": f"{random.choice(first_names)} {random.choice(last_names)}"
+                    "type": random.choice(PHONE_TYPES),
+                    "number": f"+91{identities.phone_number(i)}",
+                    "caregiver_name": f"{random.choice(FIRST_NAMES)} {random.choice(LAST_NAMES)}"
                 }
             ],
             "addresses": [],
@@ -68,18 +74,20 @@ def generate_patient_data(num_records):
         if random.choice([True, False]):
              patient["relatives"].append({
                 "patient_id": None, # This would need to be a valid patient ID
-                "name": f"{random.choice(first_names)} {random.choice(last_names)}",
+                "name": f"{random.choice(FIRST_NAMES)} {random.choice(LAST_NAMES)}",
                 "number": f"+91{random.randint(7000000000, 9999999999)}",
-                "type": random.choice(relative_types),
-                "auth_level": random.choice(auth_levels)
+                "type": random.choice(RELATIVE_TYPES),
+                "auth_level": random.choice(AUTH_LEVELS)
              })
 
-        patients.append(patient)
+        yield patient
 
-    return patients
+def generate_patient_data(num_records, identities=None):
+    return list(iter_patient_data(num_records, identities))
 
 if __name__ == "__main__":
-    patients_data = generate_patient_data(20)
+    # Reserve identity indexes so emails/phones never repeat across runs either
+    patients_data = generate_patient_data(20, reserve_identities(20))
     with open("create_patients.json", "w") as f:
         json.dump(patients_data, f, indent=2)
     print("Generated create_patients.json with 20 patient records.")
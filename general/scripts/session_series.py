@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+session_series.py
+-----------------
+Longitudinal per-session values for `patient_histories`.
+
+A history is a snapshot: one dry weight and one value per prescription parameter.
+`SessionSeries` turns a chunk of histories into years of dialysis sessions per
+patient, one bounded random walk per parameter:
+
+- DRYWT drifts within ±8% of the patient's current dry weight, with a small
+  per-patient trend;
+- QBLD, QDLST, DLSTTEMP and BICON wander inside their `ref_range` from
+  `history_template.PRESCRIPTION_PARAMS`.
+
+Walks run backwards from the values in the history, so the latest session always
+agrees with the snapshot. Each walk is a cumulative sum of normal steps folded back
+into its range (reflection), computed for the whole chunk as (patients x sessions)
+arrays with no per-session Python work.
+
+Sessions follow a three-times-a-week schedule (Mon/Wed/Fri or Tue/Thu/Sat, picked per
+patient) ending at the sampler's reference date. Output is one NDJSON line per
+patient:
+
+    {"patient_id": "...", "schedule": "MWF", "session_dates": ["01-02-2024", ...],
+     "series": {"DRYWT": [61.2, ...], "QBLD": [350, ...], ...}}
+
+Usage
+-----
+    series = SessionSeries(reference=sampler.reference, years=3)
+    lines = series.dumps_chunk(histories, np.random.default_rng(seed))
+"""
+
+from __future__ import annotations
+
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from date_sampler import DateSampler
+from history_template import DRY_WEIGHT_PARAM, PRESCRIPTION_PARAMS
+
+SESSIONS_PER_WEEK = 3
+SCHEDULES = (("MWF", (0, 2, 4)), ("TTS", (1, 3, 5)))  # weekday numbers, Monday = 0
+
+DRY_WEIGHT_BAND = 0.08  # dry weight stays within ±8% of its current value
+
+# code: (decimals, step standard deviation per session, per-patient trend standard deviation)
+WALKS: Dict[str, Tuple[int, float, float]] = {
+    DRY_WEIGHT_PARAM[0]: (1, 0.2, 0.01),
+    "QBLD": (0, 5.0, 0.0),
+    "QDLST": (0, 8.0, 0.0),
+    "DLSTTEMP": (1, 0.05, 0.0),
+    "BICON": (0, 0.3, 0.0),
+}
+RANGES = {code: ref_range for code, _, _, ref_range in PRESCRIPTION_PARAMS if code in WALKS}
+
+
+def bounded_walk(start: np.ndarray, low: np.ndarray, high: np.ndarray, step_sd: float, trend: np.ndarray,
+                 sessions: int, rng: np.random.Generator) -> np.ndarray:
+    """(patients x sessions) reflected random walks ending at *start*.
+
+    Steps are N(trend, step_sd) per session. The unbounded path is folded into
+    [low, high] with a triangle wave, which is exactly reflection at the bounds.
+    """
+    steps = rng.normal(trend[:, None], step_sd, (len(start), sessions - 1))
+    # Distance from each session to the latest one, walking back in time
+    back = np.zeros((len(start), sessions))
+    back[:, :-1] = np.cumsum(steps[:, ::-1], axis=1)[:, ::-1]
+    path = start[:, None] - back
+    low, width = low[:, None], (high - low)[:, None]
+    folded = np.mod(path - low, 2 * width)
+    return low + width - np.abs(folded - width)
+
+
+def session_days(reference: datetime, sessions: int, weekdays: Sequence[int]) -> np.ndarray:
+    """The last *sessions* days on *weekdays* up to and including *reference*, oldest first."""
+    last = np.datetime64(reference.date(), "D")
+    days = last - np.arange(sessions * 7 // len(weekdays) + 7)
+    weekday = (days.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+    return days[np.isin(weekday, weekdays)][:sessions][::-1]
+
+
+def encode_rows(values: np.ndarray, decimals: int) -> List[str]:
+    """JSON array text for each row of *values* (already rounded to *decimals*).
+
+    A walk takes few distinct values, so each one is formatted once into a lookup
+    table and rows are assembled with `np.take` and `str.join`; the text is the same
+    as `json.dumps(row.tolist())` at several times the speed.
+    """
+    scaled = np.rint(values * 10 ** decimals).astype(np.int64)
+    low = int(scaled.min())
+    steps = range(low, int(scaled.max()) + 1)
+    table = np.array([str(k) for k in steps] if decimals == 0 else [repr(k / 10 ** decimals) for k in steps],
+                     dtype=object)
+    return ["[" + ",".join(row) + "]" for row in np.take(table, scaled - low).tolist()]
+
+
+def history_values(history: Dict[str, Any]) -> Dict[str, float]:
+    """Current value of every walked parameter in a history."""
+    values = {DRY_WEIGHT_PARAM[0]: float(history["dry_weight"]["value"])}
+    for param in history["prescription_params"]:
+        if param["code"] in WALKS:
+            values[param["code"]] = float(param["value"])
+    return values
+
+
+class SessionSeries:
+    """Per-session random walks for chunks of histories; see module docstring."""
+
+    def __init__(self, reference: datetime, years: float = 3.0):
+        self.sessions = max(2, int(round(years * 52 * SESSIONS_PER_WEEK)))
+        dates = DateSampler(reference=reference)
+        # Every patient on a schedule shares its dates: encode them once
+        self.schedule_prefixes = [
+            f'"schedule":"{name}","session_dates":'
+            + json.dumps(dates.format_dmy(session_days(reference, self.sessions, weekdays)).tolist(),
+                         separators=(",", ":"))
+            for name, weekdays in SCHEDULES
+        ]
+
+    def sample(self, histories: List[Dict[str, Any]], rng: np.random.Generator) -> Dict[str, np.ndarray]:
+        """{code: (patients x sessions) array} for *histories*, rounded to each parameter's precision."""
+        current = [history_values(h) for h in histories]
+        series = {}
+        for code, (decimals, step_sd, trend_sd) in WALKS.items():
+            start = np.array([values[code] for values in current])
+            if code in RANGES:
+                low, high = (np.full(len(start), float(bound)) for bound in RANGES[code])
+                start = np.clip(start, low, high)
+            else:
+                low, high = start * (1 - DRY_WEIGHT_BAND), start * (1 + DRY_WEIGHT_BAND)
+            trend = rng.normal(0.0, trend_sd, len(start)) if trend_sd else np.zeros(len(start))
+            walk = np.round(bounded_walk(start, low, high, step_sd, trend, self.sessions, rng), decimals)
+            series[code] = walk.astype(np.int64) if decimals == 0 else walk
+        return series
+
+    def dumps_chunk(self, histories: List[Dict[str, Any]], rng: np.random.Generator) -> List[str]:
+        """One compact JSON line per history."""
+        if not histories:
+            return []
+        series = self.sample(histories, rng)
+        schedules = rng.integers(0, len(SCHEDULES), len(histories)).tolist()
+        rows = {code: encode_rows(series[code], WALKS[code][0]) for code in WALKS}
+        lines = []
+        for i, history in enumerate(histories):
+            columns = ",".join(f'"{code}":{rows[code][i]}' for code in WALKS)
+            lines.append(f'{{"patient_id":{json.dumps(history["patient_id"])},'
+                         f'{self.schedule_prefixes[schedules[i]]},"series":{{{columns}}}}}')
+        return lines
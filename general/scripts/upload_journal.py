@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+upload_journal.py
+-----------------
+Append-only SQLite journal of patient upload attempts, so an interrupted run can be
+resumed without re-creating patients that already exist.
+
+Every attempt is appended as one row keyed by a stable content fingerprint of the
+patient record (SHA-256 of its canonical JSON). `--resume` in the uploaders skips any
+record whose fingerprint already has a `created` row and retries everything else, so a
+rerun only costs the remaining work.
+
+Inspect a journal with the sqlite3 CLI, e.g.:
+
+    $ sqlite3 patient_upload_journal.sqlite \
+        "SELECT status, COUNT(*) FROM attempts GROUP BY status"
+
+Notes
+-----
+- Each attempt is committed immediately (WAL mode), so only requests that were in flight
+  when the process died are unaccounted for: one for the sequential uploader, up to
+  `--concurrency` for `async_create_patients.py`. On resume, those are sent again,
+  and any that had already reached the server can create a duplicate patient.
+- Records with byte-identical content share a fingerprint and are treated as one patient.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import time
+import uuid
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+DEFAULT_JOURNAL = "patient_upload_journal.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attempts (
+    seq         INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id      TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    name        TEXT,
+    status      TEXT NOT NULL CHECK (status IN ('created', 'failed')),
+    patient_id  TEXT,
+    error       TEXT,
+    ts          REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS attempts_created ON attempts (fingerprint) WHERE status = 'created';
+"""
+
+
+def patient_fingerprint(patient: Dict[str, Any]) -> str:
+    """Stable content hash of a patient record (independent of key order)."""
+    canonical = json.dumps(patient, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class UploadJournal:
+    """Append-only record of created / failed upload attempts."""
+
+    def __init__(self, path: str = DEFAULT_JOURNAL):
+        self.path = path
+        self.run_id = uuid.uuid4().hex
+        self.conn = sqlite3.connect(path, isolation_level=None)  # autocommit: one row = one commit
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.skipped = 0
+
+    def is_created(self, fingerprint: str) -> bool:
+        row = self.conn.execute(
+            "SELECT 1 FROM attempts WHERE fingerprint = ? AND status = 'created' LIMIT 1",
+            (fingerprint,),
+        ).fetchone()
+        return row is not None
+
+    def record(self, fingerprint: str, entry: Dict[str, Any], created: bool) -> None:
+        """Append one attempt; *entry* is the created/failed entry from `classify_response`."""
+        self.conn.execute(
+            "INSERT INTO attempts (run_id, fingerprint, name, status, patient_id, error, ts) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                self.run_id,
+                fingerprint,
+                entry.get("name"),
+                "created" if created else "failed",
+                entry.get("patient_id") if created else None,
+                None if created else entry.get("error"),
+                time.time(),
+            ),
+        )
+
+    def pending(self, patients: Iterable[Dict[str, Any]], resume: bool = True) -> Iterator[tuple]:
+        """Yield (fingerprint, patient) pairs.
+
+        With *resume*, records already created in any earlier run are skipped and counted
+        in `skipped`; failures from earlier runs are yielded again.
+        """
+        for patient in patients:
+            fingerprint = patient_fingerprint(patient)
+            if resume and self.is_created(fingerprint):
+                self.skipped += 1
+                continue
+            yield fingerprint, patient
+
+    def stats(self) -> Dict[str, int]:
+        created = self.conn.execute(
+            "SELECT COUNT(DISTINCT fingerprint) FROM attempts WHERE status = 'created'"
+        ).fetchone()[0]
+        failed_only = self.conn.execute(
+            "SELECT COUNT(DISTINCT fingerprint) FROM attempts WHERE status = 'failed' "
+            "AND fingerprint NOT IN (SELECT fingerprint FROM attempts WHERE status = 'created')"
+        ).fetchone()[0]
+        return {"created": created, "outstanding_failures": failed_only}
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def open_journal(path: Optional[str], resume: bool) -> Optional[UploadJournal]:
+    """Open the journal for an uploader run; `--resume` without a journal uses the default path."""
+    if path is None and not resume:
+        return None
+    return UploadJournal(path or DEFAULT_JOURNAL)
@@ -1,9 +1,66 @@
 #!/usr/bin/env python3
+"""
+Generate patient_histories records.
 
+Without arguments this writes histories for the 19 SMF patients below to
+smf/data/generated_patient_histories.json, as before.
+
+For whole tenants, stream the patients from a `patients` export file (JSON array,
+NDJSON, shard directory) or straight from MongoDB; age is derived from `provided_dob`.
+Histories are generated in worker processes and streamed to a JSON/NDJSON file, a
+shard directory or the `patient_histories` collection, so memory stays bounded:
+
+    python smf/scripts/generate_patient_histories.py --patients patients.ndjson.gz \
+        --output histories/ --workers 8 --seed 42
+    python smf/scripts/generate_patient_histories.py --from-mongo --to-mongo \
+        --org-id 685c18f504a6c31893801427
+
+With `--sessions-output FILE`, years of per-session DRYWT, QBLD, QDLST, DLSTTEMP and
+BICON values (bounded random walks ending at each history's values, see
+session_series.py) are written next to the histories, one NDJSON line per patient.
+
+With `--cache FILE`, only patients whose demographics (or the generator version or
+seed) changed since the last run are regenerated and upserted; see history_cache.py.
+It requires `--to-mongo`: the upsert leaves unchanged patients' histories in place,
+while a file, shard directory or `--sessions-output` would be rewritten with only the
+changed patients. The cache keeps the seed of its first run, so `--seed` can be left
+out afterwards:
+
+    python smf/scripts/generate_patient_histories.py --from-mongo --to-mongo \
+        --cache smf_histories.cache.sqlite
+"""
+
+import argparse
 import json
+import os
 import random
-from datetime import datetime, timedelta
-from typing import List, Dict, Any
+import secrets
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+
+# The date sampler is shared with the generators in general/scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "general", "scripts"))
+from date_sampler import DateSampler, default_sampler
+from export_backends import FORMATS, SUFFIXES, export_records, resolve_output
+from history_cache import HistoryCache
+from session_series import SessionSeries
+from history_template import HISTORY_TEMPLATE, PRESCRIPTION_PARAMS as TEMPLATE_PARAMS
+from patient_stream import iter_patient_file, open_text, write_json_array, write_ndjson_shard, write_ndjson_shards
+from progress_report import add_reporting_args, default_reporter
+
+sampler = default_sampler()
+report = default_reporter()
+
+# Part of every --cache hash: bump when a change to the generator should regenerate
+# every cached patient on the next incremental run
+GENERATOR_VERSION = "1"
 
 # Patient IDs for SMF org
 PATIENT_IDS = [
@@ -223,12 +280,10 @@ VACCINATION_SCHEDULES = {
     }
 }
 
-# ACTUAL prescription parameters found in database (only 6 parameters)
+# The numeric parameters; names, units and ranges come from the shared template table
 PRESCRIPTION_PARAMS = [
-    {"code": "QBLD", "name": "Quantum of blood", "unit": "ml/hr", "range": (300, 500)},
-    {"code": "QDLST", "name": "Quantum of dialysate", "unit": "ml/hr", "range": (500, 800)},
-    {"code": "DLSTTEMP", "name": "Dialysate temperature", "unit": "˚c", "range": (35, 37.5)},
-    {"code": "BICON", "name": "Bicarb Concentration", "unit": "mmol/l", "range": (24, 35)},  # Updated name to match DB
+    {"code": code, "name": name, "unit": unit, "range": ref_range}
+    for code, name, unit, ref_range in TEMPLATE_PARAMS if ref_range and ref_range[0] is not None
 ]
 
 DROPDOWN_OPTIONS = {
@@ -244,6 +299,9 @@ def get_diagnosis_for_patient(demographics: Dict[str, Any]) -> str:
     """Get age and gender appropriate diagnosis"""
     age = demographics["age"]
     gender = demographics["gender"]
+    if gender not in ("male", "female"):
+        # Diagnoses are only curated per binary gender
+        gender = random.choice(["male", "female"])
     
     if age < 35:
         key = f"young_{gender}"
@@ -256,10 +314,10 @@ def get_diagnosis_for_patient(demographics: Dict[str, Any]) -> str:
 
 def generate_vascular_access() -> Dict[str, Any]:
     """Generate vascular access data"""
-    created_date = datetime.now() - timedelta(days=random.randint(30, 365))
+    created_date = sampler.dmy_days_ago(30, 365)
     return {
         "value": random.choice(VASCULAR_ACCESS_OPTIONS),
-        "created": created_date.strftime("%d-%m-%Y")  # DD-MM-YYYY format to match database
+        "created": created_date  # DD-MM-YYYY format to match database
     }
 
 def generate_dry_weight(demographics: Dict[str, Any]) -> Dict[str, Any]:
@@ -276,19 +334,7 @@ def generate_dry_weight(demographics: Dict[str, Any]) -> Dict[str, Any]:
     
     weight = round(base_weight, 1)
     
-    return {
-        "code": "DRYWT",
-        "name": "Dry Weight",
-        "units": {
-            "unit": "Kg",
-            "ucum_code": None,
-            "is_default": None,
-            "ref_value": None,
-            "ref_range": None,
-            "format": None
-        },
-        "value": str(weight)
-    }
+    return HISTORY_TEMPLATE.dry_weight.build(str(weight))
 
 def generate_dialysis_runtime(demographics: Dict[str, Any]) -> Dict[str, int]:
     """Generate dialysis runtime based on patient needs"""
@@ -332,33 +378,11 @@ def generate_prescription_params(demographics: Dict[str, Any]) -> List[Dict[str,
             else:
                 value = random.randint(*param["range"])
         
-        param_data = {
-            "code": param["code"],
-            "name": param["name"],
-            "units": {
-                "unit": param["unit"],
-                "ucum_code": None,
-                "is_default": None,
-                "ref_value": None,
-                "ref_range": {
-                    "min": param["range"][0],
-                    "max": param["range"][1],
-                    "systolic": None,
-                    "diastolic": None
-                },
-                "format": None
-            },
-            "value": str(value)
-        }
+        param_data = HISTORY_TEMPLATE.param(param["code"]).build(str(value))
         params.append(param_data)
     
     # Add dropdown parameters
     for code, options in DROPDOWN_OPTIONS.items():
-        param_names = {
-            "DLZRUSE": "Dialyzer Use",
-            "HEPTYPE": "Heparin Type"
-        }
-        
         # Smart selection based on patient profile
         if code == "DLZRUSE":
             # Newer patients more likely to use Single use
@@ -372,24 +396,7 @@ def generate_prescription_params(demographics: Dict[str, Any]) -> List[Dict[str,
         else:
             value = random.choice(options)
         
-        param_data = {
-            "code": code,
-            "name": param_names[code],
-            "units": {
-                "unit": "",
-                "ucum_code": None,
-                "is_default": None,
-                "ref_value": None,
-                "ref_range": {
-                    "min": None,
-                    "max": None,
-                    "systolic": None,
-                    "diastolic": None
-                },
-                "format": None
-            },
-            "value": value
-        }
+        param_data = HISTORY_TEMPLATE.param(code).build(value)
         params.append(param_data)
     
     return params
@@ -412,20 +419,17 @@ def is_age_appropriate(vaccine: str, age: int) -> bool:
             return age >= 60
     return False
 
+# Base probabilities by priority
+PRIORITY_PROBABILITIES = {
+    "high": 0.95,      # Core vaccines - almost everyone should have
+    "medium": 0.75,    # Important for immunocompromised
+    "low": 0.45,       # Age-appropriate but not always given
+    "very_low": 0.15   # Travel/occupational vaccines
+}
+
 def get_vaccination_probability(vaccine: str, age: int) -> float:
     """Get probability of patient having this vaccine based on priority and demographics"""
-    schedule = VACCINATION_SCHEDULES[vaccine]
-    priority = schedule["priority"]
-    
-    # Base probabilities by priority
-    base_probs = {
-        "high": 0.95,      # Core vaccines - almost everyone should have
-        "medium": 0.75,    # Important for immunocompromised
-        "low": 0.45,       # Age-appropriate but not always given
-        "very_low": 0.15   # Travel/occupational vaccines
-    }
-    
-    prob = base_probs[priority]
+    prob = PRIORITY_PROBABILITIES[VACCINATION_SCHEDULES[vaccine]["priority"]]
     
     # Adjust based on age and vaccine type
     if vaccine in ["Shingles/Zoster", "RSV"] and age >= 60:
@@ -440,124 +444,140 @@ def get_vaccination_probability(vaccine: str, age: int) -> float:
     
     return min(prob, 0.98)  # Cap at 98%
 
-def generate_vaccination_dates(vaccine: str, age: int) -> List[datetime]:
-    """Generate realistic vaccination dates based on medical timeline"""
-    schedule = VACCINATION_SCHEDULES[vaccine]
-    intervals = schedule["intervals"]
-    num_shots = len(intervals)
-    
-    # Determine when vaccination series likely started
-    if vaccine == "COVID-19":
-        # COVID vaccines started in 2021
-        series_start = datetime(2021, 3, 1) + timedelta(days=random.randint(0, 400))
-    elif vaccine == "Influenza":
-        # Recent annual flu shots (last 3 years)
-        series_start = datetime.now() - timedelta(days=random.randint(30, 1095))
-    elif vaccine in ["HPV", "MMR", "Varicella"]:
-        # Often given in young adulthood
-        years_ago = max(1, age - random.randint(18, 25))
-        series_start = datetime.now() - timedelta(days=years_ago * 365)
-    elif vaccine in ["Shingles/Zoster", "RSV"]:
-        # Recent vaccines for elderly
-        series_start = datetime.now() - timedelta(days=random.randint(30, 730))
-    elif vaccine in ["Japanese Encephalitis", "Typhoid"]:
-        # Travel vaccines - random timing
-        series_start = datetime.now() - timedelta(days=random.randint(180, 2555))
-    else:
-        # Standard vaccines - historical
-        series_start = datetime.now() - timedelta(days=random.randint(365, 3650))
-    
-    # Generate shot dates based on intervals
-    dates = []
-    current_date = series_start
-    
-    for i, interval_days in enumerate(intervals):
-        if i == 0:
-            dates.append(current_date)
-        else:
-            # Add some realistic variation to intervals (±7 days)
-            actual_interval = interval_days + random.randint(-7, 7)
-            current_date = dates[0] + timedelta(days=actual_interval)
-            dates.append(current_date)
-    
-    # For influenza, generate multiple annual shots
-    if vaccine == "Influenza" and num_shots > 1:
-        dates = []
-        for i in range(schedule["shots"]):
-            shot_date = datetime.now() - timedelta(days=365 * i + random.randint(-30, 30))
-            dates.insert(0, shot_date)  # Insert at beginning for chronological order
-    
-    return dates
+# Schedules compiled once into arrays so a whole cohort is sampled in a few NumPy ops.
+# Everything is expressed as "days before the reference date".
+MAX_AGE = 120
+COVID_ROLLOUT = datetime(2021, 3, 1)
 
-def generate_vaccination(patient_id: str, demographics: Dict[str, Any]) -> List[Dict[str, Any]]:
-    """Generate comprehensive, realistic vaccination data based on CDC guidelines"""
-    vaccinations = []
-    age = demographics["age"]
-    
-    print(f"  Generating vaccinations for {demographics['name']} (age {age})...")
+# How the first shot of a series is dated
+START_DAYS_AGO, START_COVID, START_YOUNG_ADULT, START_ANNUAL = range(4)
+SERIES_START = {
+    "COVID-19": (START_COVID, 0, 400),                # COVID vaccines started in 2021
+    "Influenza": (START_ANNUAL, -30, 30),             # Recent annual flu shots, one a year
+    "HPV": (START_YOUNG_ADULT, 18, 25),               # Often given in young adulthood
+    "MMR": (START_YOUNG_ADULT, 18, 25),
+    "Varicella": (START_YOUNG_ADULT, 18, 25),
+    "Shingles/Zoster": (START_DAYS_AGO, 30, 730),     # Recent vaccines for elderly
+    "RSV": (START_DAYS_AGO, 30, 730),
+    "Japanese Encephalitis": (START_DAYS_AGO, 180, 2555),  # Travel vaccines - random timing
+    "Typhoid": (START_DAYS_AGO, 180, 2555),
+}
+DEFAULT_SERIES_START = (START_DAYS_AGO, 365, 3650)    # Standard vaccines - historical
+INTERVAL_JITTER = 7                                   # ± days around each scheduled interval
+
+
+class VaccinationTables:
+    """`VACCINATION_SCHEDULES` as arrays: an age x vaccine probability matrix and per-shot offsets."""
     
-    # Go through all possible vaccines
-    for vaccine in VACCINATION_INFECTIONS:
-        # Check if age-appropriate
-        if not is_age_appropriate(vaccine, age):
-            continue
-            
-        # Check probability of having this vaccine
-        prob = get_vaccination_probability(vaccine, age)
-        if random.random() > prob:
-            continue
-            
-        print(f"    Adding {vaccine} vaccination series")
+    def __init__(self, infections: List[str] = VACCINATION_INFECTIONS):
+        self.infections = list(infections)
+        shot_counts = [self._shot_count(v) for v in self.infections]
+        self.max_shots = max(shot_counts)
         
-        # Get vaccination schedule
+        self.probability = np.array([
+            [get_vaccination_probability(v, age) if is_age_appropriate(v, age) else 0.0 for v in self.infections]
+            for age in range(MAX_AGE + 1)
+        ])
+        self.shot_counts = np.array(shot_counts)
+        # Low priority series may be left incomplete
+        self.complete = np.array([VACCINATION_SCHEDULES[v]["priority"] in ("high", "medium") for v in self.infections])
+        self.intervals = np.zeros((len(self.infections), self.max_shots), dtype=np.int64)
+        self.kinds: List[List[str]] = []
+        for j, vaccine in enumerate(self.infections):
+            schedule = VACCINATION_SCHEDULES[vaccine]
+            # The first shot starts the series; later ones are offset from it
+            intervals = schedule["intervals"]
+            self.intervals[j, 1:len(intervals)] = intervals[1:]
+            self.kinds.append([schedule["kinds"][min(i, len(schedule["kinds"]) - 1)] for i in range(self.max_shots)])
+        starts = [SERIES_START.get(v, DEFAULT_SERIES_START) for v in self.infections]
+        self.start_kind = np.array([s[0] for s in starts])
+        self.start_low = np.array([s[1] for s in starts])
+        self.start_high = np.array([s[2] for s in starts])
+    
+    @staticmethod
+    def _shot_count(vaccine: str) -> int:
         schedule = VACCINATION_SCHEDULES[vaccine]
-        shot_kinds = schedule["kinds"]
+        # Annual series get one shot per year; the rest follow their intervals
+        return schedule["shots"] if SERIES_START.get(vaccine, DEFAULT_SERIES_START)[0] == START_ANNUAL else len(schedule["intervals"])
+    
+    def sample(self, patient_ids: List[str], ages: Any, rng: np.random.Generator,
+               dates: DateSampler) -> List[List[Dict[str, Any]]]:
+        """`vaccination` lists for a cohort: Bernoulli draws and shot dates for all patients at once"""
+        ages = np.clip(np.asarray(ages, dtype=np.int64), 0, MAX_AGE)
+        n, v, s = len(ages), len(self.infections), self.max_shots
         
-        # Generate realistic dates
-        shot_dates = generate_vaccination_dates(vaccine, age)
+        taken = rng.random((n, v)) < self.probability[ages]
         
-        # Determine how many shots patient actually received
-        # High priority vaccines: usually complete series
-        # Lower priority: might be incomplete
-        if schedule["priority"] in ["high", "medium"]:
-            num_shots_received = len(shot_dates)
-        else:
-            # Might have incomplete series for low priority vaccines
-            num_shots_received = random.randint(1, len(shot_dates))
-            shot_dates = shot_dates[:num_shots_received]
-            
-        # Create shot records
-        shots = []
-        for i, shot_date in enumerate(shot_dates):
-            shots.append({
-                "date": shot_date.strftime("%d-%m-%Y"),  # DD-MM-YYYY format to match database
-                "count": i + 1,
-                "kind": shot_kinds[min(i, len(shot_kinds) - 1)],
-                "user_id": None,
-                "org_id": None
-            })
+        # Days before the reference date at which each series starts
+        uniform = rng.integers(self.start_low, self.start_high, (n, v), endpoint=True)
+        covid_days_ago = dates.reference.toordinal() - COVID_ROLLOUT.toordinal()
+        young_adult_days_ago = np.maximum(1, ages[:, None] - uniform) * 365
+        start = np.select([self.start_kind == START_COVID, self.start_kind == START_YOUNG_ADULT],
+                          [covid_days_ago - uniform, young_adult_days_ago], uniform)
+        
+        # Later shots follow the schedule's interval with some realistic variation
+        jitter = rng.integers(-INTERVAL_JITTER, INTERVAL_JITTER, (n, v, s), endpoint=True)
+        jitter[:, :, 0] = 0
+        days_ago = start[:, :, None] - (self.intervals + jitter)
+        annual = self.start_kind == START_ANNUAL
+        if annual.any():
+            # Newest shot is ~today, the others a year apart each, oldest first
+            years_back = (self.shot_counts[annual, None] - 1 - np.arange(s)) * 365
+            days_ago[:, annual] = years_back + rng.integers(self.start_low[annual, None], self.start_high[annual, None],
+                                                            (n, int(annual.sum()), s), endpoint=True)
         
-        vaccination = {
-            "id": None,
-            "version": None,
-            "patientId": patient_id,
-            "infection": vaccine,
-            "shots": shots
-        }
-        vaccinations.append(vaccination)
+        received = np.where(self.complete, self.shot_counts,
+                            rng.integers(1, self.shot_counts, (n, v), endpoint=True))
+        shot_dates = dates.format_dmy(np.datetime64(dates.reference.date(), "D") - days_ago.astype("timedelta64[D]"))
+        
+        # Plain lists: indexing NumPy arrays element by element is slower than the dicts below
+        shot_dates, received = shot_dates.tolist(), received.tolist()
+        patient_index, vaccine_index = np.nonzero(taken)
+        series = [[] for _ in patient_ids]
+        for i, j in zip(patient_index.tolist(), vaccine_index.tolist()):
+            series[i].append(j)
+        
+        cohort = []
+        for i, patient_id in enumerate(patient_ids):
+            vaccinations = []
+            for j in series[i]:
+                kinds, row = self.kinds[j], shot_dates[i][j]
+                vaccinations.append({
+                    "id": None,
+                    "version": None,
+                    "patientId": patient_id,
+                    "infection": self.infections[j],
+                    "shots": [{
+                        "date": row[k],  # DD-MM-YYYY format to match database
+                        "count": k + 1,
+                        "kind": kinds[k],
+                        "user_id": None,
+                        "org_id": None
+                    } for k in range(received[i][j])]
+                })
+            cohort.append(vaccinations)
+        return cohort
+
+
+VACCINATION_TABLES = VaccinationTables()
+
+def generate_vaccination(patient_id: str, demographics: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Generate comprehensive, realistic vaccination data based on CDC guidelines"""
+    age = demographics["age"]
+    vaccinations = VACCINATION_TABLES.sample([patient_id], [age], sampler.rng, sampler)[0]
     
-    print(f"    Generated {len(vaccinations)} vaccination series with {sum(len(v['shots']) for v in vaccinations)} total shots")
+    if report.is_enabled("debug"):
+        report.debug(f"  Generating vaccinations for {demographics['name']} (age {age})...")
+        for vaccination in vaccinations:
+            report.debug(f"    Adding {vaccination['infection']} vaccination series")
+        report.debug(f"    Generated {len(vaccinations)} vaccination series with {sum(len(v['shots']) for v in vaccinations)} total shots")
     return vaccinations
 
 def generate_audit() -> Dict[str, Any]:
     """Generate audit data with proper users and MongoDB date format"""
     user = random.choice(USERS)
-    # Generate a realistic timestamp within the last 6 months
-    now = datetime.now()
-    created_time = now - timedelta(days=random.randint(1, 180))
-    
-    # Format as MongoDB $date format
-    iso_timestamp = created_time.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    # Generate a realistic timestamp within the last 6 months, in MongoDB $date format
+    iso_timestamp = sampler.iso_z(sampler.days_ago(1, 180))
     return {
         "created_on": {"$date": iso_timestamp},
         "updated_on": {"$date": iso_timestamp},
@@ -565,9 +585,11 @@ def generate_audit() -> Dict[str, Any]:
         "updated_by": user
     }
 
-def generate_patient_history(patient_id: str) -> Dict[str, Any]:
+def generate_patient_history(patient_id: str, demographics: Optional[Dict[str, Any]] = None,
+                             vaccination: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
     """Generate complete patient history record"""
-    demographics = get_patient_demographics(patient_id)
+    if demographics is None:
+        demographics = get_patient_demographics(patient_id)
     
     return {
         "patient_id": patient_id,  # Put patient_id first to match database structure
@@ -576,32 +598,323 @@ def generate_patient_history(patient_id: str) -> Dict[str, Any]:
         "dialysis_runtime": generate_dialysis_runtime(demographics),
         "prescription_params": generate_prescription_params(demographics),
         "diagnosis": get_diagnosis_for_patient(demographics),
-        "vaccination": generate_vaccination(patient_id, demographics),
+        "vaccination": vaccination if vaccination is not None else generate_vaccination(patient_id, demographics),
         "audit": generate_audit()
     }
 
+# ---------------------------------------------------------------------------
+# Cohort mode: streamed demographics, worker processes, streamed output
+# ---------------------------------------------------------------------------
+
+PATIENT_PROJECTION = {"name": 1, "gender": 1, "provided_dob": 1, "blood_group": 1}
+
+
+def _patient_id(patient: Dict[str, Any]) -> Optional[str]:
+    """`_id` as a hex string, whether it is an ObjectId, `{"$oid": ...}` or a plain string"""
+    value = patient.get("_id", patient.get("patient_id"))
+    if isinstance(value, dict):
+        value = value.get("$oid")
+    return str(value) if value is not None else None
+
+
+def _parse_dob(value: Any) -> Optional[datetime]:
+    if isinstance(value, dict):
+        value = value.get("$date")
+    if isinstance(value, datetime):
+        return value
+    if not isinstance(value, str):
+        return None
+    for fmt in ("%d-%m-%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value[:10], fmt)
+        except ValueError:
+            pass
+    return None
+
+
+def demographics_from_patient(patient: Dict[str, Any], today: datetime) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """(patient_id, demographics) for a `patients` document, or None if it has no id or DOB"""
+    patient_id = _patient_id(patient)
+    dob = _parse_dob(patient.get("provided_dob"))
+    if patient_id is None or dob is None:
+        return None
+    age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+    return patient_id, {
+        "name": patient.get("name", ""),
+        "gender": str(patient.get("gender", "")).lower(),
+        "age": age,
+        "blood_group": patient.get("blood_group")
+    }
+
+
+def iter_mongo_patients(mongodb_url: str, db_name: str, org_id: Optional[str] = None,
+                        batch_size: int = 5000) -> Iterator[Dict[str, Any]]:
+    """Stream `patients` documents (only the demographic fields) from a server-side cursor"""
+    from pymongo import MongoClient
+
+    client = MongoClient(mongodb_url)
+    try:
+        query = {"org_id": org_id} if org_id else {}
+        cursor = client[db_name]["patients"].find(query, PATIENT_PROJECTION, batch_size=batch_size)
+        yield from cursor
+    finally:
+        client.close()
+
+
+def iter_cohort(patients: Iterable[Dict[str, Any]], today: datetime) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    for patient in patients:
+        row = demographics_from_patient(patient, today)
+        if row is None:
+            report.count("skipped_no_id_or_dob")
+            continue
+        yield row
+
+
+def _init_worker(reference: datetime) -> None:
+    # Every worker dates records against the parent's clock, whatever the start method
+    global sampler
+    sampler = DateSampler(reference=reference)
+
+
+def _generate_chunk(task) -> Tuple[List[str], List[str]]:
+    """Worker: (history lines, session series lines) for one chunk of patients, as compact JSON"""
+    seed, index, chunk, sessions = task
+    random.seed(f"{seed}:{index}")
+    rng = np.random.default_rng([seed, index])
+    vaccinations = VACCINATION_TABLES.sample([patient_id for patient_id, _ in chunk],
+                                             [demographics["age"] for _, demographics in chunk], rng, sampler)
+    histories = [generate_patient_history(patient_id, demographics, vaccination)
+                 for (patient_id, demographics), vaccination in zip(chunk, vaccinations)]
+    # A separate stream, so histories are the same with or without --sessions-output
+    series = sessions.dumps_chunk(histories, np.random.default_rng([seed, index, 1])) if sessions else []
+    return [HISTORY_TEMPLATE.dumps(history) for history in histories], series
+
+
+def _chunks(rows: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    it = iter(rows)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _generate_chunks(rows: Iterable[Tuple[str, Dict[str, Any]]], seed: int, workers: Optional[int],
+                     chunk_size: int, sessions: Optional[SessionSeries]) -> Iterator[Tuple[List[str], List[str]]]:
+    tasks = ((seed, i, chunk, sessions) for i, chunk in enumerate(_chunks(rows, chunk_size)))
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        yield from map(_generate_chunk, tasks)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(sampler.reference,)) as pool:
+        window = 2 * workers
+        pending = deque(pool.submit(_generate_chunk, task) for task in islice(tasks, window))
+        while pending:
+            result = pending.popleft().result()
+            for task in islice(tasks, 1):
+                pending.append(pool.submit(_generate_chunk, task))
+            yield result
+
+
+def generate_cohort_histories(rows: Iterable[Tuple[str, Dict[str, Any]]], seed: int, workers: Optional[int] = None,
+                              chunk_size: int = 1000, sessions: Optional[SessionSeries] = None,
+                              sessions_out=None) -> Iterator[str]:
+    """Yield history JSON lines for *rows* in input order.
+
+    Chunk *i* is generated with `random.seed(f"{seed}:{i}")` and `default_rng([seed, i])`
+    (vaccinations are sampled for the whole chunk at once), so output depends only on
+    the seed, chunk size and input, not on *workers*. At most two chunks per worker are
+    in flight, so memory does not grow with the cohort.
+
+    With *sessions*, each chunk's session series lines are written to the text stream
+    *sessions_out* as the chunk's histories are yielded.
+    """
+    for lines, series in _generate_chunks(rows, seed, workers, chunk_size, sessions):
+        if series:
+            sessions_out.writelines(line + "\n" for line in series)
+            report.count("session_points", len(series) * sessions.sessions)
+        yield from lines
+
+
+def _with_progress(lines: Iterable[str]) -> Iterator[str]:
+    for line in lines:
+        yield line
+        report.advance()
+
+
+def write_histories(lines: Iterable[str], output: str, shard_size: int, compression: str) -> int:
+    """Stream *lines* to a `.json` array, a single `.ndjson[.gz|.zst]` file, a `.parquet` file or a shard directory"""
+    path = Path(output)
+    if path.suffix == ".parquet":
+        return export_records(lines, output, "parquet", layout="patient_histories")
+    if path.suffix == ".json":
+        return write_json_array(lines, path)
+    if ".ndjson" in path.name or path.suffix == ".jsonl":
+        return write_ndjson_shard(lines, path, compression if compression != "none" else None)
+    return write_ndjson_shards(lines, path, shard_size, compression, prefix="patient_histories")["total"]
+
+
+def upsert_to_mongo(lines: Iterable[str], args) -> Dict[str, Any]:
+    """Idempotently upsert *lines* into `patient_histories` (see mongo_upsert_histories)"""
+    from pymongo import MongoClient
+    from mongo_load_patients import make_write_concern
+    from mongo_upsert_histories import ensure_index, upsert_histories
+
+    client = MongoClient(args.mongodb_url, maxPoolSize=max(100, args.writers))
+    try:
+        collection = client[args.db].get_collection("patient_histories",
+                                                    write_concern=make_write_concern(args.w, False))
+        ensure_index(collection)
+        stats = upsert_histories(collection, (json.loads(line) for line in lines), args.batch_size, args.writers)
+    finally:
+        client.close()
+    return {**stats.totals, "batch_latency_ms": stats.latency_ms()}
+
+
+DEFAULT_OUTPUT = "smf/data/generated_patient_histories.json"
+COHORT_OUTPUT = "patient_histories"
+
+
+def _output(args, default: str) -> str:
+    output, fmt = resolve_output(args.output or default, args.format)
+    if args.format and not Path(output).suffix and fmt != "ndjson":
+        # Only NDJSON is sharded: a directory name becomes a single file of the requested type
+        output += SUFFIXES[fmt]
+    return output
+
+
+def _parse_args():
+    p = argparse.ArgumentParser(description="Generate patient_histories records.")
+    p.add_argument("--patients", help="patients export: JSON array, NDJSON (.gz/.zst), shard directory or glob.")
+    p.add_argument("--from-mongo", action="store_true", help="Stream patients from the patients collection.")
+    p.add_argument("--mongodb-url", default=os.getenv("DEMO_MONGODB_URL"),
+                   help="Server for --from-mongo / --to-mongo (default: $DEMO_MONGODB_URL).")
+    p.add_argument("--db", default="jano_core", help="Database name.")
+    p.add_argument("--org-id", help="Only patients of this org (--from-mongo).")
+    p.add_argument("--output", default=None,
+                   help="*.json array, *.ndjson[.gz|.zst] file, *.parquet or a shard directory "
+                        f"(default: {DEFAULT_OUTPUT}, or the {COHORT_OUTPUT}/ directory for a cohort).")
+    p.add_argument("--format", choices=FORMATS, default=None,
+                   help="json array, ndjson (Extended JSON for mongoimport) or parquet (flattened columns); "
+                        "default: from the --output name.")
+    p.add_argument("--to-mongo", action="store_true", help="Upsert into patient_histories instead of a file.")
+    p.add_argument("--batch-size", type=int, default=1000, help="Upserts per bulk_write (--to-mongo).")
+    p.add_argument("--writers", type=int, default=4, help="Concurrent bulk_write calls (--to-mongo).")
+    p.add_argument("--w", default="1", help="Write concern w for --to-mongo: a number or 'majority'.")
+    p.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    p.add_argument("--chunk-size", type=int, default=1000, help="Patients per worker task.")
+    p.add_argument("--shard-size", type=int, default=1_000_000, help="Histories per shard file.")
+    p.add_argument("--compression", choices=["none", "gz", "zst"], default="none")
+    p.add_argument("--seed", type=int, default=None, help="Seed for reproducible output.")
+    p.add_argument("--sessions-output", default=None,
+                   help="Also write per-session dry weight / prescription time series to this .ndjson[.gz|.zst] file.")
+    p.add_argument("--session-years", type=float, default=3.0, help="Years of sessions per patient (3 a week).")
+    p.add_argument("--cache", default=None,
+                   help="Content-hash cache file: only regenerate and upsert patients that changed since the last run "
+                        "(--to-mongo only).")
+    add_reporting_args(p)
+    return p
+
+
+def generate_cohort(args) -> None:
+    """Cohort mode: see module docstring"""
+    if args.patients:
+        source = iter_patient_file(args.patients)
+        report.info(f"Reading patients from {args.patients}")
+    else:
+        source = iter_mongo_patients(args.mongodb_url, args.db, args.org_id)
+        report.info(f"Reading patients from {args.db}.patients" + (f" (org {args.org_id})" if args.org_id else ""))
+
+    cache = HistoryCache(args.cache, GENERATOR_VERSION) if args.cache else None
+    if cache is not None:
+        seed = cache.resolve_seed(args.seed)
+        report.info(f"Cache: {args.cache} ({len(cache)} patients)")
+    else:
+        seed = args.seed if args.seed is not None else secrets.randbits(63)
+    report.info(f"Seed: {seed}")
+    report.start(label="histories")
+    rows = iter_cohort(source, sampler.reference)
+    if cache is not None:
+        rows = cache.changed(rows, seed)
+    sessions = sessions_out = None
+    if args.sessions_output:
+        sessions = SessionSeries(sampler.reference, args.session_years)
+        sessions_out = open_text(Path(args.sessions_output), "w")
+        report.info(f"Session series: {sessions.sessions} sessions per patient -> {args.sessions_output}")
+    lines = generate_cohort_histories(rows, seed, args.workers, args.chunk_size, sessions, sessions_out)
+
+    try:
+        if args.to_mongo:
+            result = upsert_to_mongo(lines, args)  # progress is advanced per written batch
+            destination = f"{args.db}.patient_histories"
+        else:
+            destination = _output(args, COHORT_OUTPUT)
+            result = {"written": write_histories(_with_progress(lines), destination, args.shard_size,
+                                                 args.compression)}
+        if cache is not None and result.get("failed"):
+            report.warning(f"{result['failed']} histories failed to write; cache left unchanged")
+        elif cache is not None:
+            cache.commit()
+            result["cache"] = cache.stats
+    finally:
+        if sessions_out is not None:
+            sessions_out.close()
+        if cache is not None:
+            cache.close()
+    report.summary(**result, destination=destination, seed=seed)
+
 def main():
-    """Generate patient histories for all 19 patients"""
+    """Generate patient histories for all 19 patients, or for a streamed cohort"""
+    args = _parse_args().parse_args()
+    report.configure_from_args(args)
+    if args.patients or args.from_mongo:
+        if (args.from_mongo or args.to_mongo) and not args.mongodb_url:
+            report.error("Error: set DEMO_MONGODB_URL or pass --mongodb-url")
+            return None
+        if args.cache and (not args.to_mongo or args.sessions_output):
+            # A file output would be replaced by just the changed patients
+            report.error("Error: --cache only works with --to-mongo and without --sessions-output")
+            return None
+        return generate_cohort(args)
+    if args.cache:
+        report.error("Error: --cache needs a cohort (--patients or --from-mongo) and --to-mongo")
+        return None
+    if args.seed is not None:
+        # Vaccinations are drawn from the sampler's generator, the rest from `random`
+        random.seed(args.seed)
+        sampler.rng = np.random.default_rng(args.seed)
+    
     patient_histories = []
     
-    print(f"Generating patient_histories for {len(PATIENT_IDS)} SMF patients...")
-    print("Using realistic data based on patient demographics and medical best practices")
+    report.info(f"Generating patient_histories for {len(PATIENT_IDS)} SMF patients...")
+    report.info("Using realistic data based on patient demographics and medical best practices")
+    report.start(total=len(PATIENT_IDS), label="patients")
     
     for i, patient_id in enumerate(PATIENT_IDS, 1):
         demographics = get_patient_demographics(patient_id)
-        print(f"Generating data for patient {i}/{len(PATIENT_IDS)}: {demographics['name']} (Age: {demographics['age']}, Gender: {demographics['gender']})")
+        report.debug(f"Generating data for patient {i}/{len(PATIENT_IDS)}: {demographics['name']} (Age: {demographics['age']}, Gender: {demographics['gender']})")
         patient_history = generate_patient_history(patient_id)
         patient_histories.append(patient_history)
-    
-    # Save to JSON file
-    output_file = "smf/data/generated_patient_histories.json"
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(patient_histories, f, indent=2, default=str)
-    
-    print(f"\nGenerated {len(patient_histories)} patient_histories records")
-    print(f"Data saved to: {output_file}")
-    print("\nSample record structure:")
-    print(json.dumps(patient_histories[0], indent=2, default=str)[:500] + "...")
+        report.advance()
+        report.count("vaccination_series", len(patient_history["vaccination"]))
+    
+    output_file, fmt = resolve_output(args.output or DEFAULT_OUTPUT, args.format)
+    export_records(patient_histories, output_file, fmt, layout="patient_histories", encode=HISTORY_TEMPLATE.dumps)
+    
+    report.info(f"\nGenerated {len(patient_histories)} patient_histories records")
+    report.info(f"Data saved to: {output_file}")
+    if args.sessions_output:
+        sessions = SessionSeries(sampler.reference, args.session_years)
+        rng = np.random.default_rng(None if args.seed is None else [args.seed, 1])
+        with open_text(Path(args.sessions_output), "w") as f:
+            for line in sessions.dumps_chunk(patient_histories, rng):
+                f.write(line + "\n")
+        report.info(f"Session series: {sessions.sessions} sessions per patient -> {args.sessions_output}")
+    report.debug("\nSample record structure:")
+    report.debug(json.dumps(patient_histories[0], indent=2, default=str)[:500] + "...")
+    report.summary(written=len(patient_histories), destination=output_file)
     
     return patient_histories
 
@@ -1,15 +1,24 @@
 #!/usr/bin/env python3
 
+import argparse
 import json
 import random
 import os
 import subprocess
 import uuid
 import mimetypes
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import List, Dict, Any
 import sys
 
+# The date sampler is shared with the generators in general/scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "general", "scripts"))
+from date_sampler import default_sampler
+from progress_report import add_reporting_args, default_reporter
+
+sampler = default_sampler()
+report = default_reporter()
+
 # SMF Organization and Patient Data
 SMF_ORG_ID = "685c18f504a6c31893801427"
 
@@ -92,26 +101,24 @@ def upload_file_to_s3(local_path: str, s3_key: str) -> bool:
             "--no-cli-pager"
         ]
         
-        print(f"    Uploading {os.path.basename(local_path)} to {s3_uri}")
+        report.debug(f"    Uploading {os.path.basename(local_path)} to {s3_uri}")
         
         result = subprocess.run(cmd, capture_output=True, text=True)
         
         if result.returncode == 0:
-            print(f"    ✓ Upload successful")
+            report.debug(f"    ✓ Upload successful")
             return True
         else:
-            print(f"    ✗ Upload failed: {result.stderr}")
+            report.warning(f"    ✗ Upload failed: {result.stderr}")
             return False
             
     except Exception as e:
-        print(f"    ✗ Upload error: {str(e)}")
+        report.warning(f"    ✗ Upload error: {str(e)}")
         return False
 
 def generate_upload_time() -> datetime:
     """Generate realistic upload time (within last 6 months)"""
-    now = datetime.now()
-    days_ago = random.randint(1, 180)  # Last 6 months
-    upload_time = now - timedelta(days=days_ago)
+    upload_time = sampler.days_ago(1, 180)  # Last 6 months
     
     # Add some realistic time variation (business hours)
     hour = random.randint(8, 18)  # 8 AM to 6 PM
@@ -135,7 +142,7 @@ def create_report_record(patient_id: str, filename: str, file_info: Dict[str, An
             "mimetype": file_info['mimetype'],
             "patient_id": patient_id,
             "size": file_info['size'],
-            "upload_time": {"$date": upload_time.strftime("%Y-%m-%dT%H:%M:%S.%fZ")}
+            "upload_time": sampler.mongo_date(upload_time)
         },
         "__v": 0
     }
@@ -151,7 +158,7 @@ def generate_patient_reports(patient_id: str, available_files: List[str],
     # Randomly select files for this patient
     selected_files = random.sample(available_files, min(num_reports, len(available_files)))
     
-    print(f"  Processing {demographics['name']} - {num_reports} reports")
+    report.debug(f"  Processing {demographics['name']} - {num_reports} reports")
     
     reports = []
     
@@ -171,10 +178,11 @@ def generate_patient_reports(patient_id: str, available_files: List[str],
             upload_success = upload_file_to_s3(file_path, s3_key)
             
             if not upload_success:
-                print(f"    ⚠️  Skipping {filename} due to upload failure")
+                report.warning(f"    ⚠️  Skipping {filename} due to upload failure")
+                report.count("upload_failures")
                 continue
         else:
-            print(f"    [DRY RUN] Would upload {filename} as {s3_key}")
+            report.debug(f"    [DRY RUN] Would upload {filename} as {s3_key}")
         
         # Create MongoDB record
         report_record = create_report_record(
@@ -183,7 +191,7 @@ def generate_patient_reports(patient_id: str, available_files: List[str],
         
         reports.append(report_record)
         
-        print(f"    ✓ Created report record for {filename}")
+        report.debug(f"    ✓ Created report record for {filename}")
     
     return reports
 
@@ -192,13 +200,13 @@ def check_aws_cli() -> bool:
     try:
         result = subprocess.run(["aws", "--version"], capture_output=True, text=True)
         if result.returncode == 0:
-            print(f"✓ AWS CLI available: {result.stdout.strip()}")
+            report.info(f"✓ AWS CLI available: {result.stdout.strip()}")
             return True
         else:
-            print("✗ AWS CLI not available")
+            report.info("✗ AWS CLI not available")
             return False
     except FileNotFoundError:
-        print("✗ AWS CLI not installed")
+        report.info("✗ AWS CLI not installed")
         return False
 
 def check_aws_credentials() -> bool:
@@ -207,100 +215,109 @@ def check_aws_credentials() -> bool:
         result = subprocess.run(["aws", "sts", "get-caller-identity"], 
                               capture_output=True, text=True)
         if result.returncode == 0:
-            print("✓ AWS credentials configured")
+            report.info("✓ AWS credentials configured")
             return True
         else:
-            print("✗ AWS credentials not configured or invalid")
+            report.info("✗ AWS credentials not configured or invalid")
             return False
     except Exception:
-        print("✗ Unable to verify AWS credentials")
+        report.info("✗ Unable to verify AWS credentials")
         return False
 
 def main():
     """Generate patient reports for all SMF patients"""
-    print("SMF Patient Reports Generator")
-    print("=" * 50)
+    parser = argparse.ArgumentParser(description="Upload pathology reports and generate report records for the SMF patients.")
+    add_reporting_args(parser)
+    report.configure_from_args(parser.parse_args())
+    
+    report.info("SMF Patient Reports Generator")
+    report.info("=" * 50)
     
     # Check AWS CLI availability
     if not check_aws_cli():
-        print("\nERROR: AWS CLI is required for uploading files to S3")
-        print("Please install AWS CLI: https://aws.amazon.com/cli/")
+        report.error("\nERROR: AWS CLI is required for uploading files to S3")
+        report.error("Please install AWS CLI: https://aws.amazon.com/cli/")
         sys.exit(1)
     
     # Check AWS credentials
     if not check_aws_credentials():
-        print("\nERROR: AWS credentials not configured")
-        print("Please run: aws configure")
+        report.error("\nERROR: AWS credentials not configured")
+        report.error("Please run: aws configure")
         sys.exit(1)
     
     # Check if pathology directory exists
     if not os.path.exists(PATHOLOGY_DIR):
-        print(f"\nERROR: Pathology directory not found: {PATHOLOGY_DIR}")
+        report.error(f"\nERROR: Pathology directory not found: {PATHOLOGY_DIR}")
         sys.exit(1)
     
     # Get available report files
     available_files = get_available_report_files()
     if not available_files:
-        print(f"\nERROR: No report files found in {PATHOLOGY_DIR}")
+        report.error(f"\nERROR: No report files found in {PATHOLOGY_DIR}")
         sys.exit(1)
     
-    print(f"\nFound {len(available_files)} report files:")
+    report.info(f"\nFound {len(available_files)} report files:")
     for f in available_files:
-        print(f"  - {f}")
+        report.info(f"  - {f}")
     
     # Ask for confirmation
-    print(f"\nThis will generate reports for {len(PATIENT_IDS)} patients.")
-    print(f"Files will be uploaded to S3 bucket: {S3_BUCKET}")
+    report.info(f"\nThis will generate reports for {len(PATIENT_IDS)} patients.")
+    report.info(f"Files will be uploaded to S3 bucket: {S3_BUCKET}")
     
     dry_run = input("\nRun in dry-run mode? (y/N): ").lower().startswith('y')
     
     if not dry_run:
         confirm = input("Proceed with actual uploads? (y/N): ").lower().startswith('y')
         if not confirm:
-            print("Operation cancelled.")
+            report.info("Operation cancelled.")
             sys.exit(0)
     
-    print(f"\n{'='*50}")
-    print("GENERATING PATIENT REPORTS")
-    print(f"{'='*50}")
+    report.info(f"\n{'='*50}")
+    report.info("GENERATING PATIENT REPORTS")
+    report.info(f"{'='*50}")
     
     all_reports = []
+    report.start(total=len(PATIENT_IDS), label="patients")
     
     for i, patient_id in enumerate(PATIENT_IDS, 1):
         demographics = PATIENT_DEMOGRAPHICS[patient_id]
-        print(f"\nPatient {i}/{len(PATIENT_IDS)}: {demographics['name']} (ID: {patient_id})")
+        report.debug(f"\nPatient {i}/{len(PATIENT_IDS)}: {demographics['name']} (ID: {patient_id})")
         
         patient_reports = generate_patient_reports(patient_id, available_files, dry_run)
         all_reports.extend(patient_reports)
+        report.advance()
+        report.count("reports", len(patient_reports))
     
     # Save to JSON file
     output_file = "../data/generated_patient_reports.json"
     with open(output_file, 'w', encoding='utf-8') as f:
         json.dump(all_reports, f, indent=2, default=str)
     
-    print(f"\n{'='*50}")
-    print("GENERATION COMPLETE")
-    print(f"{'='*50}")
-    print(f"Total reports generated: {len(all_reports)}")
-    print(f"Data saved to: {output_file}")
+    report.info(f"\n{'='*50}")
+    report.info("GENERATION COMPLETE")
+    report.info(f"{'='*50}")
+    report.info(f"Total reports generated: {len(all_reports)}")
+    report.info(f"Data saved to: {output_file}")
     
     # Statistics
-    patients_with_reports = len(set(report['patient']['$oid'] for report in all_reports))
+    patients_with_reports = len(set(r['patient']['$oid'] for r in all_reports))
     avg_reports_per_patient = len(all_reports) / patients_with_reports if patients_with_reports > 0 else 0
     
-    print(f"\nStatistics:")
-    print(f"  - Patients with reports: {patients_with_reports}")
-    print(f"  - Average reports per patient: {avg_reports_per_patient:.1f}")
-    print(f"  - S3 bucket used: {S3_BUCKET}")
+    report.info(f"\nStatistics:")
+    report.info(f"  - Patients with reports: {patients_with_reports}")
+    report.info(f"  - Average reports per patient: {avg_reports_per_patient:.1f}")
+    report.info(f"  - S3 bucket used: {S3_BUCKET}")
     
     if dry_run:
-        print(f"\n⚠️  DRY RUN MODE - No files were actually uploaded")
+        report.info(f"\n⚠️  DRY RUN MODE - No files were actually uploaded")
     else:
-        print(f"\n✓ Files uploaded to S3 and report records created")
+        report.info(f"\n✓ Files uploaded to S3 and report records created")
     
-    print(f"\nSample report record:")
+    report.debug(f"\nSample report record:")
     if all_reports:
-        print(json.dumps(all_reports[0], indent=2, default=str)[:500] + "...")
+        report.debug(json.dumps(all_reports[0], indent=2, default=str)[:500] + "...")
+    report.summary(written=len(all_reports), destination=output_file, dry_run=dry_run,
+                   patients_with_reports=patients_with_reports)
     
     return all_reports
 
@@ -1,10 +1,21 @@
 #!/usr/bin/env python3
 
+import argparse
 import json
+import os
 import random
-from datetime import datetime, timedelta
+import sys
 from typing import List, Dict, Any
 
+# The date sampler is shared with the generators in general/scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "general", "scripts"))
+from date_sampler import default_sampler
+from export_backends import add_export_args, export_records, resolve_output
+from progress_report import add_reporting_args, default_reporter
+
+sampler = default_sampler()
+report = default_reporter()
+
 # SMF Organization and Patient Data
 SMF_ORG_ID = "685c18f504a6c31893801427"
 
@@ -165,12 +176,9 @@ def generate_serology_tags(demographics: Dict[str, Any]) -> List[Dict[str, Any]]
     
     # Generate dates for each test (within last 1-3 years for active patients)
     for test in core_tests:
-        test_date = datetime.now() - timedelta(days=random.randint(30, 1095))
-        # Format as MongoDB $date format
-        iso_timestamp = test_date.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
         tags.append({
             "name": test,
-            "since": {"$date": iso_timestamp}
+            "since": sampler.mongo_days_ago(30, 1095)  # MongoDB $date format
         })
     
     return tags
@@ -207,15 +215,13 @@ def generate_allergy_tags(demographics: Dict[str, Any]) -> List[Dict[str, Any]]:
     for allergy in allergy_categories:
         # Allergies typically discovered throughout life, more recent for drug allergies
         if "drug" in [cat for cat, allergens in ALLERGY_OPTIONS.items() if allergy in allergens]:
-            allergy_date = datetime.now() - timedelta(days=random.randint(30, 1825))  # Last 5 years
+            allergy_date = sampler.days_ago(30, 1825)  # Last 5 years
         else:
-            allergy_date = datetime.now() - timedelta(days=random.randint(365, age * 365 // 2))  # Could be from childhood
+            allergy_date = sampler.days_ago(365, age * 365 // 2)  # Could be from childhood
         
-        # Format as MongoDB $date format
-        iso_timestamp = allergy_date.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
         tags.append({
             "name": allergy,
-            "since": {"$date": iso_timestamp}
+            "since": sampler.mongo_date(allergy_date)  # MongoDB $date format
         })
     
     return tags
@@ -263,22 +269,20 @@ def generate_condition_tags(demographics: Dict[str, Any]) -> List[Dict[str, Any]
     for condition in all_conditions:
         if condition in CONDITION_OPTIONS["primary"]:
             # Primary conditions typically diagnosed years before dialysis
-            condition_date = datetime.now() - timedelta(days=random.randint(1095, 7300))  # 3-20 years ago
+            condition_date = sampler.days_ago(1095, 7300)  # 3-20 years ago
         elif condition in CONDITION_OPTIONS["cardiovascular"]:
             # Cardiovascular conditions often develop after primary condition
-            condition_date = datetime.now() - timedelta(days=random.randint(365, 5475))  # 1-15 years ago
+            condition_date = sampler.days_ago(365, 5475)  # 1-15 years ago
         elif condition in CONDITION_OPTIONS["ckd_complications"]:
             # CKD complications develop as kidney function declines
-            condition_date = datetime.now() - timedelta(days=random.randint(180, 2190))  # 6 months - 6 years ago
+            condition_date = sampler.days_ago(180, 2190)  # 6 months - 6 years ago
         else:
             # Other conditions - variable timing
-            condition_date = datetime.now() - timedelta(days=random.randint(365, age * 365 // 3))
+            condition_date = sampler.days_ago(365, age * 365 // 3)
         
-        # Format as MongoDB $date format
-        iso_timestamp = condition_date.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
         tags.append({
             "name": condition,
-            "since": {"$date": iso_timestamp}
+            "since": sampler.mongo_date(condition_date)  # MongoDB $date format
         })
     
     return tags
@@ -286,12 +290,8 @@ def generate_condition_tags(demographics: Dict[str, Any]) -> List[Dict[str, Any]
 def generate_audit() -> Dict[str, Any]:
     """Generate audit data with proper users and MongoDB date format"""
     user = random.choice(USERS)
-    # Generate a realistic timestamp within the last 6 months
-    now = datetime.now()
-    created_time = now - timedelta(days=random.randint(1, 180))
-    
-    # Format as MongoDB $date format
-    iso_timestamp = created_time.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    # Generate a realistic timestamp within the last 6 months, in MongoDB $date format
+    iso_timestamp = sampler.iso_z(sampler.days_ago(1, 180))
     return {
         "created_on": {"$date": iso_timestamp},
         "updated_on": {"$date": iso_timestamp},
@@ -304,7 +304,7 @@ def generate_patient_tags(patient_id: str) -> List[Dict[str, Any]]:
     demographics = get_patient_demographics(patient_id)
     patient_tags = []
     
-    print(f"  Generating tags for {demographics['name']} (age {demographics['age']}, {demographics['gender']})...")
+    report.debug(f"  Generating tags for {demographics['name']} (age {demographics['age']}, {demographics['gender']})...")
     
     # Generate serology tags
     serology_tags = generate_serology_tags(demographics)
@@ -317,7 +317,7 @@ def generate_patient_tags(patient_id: str) -> List[Dict[str, Any]]:
             "version": "1",
             "organizationId": {"$oid": SMF_ORG_ID}
         })
-        print(f"    - {len(serology_tags)} serology results")
+        report.debug(f"    - {len(serology_tags)} serology results")
     
     # Generate allergy tags
     allergy_tags = generate_allergy_tags(demographics)
@@ -330,7 +330,7 @@ def generate_patient_tags(patient_id: str) -> List[Dict[str, Any]]:
             "version": "1", 
             "organizationId": {"$oid": SMF_ORG_ID}
         })
-        print(f"    - {len(allergy_tags)} allergies")
+        report.debug(f"    - {len(allergy_tags)} allergies")
     
     # Generate condition tags  
     condition_tags = generate_condition_tags(demographics)
@@ -343,52 +343,62 @@ def generate_patient_tags(patient_id: str) -> List[Dict[str, Any]]:
             "version": "1",
             "organizationId": {"$oid": SMF_ORG_ID}
         })
-        print(f"    - {len(condition_tags)} medical conditions")
+        report.debug(f"    - {len(condition_tags)} medical conditions")
     
     return patient_tags
 
 def main():
     """Generate patient tags for all SMF patients"""
+    parser = argparse.ArgumentParser(description="Generate patient_tags for the SMF patients.")
+    add_export_args(parser, default_output="../data/generated_patient_tags.json")
+    add_reporting_args(parser)
+    args = parser.parse_args()
+    report.configure_from_args(args)
     all_patient_tags = []
     
-    print(f"Generating patient_tags for {len(PATIENT_IDS)} SMF patients...")
-    print("Categories: serology, allergies, conditions")
-    print("Based on medical best practices for CKD/dialysis patients\n")
+    report.info(f"Generating patient_tags for {len(PATIENT_IDS)} SMF patients...")
+    report.info("Categories: serology, allergies, conditions")
+    report.info("Based on medical best practices for CKD/dialysis patients\n")
+    report.start(total=len(PATIENT_IDS), label="patients")
     
     for i, patient_id in enumerate(PATIENT_IDS, 1):
         demographics = get_patient_demographics(patient_id)
-        print(f"Processing patient {i}/{len(PATIENT_IDS)}: {demographics['name']}")
+        report.debug(f"Processing patient {i}/{len(PATIENT_IDS)}: {demographics['name']}")
         
         patient_tags = generate_patient_tags(patient_id)
         all_patient_tags.extend(patient_tags)
+        report.advance()
     
-    # Save to JSON file
-    output_file = "../data/generated_patient_tags.json"
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(all_patient_tags, f, indent=2, default=str)
+    output_file, fmt = resolve_output(args.output, args.format)
+    export_records(all_patient_tags, output_file, fmt, layout="patient_tags")
     
-    print(f"\n{'='*60}")
-    print(f"GENERATION COMPLETE")
-    print(f"{'='*60}")
-    print(f"Total patient_tags records generated: {len(all_patient_tags)}")
-    print(f"Data saved to: {output_file}")
+    report.info(f"\n{'='*60}")
+    report.info(f"GENERATION COMPLETE")
+    report.info(f"{'='*60}")
+    report.info(f"Total patient_tags records generated: {len(all_patient_tags)}")
+    report.info(f"Data saved to: {output_file}")
     
     # Statistics
     serology_count = len([tag for tag in all_patient_tags if tag['category'] == 'serology'])
     allergy_count = len([tag for tag in all_patient_tags if tag['category'] == 'allergies']) 
     condition_count = len([tag for tag in all_patient_tags if tag['category'] == 'conditions'])
     
-    print(f"\nBreakdown by category:")
-    print(f"  - Serology records: {serology_count}")
-    print(f"  - Allergy records: {allergy_count}")
-    print(f"  - Condition records: {condition_count}")
+    report.info(f"\nBreakdown by category:")
+    report.info(f"  - Serology records: {serology_count}")
+    report.info(f"  - Allergy records: {allergy_count}")
+    report.info(f"  - Condition records: {condition_count}")
     
     total_tags = sum(len(record['tags']) for record in all_patient_tags)
-    print(f"  - Total individual tags: {total_tags}")
+    report.info(f"  - Total individual tags: {total_tags}")
+    report.count("serology", serology_count)
+    report.count("allergies", allergy_count)
+    report.count("conditions", condition_count)
+    report.count("tags", total_tags)
     
-    print(f"\nSample record structure:")
+    report.debug(f"\nSample record structure:")
     if all_patient_tags:
-        print(json.dumps(all_patient_tags[0], indent=2, default=str)[:800] + "...")
+        report.debug(json.dumps(all_patient_tags[0], indent=2, default=str)[:800] + "...")
+    report.summary(written=len(all_patient_tags), destination=output_file)
     
     return all_patient_tags
 
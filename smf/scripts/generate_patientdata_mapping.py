@@ -1,13 +1,21 @@
 #!/usr/bin/env python3
 
+import argparse
 import json
 import os
 import random
+import sys
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 from pymongo import MongoClient
 from dotenv import load_dotenv
 
+# The reporter is shared with the generators in general/scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "general", "scripts"))
+from progress_report import add_reporting_args, default_reporter
+
+report = default_reporter()
+
 # Load environment variables
 load_dotenv()
 
@@ -49,15 +57,15 @@ def connect_to_mongodb(connection_string: str, db_name: str):
         db = client[db_name]
         # Test connection
         db.command('ping')
-        print(f"✓ Connected to MongoDB: {db_name}")
+        report.info(f"✓ Connected to MongoDB: {db_name}")
         return db
     except Exception as e:
-        print(f"✗ Failed to connect to MongoDB: {e}")
+        report.error(f"✗ Failed to connect to MongoDB: {e}")
         return None
 
 def get_smf_patient_reports(demo_db) -> Dict[str, List[Dict[str, Any]]]:
     """Get all reports for SMF patients from Demo Cluster"""
-    print("\nFetching SMF patient reports from Demo Cluster...")
+    report.info("\nFetching SMF patient reports from Demo Cluster...")
     
     smf_patient_reports = {}
     
@@ -69,15 +77,15 @@ def get_smf_patient_reports(demo_db) -> Dict[str, List[Dict[str, Any]]]:
         
         if reports:
             smf_patient_reports[patient_id] = reports
-            print(f"  Patient {patient_id}: {len(reports)} pathology reports")
+            report.debug(f"  Patient {patient_id}: {len(reports)} pathology reports")
     
     total_reports = sum(len(reports) for reports in smf_patient_reports.values())
-    print(f"\nTotal SMF pathology reports found: {total_reports}")
+    report.info(f"\nTotal SMF pathology reports found: {total_reports}")
     return smf_patient_reports
 
 def create_originalname_to_old_report_mapping(original_db, reports_in_use: List[str]) -> Dict[str, str]:
     """Create mapping from originalname to old report ID"""
-    print("\nCreating originalname → old report ID mapping...")
+    report.info("\nCreating originalname → old report ID mapping...")
     
     # Convert string IDs to ObjectId format for query
     from bson import ObjectId
@@ -89,33 +97,33 @@ def create_originalname_to_old_report_mapping(original_db, reports_in_use: List[
     }))
     
     originalname_to_old_id = {}
-    for report in old_reports:
-        originalname = report["metadata"]["originalname"]
-        old_id = str(report["_id"])
+    for doc in old_reports:
+        originalname = doc["metadata"]["originalname"]
+        old_id = str(doc["_id"])
         originalname_to_old_id[originalname] = old_id
-        print(f"  {originalname} → {old_id}")
+        report.debug(f"  {originalname} → {old_id}")
     
-    print(f"\nMapped {len(originalname_to_old_id)} originalnames to old report IDs")
+    report.info(f"\nMapped {len(originalname_to_old_id)} originalnames to old report IDs")
     return originalname_to_old_id
 
 def backtrack_smf_reports_to_old_ids(smf_patient_reports: Dict[str, List[Dict[str, Any]]], 
                                    originalname_to_old_id: Dict[str, str]) -> Dict[str, List[str]]:
     """Backtrack SMF patient reports to old report IDs"""
-    print("\nBacktracking SMF reports to old report IDs...")
+    report.info("\nBacktracking SMF reports to old report IDs...")
     
     patient_to_old_report_ids = {}
     
     for patient_id, reports in smf_patient_reports.items():
         old_report_ids = []
         
-        for report in reports:
-            originalname = report["metadata"]["originalname"]
+        for doc in reports:
+            originalname = doc["metadata"]["originalname"]
             
             # Find matching old report ID
             if originalname in originalname_to_old_id:
                 old_report_id = originalname_to_old_id[originalname]
                 old_report_ids.append(old_report_id)
-                print(f"  Patient {patient_id}: {originalname} → {old_report_id}")
+                report.debug(f"  Patient {patient_id}: {originalname} → {old_report_id}")
         
         if old_report_ids:
             patient_to_old_report_ids[patient_id] = old_report_ids
@@ -124,7 +132,7 @@ def backtrack_smf_reports_to_old_ids(smf_patient_reports: Dict[str, List[Dict[st
 
 def fetch_relevant_patientdata(original_db, patient_to_old_report_ids: Dict[str, List[str]]) -> List[Dict[str, Any]]:
     """Fetch patientdata records that reference the relevant old report IDs"""
-    print("\nFetching relevant patientdata records from Original MongoDB...")
+    report.info("\nFetching relevant patientdata records from Original MongoDB...")
     
     # Collect all old report IDs
     all_old_report_ids = []
@@ -133,7 +141,7 @@ def fetch_relevant_patientdata(original_db, patient_to_old_report_ids: Dict[str,
     
     # Remove duplicates
     unique_old_report_ids = list(set(all_old_report_ids))
-    print(f"  Looking for patientdata records referencing {len(unique_old_report_ids)} old report IDs")
+    report.info(f"  Looking for patientdata records referencing {len(unique_old_report_ids)} old report IDs")
     
     # Convert to ObjectId format for query
     from bson import ObjectId
@@ -144,25 +152,25 @@ def fetch_relevant_patientdata(original_db, patient_to_old_report_ids: Dict[str,
         "source.report.$oid": {"$in": unique_old_report_ids}
     }))
     
-    print(f"  Found {len(patientdata_records)} relevant patientdata records")
+    report.info(f"  Found {len(patientdata_records)} relevant patientdata records")
     return patientdata_records
 
 def create_old_to_new_report_mapping(smf_patient_reports: Dict[str, List[Dict[str, Any]]], 
                                    originalname_to_old_id: Dict[str, str]) -> Dict[str, str]:
     """Create mapping from old report ID to new report ID"""
-    print("\nCreating old report ID → new report ID mapping...")
+    report.info("\nCreating old report ID → new report ID mapping...")
     
     old_to_new_report_id = {}
     
     for patient_id, reports in smf_patient_reports.items():
-        for report in reports:
-            originalname = report["metadata"]["originalname"]
-            new_report_id = str(report["_id"])
+        for doc in reports:
+            originalname = doc["metadata"]["originalname"]
+            new_report_id = str(doc["_id"])
             
             if originalname in originalname_to_old_id:
                 old_report_id = originalname_to_old_id[originalname]
                 old_to_new_report_id[old_report_id] = new_report_id
-                print(f"  {old_report_id} → {new_report_id} ({originalname})")
+                report.debug(f"  {old_report_id} → {new_report_id} ({originalname})")
     
     return old_to_new_report_id
 
@@ -170,9 +178,9 @@ def get_report_upload_time(demo_db, new_report_id: str) -> Optional[datetime]:
     """Get upload time for a report from Demo Cluster"""
     from bson import ObjectId
     
-    report = demo_db.reports.find_one({"_id": ObjectId(new_report_id)})
-    if report and "metadata" in report and "upload_time" in report["metadata"]:
-        upload_time_str = report["metadata"]["upload_time"]
+    doc = demo_db.reports.find_one({"_id": ObjectId(new_report_id)})
+    if doc and "metadata" in doc and "upload_time" in doc["metadata"]:
+        upload_time_str = doc["metadata"]["upload_time"]
         if isinstance(upload_time_str, dict) and "$date" in upload_time_str:
             # MongoDB $date format
             return datetime.fromisoformat(upload_time_str["$date"].replace("Z", "+00:00"))
@@ -187,7 +195,8 @@ def transform_patientdata_records(patientdata_records: List[Dict[str, Any]],
                                 old_to_new_report_id: Dict[str, str],
                                 demo_db) -> List[Dict[str, Any]]:
     """Transform patientdata records for Demo Cluster insertion"""
-    print("\nTransforming patientdata records...")
+    report.info("\nTransforming patientdata records...")
+    report.start(total=len(patientdata_records), label="patientdata records")
     
     transformed_records = []
     
@@ -236,42 +245,47 @@ def transform_patientdata_records(patientdata_records: List[Dict[str, Any]],
                         del transformed_record["_id"]
                     
                     transformed_records.append(transformed_record)
-                    print(f"  Transformed record for patient {patient_id}, report {new_report_id}")
+                    report.debug(f"  Transformed record for patient {patient_id}, report {new_report_id}")
+        report.advance()
     
-    print(f"\nTotal transformed records: {len(transformed_records)}")
+    report.info(f"\nTotal transformed records: {len(transformed_records)}")
     return transformed_records
 
 def main():
     """Main function to generate mapped patientdata records"""
-    print("SMF PatientData Mapping Generator")
-    print("=" * 50)
+    parser = argparse.ArgumentParser(description="Map patientdata records onto the SMF patients' reports.")
+    add_reporting_args(parser)
+    report.configure_from_args(parser.parse_args())
+    
+    report.info("SMF PatientData Mapping Generator")
+    report.info("=" * 50)
     
     # Load environment variables
     original_mongodb_url = os.getenv('ORIGINAL_MONGODB_URL')
     demo_mongodb_url = os.getenv('DEMO_MONGODB_URL')
     
     if not original_mongodb_url or not demo_mongodb_url:
-        print("ERROR: Missing MongoDB connection URLs in .env file")
-        print("Required: ORIGINAL_MONGODB_URL, DEMO_MONGODB_URL")
+        report.error("ERROR: Missing MongoDB connection URLs in .env file")
+        report.error("Required: ORIGINAL_MONGODB_URL, DEMO_MONGODB_URL")
         return
     
     # Load reports in use
     reports_in_use = load_reports_in_use()
-    print(f"Loaded {len(reports_in_use)} report IDs from reports_in_use.json")
+    report.info(f"Loaded {len(reports_in_use)} report IDs from reports_in_use.json")
     
     # Connect to both MongoDB instances
     original_db = connect_to_mongodb(original_mongodb_url, "beta_test")
     demo_db = connect_to_mongodb(demo_mongodb_url, "jano_core")
     
     if original_db is None or demo_db is None:
-        print("ERROR: Failed to connect to MongoDB instances")
+        report.error("ERROR: Failed to connect to MongoDB instances")
         return
     
     # Step 1: Get SMF patient reports from Demo Cluster
     smf_patient_reports = get_smf_patient_reports(demo_db)
     
     if not smf_patient_reports:
-        print("ERROR: No SMF patient reports found in Demo Cluster")
+        report.error("ERROR: No SMF patient reports found in Demo Cluster")
         return
     
     # Step 2: Create originalname → old report ID mapping
@@ -281,14 +295,14 @@ def main():
     patient_to_old_report_ids = backtrack_smf_reports_to_old_ids(smf_patient_reports, originalname_to_old_id)
     
     if not patient_to_old_report_ids:
-        print("ERROR: No matching reports found for backtracking")
+        report.error("ERROR: No matching reports found for backtracking")
         return
     
     # Step 4: Fetch relevant patientdata records
     patientdata_records = fetch_relevant_patientdata(original_db, patient_to_old_report_ids)
     
     if not patientdata_records:
-        print("ERROR: No relevant patientdata records found")
+        report.error("ERROR: No relevant patientdata records found")
         return
     
     # Step 5: Create old → new report ID mapping
@@ -307,25 +321,28 @@ def main():
     with open(output_file, 'w', encoding='utf-8') as f:
         json.dump(transformed_records, f, indent=2, default=str)
     
-    print(f"\n{'='*50}")
-    print("GENERATION COMPLETE")
-    print(f"{'='*50}")
-    print(f"Generated {len(transformed_records)} patientdata records")
-    print(f"Data saved to: {output_file}")
+    report.info(f"\n{'='*50}")
+    report.info("GENERATION COMPLETE")
+    report.info(f"{'='*50}")
+    report.info(f"Generated {len(transformed_records)} patientdata records")
+    report.info(f"Data saved to: {output_file}")
     
     # Statistics
     patients_with_data = len(set(record["patient"]["$oid"] for record in transformed_records))
     reports_referenced = len(set(record["source"]["report"]["$oid"] for record in transformed_records))
     
-    print(f"\nStatistics:")
-    print(f"  - SMF patients with patientdata: {patients_with_data}")
-    print(f"  - Unique reports referenced: {reports_referenced}")
-    print(f"  - Average records per patient: {len(transformed_records) / patients_with_data:.1f}")
+    report.info(f"\nStatistics:")
+    report.info(f"  - SMF patients with patientdata: {patients_with_data}")
+    report.info(f"  - Unique reports referenced: {reports_referenced}")
+    report.info(f"  - Average records per patient: {len(transformed_records) / patients_with_data:.1f}")
     
     # Show sample record
     if transformed_records:
-        print(f"\nSample transformed record:")
-        print(json.dumps(transformed_records[0], indent=2, default=str)[:500] + "...")
+        report.debug(f"\nSample transformed record:")
+        report.debug(json.dumps(transformed_records[0], indent=2, default=str)[:500] + "...")
+    
+    report.summary(written=len(transformed_records), destination=output_file,
+                   patients_with_data=patients_with_data, reports_referenced=reports_referenced)
     
     return transformed_records
 